@@ -0,0 +1,212 @@
+import bisect
+import re
+import threading
+from datetime import date, timedelta
+
+import pandas as pd
+
+# ---------- Appointment slots ----------
+_DIGITS = str.maketrans({
+    **{chr(0x0660 + d): str(d) for d in range(10)},
+    **{chr(0x06F0 + d): str(d) for d in range(10)},
+})
+_TIME = re.compile(r"(\d{1,2})(?:[:.h]?(\d{2}))?(am|pm|ص|م)?")
+_RANGE = re.compile(r"\s*(?:-|–|to)\s*")
+
+
+def parse_minutes(text, hours=None):
+    """Minutes after midnight of "9:30", "14.00", "2:30 pm", "٩:٣٠"...; None if unreadable.
+
+    With ``hours``, a bare hour before opening that fits in the afternoon
+    ("3" in a 09:00-17:00 clinic, but not "03" or "3:00") is read as the
+    afternoon.
+    """
+    text = str(text).translate(_DIGITS).lower().replace(" ", "").replace("a.m.", "am").replace("p.m.", "pm")
+    match = _TIME.fullmatch(text)
+    if match is None:
+        return None
+    hour, minute, half = int(match[1]), int(match[2] or 0), match[3]
+    if minute >= 60:
+        return None
+    if half:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if half in ("pm", "م") else 0)
+    elif (
+        hours is not None and match[2] is None and not match[1].startswith("0")
+        and hour * 60 < hours.open and (hour + 12) * 60 < hours.close
+    ):
+        hour += 12
+    return hour * 60 + minute if hour < 24 else None
+
+
+def parse_slot(text, hours, minutes=None):
+    """(start, length) in minutes of "10:00" or "10:00-10:45"; None if unreadable.
+
+    A single time lasts ``minutes``, or the clinic's slot length.
+    """
+    if text is None or text != text:  # None / NaN
+        return None
+    parts = _RANGE.split(str(text).strip(), maxsplit=1)
+    start = parse_minutes(parts[0], hours)
+    if start is None:
+        return None
+    if len(parts) == 1:
+        return start, int(minutes or hours.slot_minutes)
+    end = parse_minutes(parts[1], hours)
+    if end is not None and end <= start < 12 * 60 <= end + 12 * 60:
+        end += 12 * 60  # "11-1" ends in the afternoon
+    return (start, end - start) if end is not None and end > start else None
+
+
+def format_minutes(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def format_slot(start, length, hours):
+    """Stored time text: "10:00", or "10:00-10:45" when not the clinic's slot length."""
+    if length == hours.slot_minutes:
+        return format_minutes(start)
+    return f"{format_minutes(start)}-{format_minutes(start + length)}"
+
+
+def slot_label(day, start, free_doctors, hours):
+    """"Mon 20 Oct 09:15", plus how many doctors are free when there are several."""
+    label = f"{day:%a %d %b} {format_minutes(start)}"
+    if len(hours.doctors) > 1:
+        label += f" · {free_doctors} of {len(hours.doctors)} doctors free"
+    return label
+
+
+def _day_key(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    parsed = pd.to_datetime(value, errors="coerce", format="mixed")
+    return None if pd.isna(parsed) else parsed.strftime("%Y-%m-%d")
+
+
+class ClinicHours:
+    """Opening hours, slot length, closed weekdays and doctors.
+
+    Read from the ``clinic_hours`` secret, e.g. ``open = "09:00"``,
+    ``close = "17:00"``, ``slot_minutes = 15``, ``closed_days = ["Friday"]``,
+    ``doctors = ["Dr Kawa", "Dr Sara"]``.
+    """
+
+    def __init__(self, open="09:00", close="17:00", slot_minutes=15, closed_days=(), doctors=("Doctor",)):
+        self.open = parse_minutes(open)
+        self.close = parse_minutes(close)
+        if self.open is None or self.close is None or self.open >= self.close:
+            raise ValueError(f"clinic_hours: cannot read opening hours {open!r} - {close!r}")
+        self.slot_minutes = int(slot_minutes)
+        self.closed_days = {str(day).strip().lower()[:3] for day in closed_days}
+        self.doctors = list(doctors) or ["Doctor"]
+
+    def is_open(self, day):
+        return day.strftime("%a").lower() not in self.closed_days
+
+    def within(self, start, length):
+        return self.open <= start and start + length <= self.close
+
+    def __str__(self):
+        return f"{format_minutes(self.open)}–{format_minutes(self.close)}"
+
+
+class SlotIndex:
+    """Booked intervals per day as two parallel lists (starts, ends) sorted by start.
+
+    The doctors free over a window are the doctors minus the most bookings
+    running at once inside it, double bookings included. The bookings that can
+    reach the window are found with one ``bisect`` (nothing starting more than
+    the day's longest visit before it can still be running). Built once per
+    dataset version, then kept current with ``add`` on every save.
+    """
+
+    def __init__(self, hours, date_col, time_col):
+        self.hours = hours
+        self.date_col = date_col
+        self.time_col = time_col
+        self.version = None
+        self._days = {}
+        self._lock = threading.Lock()
+
+    def _busy(self, day, start, end):
+        """Most bookings running at the same time within [start, end)."""
+        booked = self._days.get(day)
+        if booked is None:
+            return 0
+        starts, ends, longest = booked
+        lo = bisect.bisect_left(starts, start - longest[0])
+        hi = bisect.bisect_left(starts, end)
+        edges = sorted(
+            edge
+            for s, e in zip(starts[lo:hi], ends[lo:hi]) if e > start
+            for edge in ((max(s, start), 1), (e, -1))
+        )  # ends sort before starts at the same minute: back-to-back visits don't overlap
+        busy = most = 0
+        for _, step in edges:
+            busy += step
+            most = max(most, busy)
+        return most
+
+    def _free_doctors(self, day, start, end):
+        return max(len(self.hours.doctors) - self._busy(day, start, end), 0)
+
+    def _place(self, day, start, end):
+        starts, ends, longest = self._days.setdefault(day, ([], [], [0]))
+        i = bisect.bisect_right(starts, start)
+        starts.insert(i, start)
+        ends.insert(i, end)
+        longest[0] = max(longest[0], end - start)
+
+    def rebuild(self, df, version=None):
+        """Index every booking of ``df`` whose date and time can be read."""
+        days = pd.to_datetime(df[self.date_col], errors="coerce", format="mixed").dt.strftime("%Y-%m-%d")
+        texts = df[self.time_col].fillna("").astype(str)
+        slots = texts.map({text: parse_slot(text, self.hours) for text in texts.unique()})
+        booked = sorted((day, slot[0], slot[1]) for day, slot in zip(days, slots) if day == day and slot is not None)
+        index = {}
+        for day, start, length in booked:
+            starts, ends, longest = index.setdefault(day, ([], [], [0]))
+            starts.append(start)
+            ends.append(start + length)
+            longest[0] = max(longest[0], length)
+        with self._lock:
+            self._days = index
+            self.version = version
+        return self
+
+    def add(self, record, version=None):
+        """Index a saved booking (a dict with the date and time columns)."""
+        day, slot = _day_key(record.get(self.date_col)), parse_slot(record.get(self.time_col), self.hours)
+        with self._lock:
+            if day is not None and slot is not None:
+                self._place(day, slot[0], slot[0] + slot[1])
+            if version is not None:
+                self.version = version
+
+    def conflicts(self, day, start, length):
+        """True if every doctor already has a booking overlapping [start, start + length) on ``day``."""
+        with self._lock:
+            return self._free_doctors(_day_key(day), start, start + length) == 0
+
+    def free_slots(self, day, after=None, n=5, length=None, days_ahead=60):
+        """The next ``n`` (day, start, free doctors) from ``day`` on, starting after minute ``after``."""
+        hours, length = self.hours, int(length or self.hours.slot_minutes)
+        found = []
+        with self._lock:
+            for offset in range(days_ahead):
+                current = day + timedelta(days=offset)
+                if not hours.is_open(current):
+                    continue
+                first = hours.open
+                if offset == 0 and after is not None:
+                    # Round up onto the slot grid
+                    first = max(first, hours.open + -(-(after - hours.open) // hours.slot_minutes) * hours.slot_minutes)
+                for start in range(first, hours.close - length + 1, hours.slot_minutes):
+                    free = self._free_doctors(current.isoformat(), start, start + length)
+                    if free:
+                        found.append((current, start, free))
+                        if len(found) == n:
+                            return found
+        return found
@@ -0,0 +1,346 @@
+"""Benchmark the three apps on synthetic clinic data against a fake Google Sheet.
+
+    python benchmark.py --sizes 1k 10k --latency 0.1
+    python benchmark.py --apps orginal.py --backend sqlite --baseline .benchmark_data/benchmark-abc1234.json
+
+Every (app, page, size) runs in its own process so caches, background
+threads and imports start cold. Each scenario times the first render
+(cold start, before the sheet is connected), the first render after the
+sheet is reachable (remote load), a plain rerun and a save, and records the
+Sheets calls made. Results are written to a JSON file named after the git
+commit, next to the generated data in .benchmark_data/, so runs of
+different versions can be compared with --baseline.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1M": 1_000_000}
+
+PATIENT_COLUMNS = [
+    "Date", "Patient_ID", "Full_Name", "Age", "Gender", "Phone_Number",
+    "Visual_Acuity", "VAcc", "IOP", "Medication", "AC", "Fundus", "U/S",
+    "OCT/FFA", "Diagnosis", "Treatment", "Plan",
+    "Appt_Name", "Appt_Date", "Appt_Time", "Appt_Payment"
+]
+BOOKING_TIME_COLUMNS = {"eyeapp.py": "Time", "eyeapp1.py": "Appointment Time (manual)"}
+
+FIRST_NAMES = ["Ahmed", "Sara", "Omar", "Layla", "Karwan", "Shilan", "Hawre", "Nazanin",
+               "Ali", "Zainab", "Rebwar", "Avan", "Dilan", "Maria", "John", "Hana"]
+LAST_NAMES = ["Khalil", "Hassan", "Mahmood", "Aziz", "Rashid", "Karim", "Salih", "Othman",
+              "Qadir", "Faraj", "Smith", "Ibrahim"]
+DIAGNOSES = ["Cataract", "Glaucoma", "Diabetic retinopathy", "Myopia", "Dry eye",
+             "Conjunctivitis", "AMD", "Keratoconus"]
+PAYMENTS = ["Cash", "Card", "Insurance", ""]
+
+
+# ---------- Synthetic data ----------
+def _pick(rng, choices, n):
+    return np.asarray(choices, dtype=object)[rng.integers(0, len(choices), n)]
+
+
+def _dates(rng, n, first_day, last_day):
+    first_day, last_day = np.datetime64(first_day), np.datetime64(last_day)
+    offsets = rng.integers(0, int((last_day - first_day).astype(int)) + 1, n)
+    return pd.Series(first_day + offsets.astype("timedelta64[D]")).dt.strftime("%Y-%m-%d")
+
+
+def _times(rng, n):
+    hours = pd.Series(rng.integers(9, 17, n)).astype(str).str.zfill(2)
+    minutes = pd.Series(_pick(rng, ["00", "15", "30", "45"], n))
+    return hours + ":" + minutes
+
+
+def _names(rng, n):
+    return pd.Series(_pick(rng, FIRST_NAMES, n)) + " " + pd.Series(_pick(rng, LAST_NAMES, n))
+
+
+def synthetic_patients(n, seed=0, today=None):
+    """``n`` rows in the eye_data.csv schema: ~70% visits, the rest bare appointments.
+
+    About 2% of the visits are still waiting for the doctor.
+    """
+    rng = np.random.default_rng(seed)
+    today = np.datetime64(today or date.today())
+    visit = rng.random(n) < 0.7
+    waiting = visit & (rng.random(n) < 0.02)
+    doctor = visit & ~waiting
+    blank = np.full(n, "", dtype=object)
+
+    def only(mask, values):
+        return np.where(mask, np.asarray(values, dtype=object), "")
+
+    ids = pd.Series(np.cumsum(visit)).astype(str).str.zfill(4)
+    df = pd.DataFrame({
+        "Date": only(visit, _dates(rng, n, today - 5 * 365, today)),
+        "Patient_ID": only(visit, ids),
+        "Full_Name": only(visit, _names(rng, n)),
+        "Age": only(visit, pd.Series(rng.integers(1, 95, n)).astype(str)),
+        "Gender": only(visit, _pick(rng, ["Male", "Female", "Child"], n)),
+        "Phone_Number": only(visit, "07" + pd.Series(rng.integers(0, 10**9, n)).astype(str).str.zfill(9)),
+        "Visual_Acuity": only(visit, "RA (6/9) ; LA (6/12)"),
+        "VAcc": only(visit, "6/6 / 6/9"),
+        "IOP": only(visit, pd.Series(rng.integers(10, 30, n)).astype(str) + " / 16"),
+        "Medication": only(visit, _pick(rng, ["", "Timolol", "Latanoprost", "Artificial tears"], n)),
+        "AC": only(doctor, "Quiet"),
+        "Fundus": only(doctor, "Normal"),
+        "U/S": blank,
+        "OCT/FFA": blank,
+        "Diagnosis": only(doctor, _pick(rng, DIAGNOSES, n)),
+        "Treatment": only(doctor, _pick(rng, ["Drops", "Surgery", "Glasses", "Follow-up"], n)),
+        "Plan": only(doctor, "Review in 3 months"),
+        "Appt_Name": only(~visit, _names(rng, n)),
+        "Appt_Date": only(~visit, _dates(rng, n, today - 2 * 365, today + 60)),
+        "Appt_Time": only(~visit, _times(rng, n)),
+        "Appt_Payment": only(~visit, _pick(rng, PAYMENTS, n)),
+    })
+    return df[PATIENT_COLUMNS]
+
+
+def synthetic_bookings(n, time_column, seed=0, today=None):
+    """``n`` bookings over the last two years and the next two months."""
+    rng = np.random.default_rng(seed)
+    today = np.datetime64(today or date.today())
+    return pd.DataFrame({
+        "Patient Name": _names(rng, n),
+        "Appointment Date": _dates(rng, n, today - 2 * 365, today + 60),
+        time_column: _times(rng, n),
+        "Payment": _pick(rng, PAYMENTS, n),
+    })
+
+
+def dataset_path(app, rows, data_dir):
+    """Generate (once) and return the CSV an app is benchmarked with."""
+    path = os.path.join(data_dir, f"{os.path.splitext(app)[0]}_{rows}.csv")
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        if app == "orginal.py":
+            df = synthetic_patients(rows)
+        else:
+            df = synthetic_bookings(rows, BOOKING_TIME_COLUMNS[app])
+        df.to_csv(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+# ---------- Scenarios ----------
+def _input(at, label, value):
+    next(w for w in at.text_input if w.label == label).input(value)
+
+
+def _click(at, label):
+    next(b for b in at.button if b.label == label).click()
+
+
+def _pick_free_slot(at):
+    # A fixed time would clash with the synthetic bookings once the day fills up
+    at.selectbox(key="free_slot").select_index(0)
+
+
+def _save_appointment(at, n):
+    _pick_free_slot(at)
+    at.run()  # the picked slot fills the form's date and time
+    _input(at, "Patient Name", f"Bench Patient {n}")
+    _click(at, "Save Appointment")
+
+
+def _save_pre_visit(at, n):
+    _input(at, "Full Name", f"Bench Patient {n}")
+    _click(at, "Submit")
+
+
+def _save_booking(at, n):
+    _input(at, "Patient Name", f"Bench Patient {n}")
+    _pick_free_slot(at)
+    _click(at, "💾 Save Appointment")
+
+
+# app -> [(page, save action or None)]; the first page is where the app lands
+PAGES = {
+    "orginal.py": [
+        ("📅 Appointments", _save_appointment),
+        ("🌟 New Patient", _save_pre_visit),
+        ("📊 View Data", None),
+        ("📈 Analytics", None),
+    ],
+    "eyeapp.py": [("Appointments", _save_booking)],
+    "eyeapp1.py": [("Appointments", _save_booking)],
+}
+
+
+def _timed_run(at):
+    start = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return round(elapsed, 4)
+
+
+def run_scenario(spec):
+    """Run one (app, page, size) scenario in the current process; returns its timings."""
+    from fake_sheets import FakeSpreadsheet, install
+    from streamlit.testing.v1 import AppTest
+
+    app, page, latency = spec["app"], spec["page"], spec["latency"]
+    work_dir = tempfile.mkdtemp(prefix="eyebench-")
+    try:
+        os.chdir(work_dir)
+        shutil.copy(spec["data"], "eye_data.csv")
+        data = pd.read_csv("eye_data.csv", dtype=str, keep_default_na=False)
+
+        spreadsheet = install(FakeSpreadsheet(latency), auth_latency=latency)
+        sheet = spreadsheet.sheet1
+        sheet.rows = [list(data.columns)] + data.values.tolist()
+        del data
+
+        at = AppTest.from_file(os.path.join(REPO, app), default_timeout=spec["timeout"])
+        at.secrets["gcp_service_account"] = {}
+        at.secrets["storage_backend"] = spec["backend"]
+
+        cold = _timed_run(at)
+        pages = [name for name, _ in PAGES[app]]
+        if page != pages[0]:
+            at.sidebar.radio[0].set_value(page)
+            cold += _timed_run(at)
+
+        # Let the background connection (auth, open, header check) finish
+        spreadsheet.opened.wait(spec["timeout"])
+        time.sleep(3 * latency + 0.5)
+        # The booking apps spread their rows over one worksheet per year
+        for worksheet in spreadsheet.worksheets():
+            worksheet.calls.clear()
+        remote = _timed_run(at)
+        rerun = _timed_run(at)
+
+        save = None
+        save_action = dict(PAGES[app])[page]
+        if save_action is not None:
+            save_action(at, spec["rows"])
+            save = _timed_run(at)
+
+        return {
+            "app": app, "page": page, "rows": spec["rows"], "backend": spec["backend"],
+            "cold_start_s": round(cold, 4), "remote_load_s": remote, "rerun_s": rerun, "save_s": save,
+            "sheet_calls": dict(sum((ws.calls for ws in spreadsheet.worksheets()), Counter())),
+            "sheet_cells": sum(ws.cells for ws in spreadsheet.worksheets()),
+        }
+    finally:
+        os.chdir(REPO)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _run_in_subprocess(spec):
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--scenario", json.dumps(spec)],
+        capture_output=True, text=True, cwd=REPO,
+    )
+    lines = [line for line in proc.stdout.splitlines() if line.strip()]
+    if proc.returncode != 0 or not lines:
+        return {**{k: spec[k] for k in ("app", "page", "rows", "backend")},
+                "error": (proc.stderr.strip().splitlines() or ["no output"])[-1]}
+    return json.loads(lines[-1])
+
+
+# ---------- Reporting ----------
+METRICS = ["cold_start_s", "remote_load_s", "rerun_s", "save_s"]
+
+
+def _git_version():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], capture_output=True, text=True, cwd=REPO, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _key(result):
+    return result["app"], result["page"], result["rows"], result["backend"]
+
+
+def _format(result):
+    if "error" in result:
+        return f"ERROR: {result['error']}"
+    return "  ".join(
+        f"{m[:-2]}={result[m]:.3f}s" for m in METRICS if result.get(m) is not None
+    ) + f"  calls={sum(result['sheet_calls'].values())}"
+
+
+def compare(results, baseline_path):
+    """Print each metric's ratio to the matching scenario in a previous run."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {_key(r): r for r in json.load(f)["results"] if "error" not in r}
+    print(f"\nCompared with {baseline_path} (ratio new/old, >1 is slower):")
+    for result in results:
+        old = baseline.get(_key(result))
+        if old is None or "error" in result:
+            continue
+        ratios = [
+            f"{m[:-2]}={result[m] / old[m]:.2f}x"
+            for m in METRICS if result.get(m) and old.get(m)
+        ]
+        print(f"  {result['app']:<11} {result['page']:<16} {result['rows']:>8}  " + "  ".join(ratios))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apps", nargs="+", default=list(PAGES), choices=list(PAGES))
+    parser.add_argument("--sizes", nargs="+", default=["1k", "10k"], choices=list(SIZES))
+    parser.add_argument("--backend", default="csv", choices=["csv", "sqlite"])
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per fake Sheets call")
+    parser.add_argument("--timeout", type=float, default=600, help="AppTest timeout per run")
+    parser.add_argument("--data-dir", default=os.path.join(REPO, ".benchmark_data"))
+    parser.add_argument("--output", help="results file (default: <data dir>/benchmark-<git version>.json)")
+    parser.add_argument("--baseline", help="previous results file to compare against")
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.scenario:
+        print(json.dumps(run_scenario(json.loads(args.scenario))))
+        return
+
+    version = _git_version()
+    results = []
+    for size in args.sizes:
+        rows = SIZES[size]
+        for app in args.apps:
+            data = dataset_path(app, rows, args.data_dir)
+            for page, _ in PAGES[app]:
+                spec = {"app": app, "page": page, "rows": rows, "backend": args.backend,
+                        "latency": args.latency, "timeout": args.timeout, "data": data}
+                result = _run_in_subprocess(spec)
+                results.append(result)
+                print(f"{app:<11} {page:<16} {rows:>8}  {_format(result)}", flush=True)
+
+    output = args.output or os.path.join(args.data_dir, f"benchmark-{version}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "version": version,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "backend": args.backend,
+            "latency_s": args.latency,
+            "results": results,
+        }, f, indent=2, ensure_ascii=False)
+    print(f"\nWrote {output}")
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import threading
+import unicodedata
+
+import pandas as pd
+
+# ---------- Duplicate appointment detection ----------
+def normalize_text(value):
+    """Case-, width- and whitespace-insensitive form of a name or time."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ""
+    return " ".join(unicodedata.normalize("NFKC", str(value)).split()).casefold()
+
+
+def normalize_date(value):
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ""
+    parsed = pd.to_datetime(value, errors="coerce")
+    return str(value).strip() if pd.isna(parsed) else parsed.strftime("%Y-%m-%d")
+
+
+def booking_key(name, appt_date, appt_time):
+    return normalize_text(name), normalize_date(appt_date), normalize_text(appt_time)
+
+
+class BookingKeys:
+    """Set of normalized (name, date, time) keys for O(1) duplicate checks.
+
+    Built once from the dataset with vectorized string ops, then kept current
+    with ``add`` on every save. ``version`` records which dataset version the
+    set reflects so callers can rebuild only when the data changed elsewhere.
+    """
+
+    def __init__(self, name_col, date_col, time_col):
+        self.name_col = name_col
+        self.date_col = date_col
+        self.time_col = time_col
+        self.version = None
+        self._keys = set()
+        self._lock = threading.Lock()
+
+    def keys_of(self, df):
+        """Normalized key of every row of ``df``, in row order."""
+        names = _normalize_column(df[self.name_col])
+        raw_dates = df[self.date_col].fillna("").astype(str).str.strip()
+        dates = pd.to_datetime(raw_dates, errors="coerce", format="mixed").dt.strftime("%Y-%m-%d")
+        dates = dates.fillna(raw_dates)
+        times = _normalize_column(df[self.time_col])
+        return list(zip(names, dates, times))
+
+    def rebuild(self, df, version=None):
+        keys = set(self.keys_of(df))
+        keys.discard(("", "", ""))
+        with self._lock:
+            self._keys = keys
+            self.version = version
+        return self
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def add(self, key, version=None):
+        with self._lock:
+            self._keys.add(key)
+            if version is not None:
+                self.version = version
+
+
+def _normalize_column(series):
+    return (
+        series.fillna("").astype(str)
+        .str.normalize("NFKC")
+        .str.split().str.join(" ")
+        .str.casefold()
+    )
@@ -0,0 +1,49 @@
+import pandas as pd
+
+# ---------- Upcoming / archive views ----------
+class BookingsView:
+    """Upcoming appointments grouped by day and a date-sorted archive.
+
+    Built once per dataset version: one ``to_datetime``, one sort and one
+    ``groupby`` pass instead of a full boolean mask per displayed day. The
+    archive is kept in ascending date order so a date-range filter is two
+    binary searches and a page is a slice.
+    """
+
+    def __init__(self, bookings, today, time_col):
+        self.columns = ["Patient Name", "Appointment Date", time_col, "Payment"]
+        dates = pd.to_datetime(bookings["Appointment Date"], errors="coerce").dt.normalize()
+        df = bookings.assign(**{"Appointment Date": dates})
+        today = pd.Timestamp(today)
+
+        upcoming = df[dates >= today].sort_values("Appointment Date", kind="stable")
+        self.days = [
+            (day.date(), _numbered(group[["Patient Name", time_col, "Payment"]]))
+            for day, group in upcoming.groupby("Appointment Date", sort=True)
+        ]
+
+        self.archive = df[dates < today].sort_values("Appointment Date", kind="stable")[self.columns]
+        self._archive_dates = self.archive["Appointment Date"].to_numpy()
+
+    def archive_bounds(self):
+        """(first, last) archived date, or None if the archive is empty."""
+        if self.archive.empty:
+            return None
+        return self.archive["Appointment Date"].iloc[0].date(), self.archive["Appointment Date"].iloc[-1].date()
+
+    def archive_page(self, start=None, end=None, page=1, page_size=50):
+        """One page of archived rows in [start, end], newest first, and the total."""
+        lo = 0 if start is None else self._archive_dates.searchsorted(pd.Timestamp(start).to_datetime64(), "left")
+        hi = len(self._archive_dates) if end is None else self._archive_dates.searchsorted(
+            (pd.Timestamp(end) + pd.Timedelta(days=1)).to_datetime64(), "left"
+        )
+        total = max(hi - lo, 0)
+        stop = hi - (page - 1) * page_size
+        rows = self.archive.iloc[max(stop - page_size, lo):max(stop, lo)].iloc[::-1]
+        return _numbered(rows, start=(page - 1) * page_size + 1), total
+
+
+def _numbered(df, start=1):
+    df = df.reset_index(drop=True)
+    df.index = range(start, start + len(df))
+    return df
@@ -0,0 +1,490 @@
+"""Bulk import of CSV / JSONL records into an app's local store and Google Sheets.
+
+    python bulk_import.py orginal.py old_system.csv --dayfirst
+    python bulk_import.py eyeapp1.py paper_bookings.jsonl --backend sqlite
+    python bulk_import.py eyeapp.py bookings_2019.csv --dry-run
+
+The file must use the app's columns (eye_data.csv for orginal.py, the
+bookings columns for eyeapp.py / eyeapp1.py). Whole columns are validated
+and normalized at once: dates to YYYY-MM-DD, ages to whole years, Patient
+IDs to the counter's zero-padded form, Arabic-Indic digits to ASCII. Rows
+that fail, or duplicate a stored row or an earlier row of the file, go to
+<input>.rejects.csv with the reason. Visits without a Patient ID get one
+from a single block reserved from the shared counter.
+
+Accepted rows are saved locally in one batch, then uploaded with
+``append_rows`` in chunks. Progress is checkpointed in <input>.import/, so
+rerunning the same command after a failure resumes where it stopped. Run
+it while the apps are stopped: they keep the data in memory and would not
+see the new rows.
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from datetime import date, datetime
+
+import gspread
+import pandas as pd
+import streamlit as st
+from google.oauth2.service_account import Credentials
+
+from booking_keys import BookingKeys
+from journal_store import JournalStore
+from partitions import MonthPartitions, SQLiteMonths, YearWorksheets, year_keys
+from patient_ids import PatientIdAllocator, last_patient_number
+from sheet_quota import QuotaWorksheet
+from sheet_sync import SheetRowIndex, SyncState, first_appended_row
+from sqlite_store import SQLiteStore, quote
+from typed_snapshot import BOOKING_SCHEMA, PATIENT_SCHEMA
+from waiting_queue import WAITING_FIELDS
+
+SHEET_ID = "1keLx7iBH92_uKxj-Z70iTmAVus7X9jxaFXl_SQ-mZvU"
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+
+PATIENT_COLUMNS = [
+    "Date", "Patient_ID", "Full_Name", "Age", "Gender", "Phone_Number",
+    "Visual_Acuity", "VAcc", "IOP", "Medication", "AC", "Fundus", "U/S",
+    "OCT/FFA", "Diagnosis", "Treatment", "Plan",
+    "Appt_Name", "Appt_Date", "Appt_Time", "Appt_Payment"
+]
+PATIENT_INDEXES = [
+    ("idx_patient_id", quote("Patient_ID"), None),
+    ("idx_appt_date", quote("Appt_Date"), None),
+    ("idx_date", quote("Date"), None),
+    ("idx_waiting", "row_index", " AND ".join(f"COALESCE({quote(col)}, '') = ''" for col in WAITING_FIELDS)),
+]
+BOOKING_TIME_COLUMNS = {"eyeapp.py": "Time", "eyeapp1.py": "Appointment Time (manual)"}
+# Month partitions directory and year worksheet prefix of each booking app
+BOOKING_PARTITIONS = {"eyeapp.py": ("bookings", "Bookings"), "eyeapp1.py": ("bookings_manual", "Manual Bookings")}
+GENDERS = {"male": "Male", "m": "Male", "female": "Female", "f": "Female", "child": "Child", "c": "Child"}
+
+_DIGITS = str.maketrans({
+    **{chr(0x0660 + d): str(d) for d in range(10)},
+    **{chr(0x06F0 + d): str(d) for d in range(10)},
+})
+
+
+# ---------- Reading ----------
+def read_records(path):
+    """The file as a DataFrame of stripped strings ("" for blanks)."""
+    if path.endswith((".jsonl", ".ndjson")):
+        with open(path, encoding="utf-8") as f:
+            records = [
+                {k: "" if v is None else str(v) for k, v in json.loads(line).items()}
+                for line in f if line.strip()
+            ]
+        df = pd.DataFrame.from_records(records)
+    else:
+        df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    return df.fillna("").astype(str).apply(lambda col: col.str.strip())
+
+
+# ---------- Validation ----------
+def _dates(series, dayfirst):
+    """(YYYY-MM-DD strings, mask of non-blank values that are not dates)."""
+    parsed = pd.to_datetime(series.replace("", None), errors="coerce", format="mixed", dayfirst=dayfirst)
+    return parsed.dt.strftime("%Y-%m-%d").fillna(""), (series != "") & parsed.isna()
+
+
+class Batch:
+    """Rows being imported, with the reason each dropped row was dropped."""
+
+    def __init__(self, df, columns):
+        unknown = [c for c in df.columns if c not in columns]
+        self.ignored_columns = unknown
+        self.raw = df.copy()
+        self.rows = df.reindex(columns=columns, fill_value="")
+        self.reasons = pd.Series("", index=df.index)
+
+    def reject(self, mask, reason):
+        mask = mask & (self.reasons == "")
+        self.reasons[mask] = reason
+        return int(mask.sum())
+
+    def accepted(self):
+        return self.rows[self.reasons == ""]
+
+    def rejects(self):
+        """Dropped rows as they were in the input (before normalizing), with the reason."""
+        dropped = self.reasons != ""
+        return self.raw[dropped].assign(Reason=self.reasons[dropped])
+
+
+def validate_patients(batch, dayfirst=False):
+    rows = batch.rows
+    for col in ["Date", "Age", "Patient_ID", "Phone_Number", "Appt_Date"]:
+        rows[col] = rows[col].str.translate(_DIGITS)
+
+    visit = rows["Full_Name"] != ""
+    batch.reject(~visit & (rows["Appt_Name"] == ""), "no Full_Name or Appt_Name")
+
+    rows["Date"], bad = _dates(rows["Date"], dayfirst)
+    batch.reject(bad, "Date is not a date")
+    batch.reject(visit & (rows["Date"] == ""), "visit without a Date")
+    rows["Appt_Date"], bad = _dates(rows["Appt_Date"], dayfirst)
+    batch.reject(bad, "Appt_Date is not a date")
+
+    age = pd.to_numeric(rows["Age"].replace("", None), errors="coerce")
+    batch.reject((rows["Age"] != "") & (age.isna() | (age % 1 != 0)), "Age is not a whole number")
+    batch.reject((age < 0) | (age > 120), "Age out of 0-120")
+    rows["Age"] = age.where(age % 1 == 0).astype("Int64").astype("string").fillna("")
+
+    gender = rows["Gender"].str.casefold().map(GENDERS)
+    batch.reject((rows["Gender"] != "") & gender.isna(), "Gender not Male / Female / Child")
+    rows["Gender"] = gender.fillna("")
+
+    ids = rows["Patient_ID"]
+    batch.reject((ids != "") & ~ids.str.fullmatch(r"\d+"), "Patient_ID is not a number")
+
+
+def validate_bookings(batch, time_column, dayfirst=False):
+    rows = batch.rows
+    rows["Appointment Date"], bad = _dates(rows["Appointment Date"].str.translate(_DIGITS), dayfirst)
+    batch.reject(rows["Patient Name"] == "", "no Patient Name")
+    batch.reject(bad | (rows["Appointment Date"] == ""), "Appointment Date missing or not a date")
+    batch.reject(rows[time_column] == "", f"no {time_column}")
+
+
+def _phone_digits(df):
+    return df.assign(Phone_Number=df["Phone_Number"].fillna("").astype(str).str.translate(_DIGITS)
+                     .str.replace(r"\D", "", regex=True))
+
+
+def drop_duplicates(batch, existing, key_sets):
+    """Reject rows whose key is already stored or appeared earlier in the file.
+
+    ``key_sets`` is a list of (BookingKeys, mask of the rows it applies to).
+    """
+    candidates = batch.reasons == ""
+    for keys, applies in key_sets:
+        stored = BookingKeys(keys.name_col, keys.date_col, keys.time_col).rebuild(existing)
+        new = pd.Series(keys.keys_of(batch.rows), index=batch.rows.index)
+        batch.reject(candidates & applies & new.map(stored.__contains__), "duplicate of a stored row")
+        repeated = new.where(candidates & applies & (batch.reasons == "")).dropna().duplicated()
+        batch.reject(repeated.reindex(batch.rows.index, fill_value=False), "duplicate within the file")
+
+
+def patient_key_sets(rows):
+    visit = rows["Full_Name"] != ""
+    return [
+        (BookingKeys("Full_Name", "Date", "Phone_Number"), visit),
+        (BookingKeys("Appt_Name", "Appt_Date", "Appt_Time"), ~visit),
+    ]
+
+
+# ---------- Targets ----------
+class Checkpoint:
+    """Prepared rows and upload progress of one input file, in <input>.import/."""
+
+    def __init__(self, input_path):
+        self.directory = input_path + ".import"
+        self.rows_path = os.path.join(self.directory, "prepared.csv")
+        self.state_path = os.path.join(self.directory, "state.json")
+        stat = os.stat(input_path)
+        self.source = {"size": stat.st_size, "mtime": int(stat.st_mtime)}
+        self.state = None
+        if os.path.exists(self.state_path):
+            with open(self.state_path, encoding="utf-8") as f:
+                self.state = json.load(f)
+
+    def start(self, rows, app):
+        os.makedirs(self.directory, exist_ok=True)
+        rows.to_csv(self.rows_path, index=False)
+        self.state = {"app": app, "source": self.source, "local_done": False,
+                      "local_rows_before": None, "uploaded": {}, "in_flight": {}, "finished": None}
+        self.save()
+
+    def rows(self):
+        return pd.read_csv(self.rows_path, dtype=str, keep_default_na=False)
+
+    def save(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.state_path)
+
+    def discard(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.state = None
+
+
+def open_store(app, backend):
+    """The app's local store, opened as the app opens it."""
+    if app == "orginal.py":
+        if backend == "sqlite":
+            return SQLiteStore(
+                "eye_data.db", PATIENT_COLUMNS, indexes=PATIENT_INDEXES,
+                import_from=lambda: JournalStore("eye_data.csv", PATIENT_COLUMNS, schema=PATIENT_SCHEMA).load(),
+            )
+        # Compacted once at the end instead of in the background
+        return JournalStore("eye_data.csv", PATIENT_COLUMNS, schema=PATIENT_SCHEMA, compact_bytes=float("inf"))
+    columns = booking_columns(app)
+    if app == "eyeapp1.py" and backend == "sqlite":
+        return SQLiteMonths(SQLiteStore(
+            "eye_data.db", columns, table="bookings",
+            indexes=[("idx_booking_date", quote("Appointment Date"), None)],
+        ), "Appointment Date")
+    if app == "eyeapp1.py":
+        return MonthPartitions(
+            BOOKING_PARTITIONS[app][0], columns, "Appointment Date", schema=BOOKING_SCHEMA,
+            import_from=lambda: JournalStore("eye_data.csv", columns, schema=BOOKING_SCHEMA).load(),
+        )
+    return MonthPartitions(
+        BOOKING_PARTITIONS[app][0], columns, "Appointment Date",
+        import_from=lambda: pd.read_csv("eye_data.csv", dtype=str) if os.path.exists("eye_data.csv")
+        else pd.DataFrame(columns=columns),
+    )
+
+
+def booking_columns(app):
+    return ["Patient Name", "Appointment Date", BOOKING_TIME_COLUMNS[app], "Payment"]
+
+
+def open_spreadsheet():
+    """The clinic spreadsheet and its first worksheet under the Sheets quota."""
+    creds = Credentials.from_service_account_info(st.secrets["gcp_service_account"], scopes=SCOPES)
+    quota = st.secrets.get("sheets_quota", {})
+    spreadsheet = gspread.authorize(creds).open_by_key(SHEET_ID)
+    return spreadsheet, QuotaWorksheet(spreadsheet.sheet1, **quota)
+
+
+def year_worksheets(app, spreadsheet, sheet):
+    """The per-year booking worksheets, split from the first one as the app does on first run."""
+    years = YearWorksheets(
+        sheet.sibling(spreadsheet), booking_columns(app), "Appointment Date",
+        prefix=BOOKING_PARTITIONS[app][1], wrap=lambda worksheet: sheet.sibling(worksheet),
+    )
+    try:
+        years.split(sheet)
+    except ValueError as e:
+        print(f"Bookings were not copied from the first worksheet: {e}")
+    return years
+
+
+def seed_bookings(args, store):
+    """Fill an empty booking store from the sheet, as the app's first run would.
+
+    Otherwise the app would see a non-empty store and never copy the older
+    years, and the duplicate check would miss the rows already in the sheet.
+    """
+    years = year_worksheets(args.app, *open_spreadsheet())
+    existing = years.records(years.years())
+    if not args.dry_run:
+        store.reset(existing, date.today())
+    return existing
+
+
+def upload(worksheet, title, rows, checkpoint, chunk_size, on_chunk=None):
+    """Append ``rows`` in chunks, recording each chunk in the checkpoint before it is sent.
+
+    A chunk still marked in flight from an earlier run is looked for at the
+    end of the worksheet (one read) so it is neither lost nor sent twice.
+    Returns the number of requests made.
+    """
+    state = checkpoint.state
+    done, requests = state["uploaded"].get(title, 0), 0
+    in_flight = state["in_flight"].pop(title, None)
+    if in_flight is not None:
+        values, requests = worksheet.get_all_values(), 1
+        if len(values) > in_flight and _same_rows(values[-in_flight:], rows[done:done + in_flight]):
+            if on_chunk is not None:
+                on_chunk(done, len(values) - in_flight + 1)
+            done += in_flight
+        state["uploaded"][title] = done
+        checkpoint.save()
+    while done < len(rows):
+        batch = rows[done:done + chunk_size]
+        state["in_flight"][title] = len(batch)
+        checkpoint.save()
+        response = worksheet.append_rows(batch, value_input_option="RAW")
+        requests += 1
+        if on_chunk is not None:
+            on_chunk(done, first_appended_row(response))
+        done += len(batch)
+        state["uploaded"][title] = done
+        del state["in_flight"][title]
+        checkpoint.save()
+    return requests
+
+
+def _same_rows(sheet_rows, rows):
+    def trimmed(row):
+        row = [str(cell) for cell in row]
+        while row and row[-1] == "":
+            row.pop()
+        return row
+    return len(sheet_rows) == len(rows) and all(trimmed(a) == trimmed(b) for a, b in zip(sheet_rows, rows))
+
+
+# ---------- Import ----------
+def prepare(args, store, report):
+    """Read, validate, de-duplicate and number the input; returns the accepted rows."""
+    started = time.perf_counter()
+    raw = read_records(args.input)
+    report["rows_read"] = len(raw)
+    report["read_s"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if args.app == "orginal.py":
+        batch = Batch(raw, PATIENT_COLUMNS)
+        validate_patients(batch, args.dayfirst)
+        existing = _phone_digits(store.load(columns=PATIENT_COLUMNS).fillna(""))
+        drop_duplicates(batch, existing, patient_key_sets(_phone_digits(batch.rows)))
+    else:
+        batch = Batch(raw, booking_columns(args.app))
+        validate_bookings(batch, BOOKING_TIME_COLUMNS[args.app], args.dayfirst)
+        existing = (seed_bookings(args, store) if store.is_empty() else store.load()).fillna("")
+        key = BookingKeys(*booking_columns(args.app)[:3])
+        drop_duplicates(batch, existing, [(key, pd.Series(True, index=batch.rows.index))])
+    report["validate_s"] = time.perf_counter() - started
+    report["ignored_columns"] = batch.ignored_columns
+    report["rejected"] = batch.reasons[batch.reasons != ""].value_counts().to_dict()
+
+    rejects = batch.rejects()
+    if not rejects.empty:
+        rejects.to_csv(args.input + ".rejects.csv", index=False)
+    rows = batch.accepted().reset_index(drop=True)
+
+    if args.app == "orginal.py" and not args.dry_run:
+        # One block of new IDs for visits without one; kept IDs are padded to the same width
+        allocator = PatientIdAllocator("eye_data.next_id", last_used=lambda: last_patient_number(store))
+        ids = rows["Patient_ID"]
+        kept = pd.to_numeric(ids[ids != ""], errors="coerce")
+        missing = (rows["Full_Name"] != "") & (ids == "")
+        rows.loc[ids != "", "Patient_ID"] = kept.astype(int).map(allocator.format)
+        rows.loc[missing, "Patient_ID"] = allocator.allocate_many(
+            int(missing.sum()), above=int(kept.max()) if not kept.empty else 0
+        )
+        report["ids_assigned"] = int(missing.sum())
+    return rows
+
+
+def save_locally(args, store, rows, checkpoint, report):
+    state = checkpoint.state
+    started = time.perf_counter()
+    if state["local_rows_before"] is None and args.app == "orginal.py":
+        state["local_rows_before"] = store.row_count()
+        checkpoint.save()
+    # A rerun after a crash here skips whatever already reached the store
+    batch = Batch(rows, list(rows.columns))
+    if args.app == "orginal.py":
+        drop_duplicates(batch, _phone_digits(store.load(columns=PATIENT_COLUMNS).fillna("")),
+                        patient_key_sets(_phone_digits(rows)))
+        todo = batch.accepted()
+        store.insert_many(todo.to_dict("records"))
+        if isinstance(store, JournalStore):
+            store.compact()
+        # The app's write-behind sync must not push these rows again
+        if os.path.exists("eye_data.sync_state.json"):
+            positions = range(state["local_rows_before"], store.row_count())
+            SyncState("eye_data.sync_state.json").mark(store.rows(positions).fillna("").astype(str))
+        waiting = todo[(todo["Full_Name"] != "") & (todo[WAITING_FIELDS] == "").all(axis=1)]
+        report["now_waiting"] = len(waiting)
+    else:
+        key = BookingKeys(*booking_columns(args.app)[:3])
+        drop_duplicates(batch, store.load().fillna(""), [(key, pd.Series(True, index=rows.index))])
+        todo = batch.accepted()
+        store.insert_many(todo, date.today())
+    report["saved_locally"] = len(todo)
+    report["local_s"] = time.perf_counter() - started
+    state["local_done"] = True
+    checkpoint.save()
+
+
+def upload_all(args, rows, checkpoint, report):
+    started = time.perf_counter()
+    spreadsheet, sheet = open_spreadsheet()
+    requests = 0
+    if args.app == "orginal.py":
+        index = SheetRowIndex("eye_data.sheet_rows.json")
+        ids = rows["Patient_ID"].tolist()
+
+        def remember_rows(offset, first_row):
+            # Keep the Patient_ID -> sheet row cache current for doctor updates
+            if index.rows is not None and first_row is not None:
+                for i, key in enumerate(ids[offset:offset + args.chunk]):
+                    if key:
+                        index.rows[key] = first_row + i
+                index.save()
+
+        requests += upload(sheet, "Sheet1", rows.values.tolist(), checkpoint, args.chunk, remember_rows)
+    else:
+        years = year_worksheets(args.app, spreadsheet, sheet)
+        for year, year_rows in rows.groupby(year_keys(rows["Appointment Date"]), sort=True):
+            worksheet = years.worksheet(year, create=True)
+            requests += upload(worksheet, worksheet.title, year_rows.values.tolist(), checkpoint, args.chunk)
+    report["upload_s"] = time.perf_counter() - started
+    report["upload_requests"] = requests
+    report["sheets"] = sheet.metrics
+
+
+def print_report(report, rows):
+    total = sum(report.get(k, 0) for k in ["read_s", "validate_s", "local_s", "upload_s"])
+    if "rows_read" in report:
+        print(f"Read {report['rows_read']} rows, accepted {rows}")
+    for reason, count in report.get("rejected", {}).items():
+        print(f"  rejected {count:>7}  {reason}")
+    if report.get("ignored_columns"):
+        print(f"  ignored columns: {', '.join(report['ignored_columns'])}")
+    if report.get("ids_assigned"):
+        print(f"  new Patient IDs: {report['ids_assigned']}")
+    if report.get("now_waiting"):
+        print(f"  {report['now_waiting']} imported visits have no doctor fields and will show as waiting")
+    for phase in ["read", "validate", "local", "upload"]:
+        seconds = report.get(f"{phase}_s")
+        if seconds is not None:
+            print(f"  {phase:<9} {seconds:8.2f}s  {rows / max(seconds, 1e-9):10.0f} rows/s")
+    if "upload_requests" in report:
+        print(f"  {report['upload_requests']} append requests, quota: {report['sheets']}")
+    print(f"  total     {total:8.2f}s  {rows / max(total, 1e-9):10.0f} rows/s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("app", choices=["orginal.py", *BOOKING_TIME_COLUMNS])
+    parser.add_argument("input", help="CSV or JSONL file")
+    parser.add_argument("--backend", default="csv", choices=["csv", "sqlite"], help="the app's storage_backend")
+    parser.add_argument("--chunk", type=int, default=1000, help="rows per append_rows request")
+    parser.add_argument("--dayfirst", action="store_true", help="read 03/04/2024 as 3 April")
+    parser.add_argument("--dry-run", action="store_true", help="validate and report only")
+    parser.add_argument("--restart", action="store_true", help="ignore an earlier checkpoint of this file")
+    args = parser.parse_args(argv)
+
+    store = open_store(args.app, args.backend)
+    checkpoint = Checkpoint(args.input)
+    if checkpoint.state is not None and (args.restart or checkpoint.state["source"] != checkpoint.source):
+        if not args.restart:
+            parser.error(f"{args.input} changed since its checkpoint in {checkpoint.directory}; use --restart")
+        checkpoint.discard()
+    if checkpoint.state is not None and checkpoint.state["finished"]:
+        print(f"{args.input} was already imported on {checkpoint.state['finished']} (use --restart to import again)")
+        return
+
+    report = {}
+    if checkpoint.state is None or args.dry_run:
+        rows = prepare(args, store, report)
+        if args.dry_run:
+            print_report(report, len(rows))
+            return
+        checkpoint.start(rows, args.app)
+    else:
+        print(f"Resuming from {checkpoint.directory}")
+        rows = checkpoint.rows()
+
+    if not checkpoint.state["local_done"]:
+        save_locally(args, store, rows, checkpoint, report)
+    upload_all(args, rows, checkpoint, report)
+    checkpoint.state["finished"] = datetime.now().isoformat(timespec="seconds")
+    checkpoint.save()
+    print_report(report, len(rows))
+
+
+if __name__ == "__main__":
+    main()
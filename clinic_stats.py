@@ -0,0 +1,199 @@
+import io
+import json
+import os
+import re
+import threading
+from collections import Counter
+from datetime import timedelta
+
+import pandas as pd
+
+# ---------- Incremental clinic analytics ----------
+STATS_COLUMNS = ["Date", "Full_Name", "Diagnosis", "Appt_Date", "Appt_Payment"]
+STATS_TABLES = ["visits_by_day", "visits_by_week", "appointments_by_day",
+                "payment_counts", "payment_amounts", "diagnoses"]
+_AMOUNT = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+def _text(value):
+    if value is None or value != value:  # None / NaN
+        return ""
+    return str(value).strip()
+
+
+def _day(value):
+    parsed = pd.to_datetime(_text(value) or None, errors="coerce", format="mixed")
+    return None if pd.isna(parsed) else parsed.date()
+
+
+def _week(day):
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def payment_type(value):
+    """"cash 25000" -> "Cash"; blank -> "Unspecified"."""
+    words = _AMOUNT.sub(" ", _text(value)).split()
+    return " ".join(words).title() or "Unspecified"
+
+
+def payment_amount(value):
+    match = _AMOUNT.search(_text(value))
+    return float(match.group().replace(",", ".")) if match else 0.0
+
+
+class ClinicStats:
+    """Visit, appointment, payment and diagnosis counts kept as aggregates.
+
+    ``apply(old, new)`` moves one row's contribution from its old to its new
+    values, so save paths update the counts in O(1) and opening the
+    dashboard never scans the records. The aggregates are saved next to the
+    data; ``rows`` records how many stored rows they cover so a stale file
+    is rebuilt. ``version`` goes up on every change so charts can be cached.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.version = 0
+        self.rows = 0
+        self._lock = threading.Lock()
+        self._reset()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                saved = json.load(f)
+            self.rows = saved["rows"]
+            for name in STATS_TABLES:
+                getattr(self, name).update(saved[name])
+
+    def _reset(self):
+        for name in STATS_TABLES:
+            setattr(self, name, Counter())
+
+    def _contributions(self, record):
+        """(table, key, amount) this row adds to the aggregates."""
+        out = []
+        visit_day = _day(record.get("Date"))
+        if visit_day is not None and _text(record.get("Full_Name")):
+            out += [(self.visits_by_day, visit_day.isoformat(), 1), (self.visits_by_week, _week(visit_day), 1)]
+        appt_day = _day(record.get("Appt_Date"))
+        if appt_day is not None:
+            kind = payment_type(record.get("Appt_Payment"))
+            out += [
+                (self.appointments_by_day, appt_day.isoformat(), 1),
+                (self.payment_counts, kind, 1),
+                (self.payment_amounts, kind, payment_amount(record.get("Appt_Payment"))),
+            ]
+        diagnosis = _text(record.get("Diagnosis"))
+        if diagnosis:
+            out.append((self.diagnoses, " ".join(diagnosis.split()).title(), 1))
+        return out
+
+    def apply(self, old, new, new_row=False):
+        """Account for a row changing from ``old`` to ``new`` (old=None for an insert)."""
+        with self._lock:
+            changes = [(t, k, -v) for t, k, v in self._contributions(old or {})] + self._contributions(new)
+            for table, key, amount in changes:
+                table[key] += amount
+            for table, key, _ in changes:
+                if key in table and table[key] == 0:
+                    del table[key]
+            if new_row:
+                self.rows += 1
+            self.version += 1
+            self._save()
+
+    def rebuild(self, df):
+        """Recompute every aggregate from the stored rows (one vectorized pass)."""
+        df = df.reindex(columns=STATS_COLUMNS)
+        text = {col: df[col].fillna("").astype(str).str.strip() for col in STATS_COLUMNS}
+        visit_days = pd.to_datetime(
+            text["Date"].where(text["Full_Name"] != ""), errors="coerce", format="mixed"
+        ).dropna()
+        appts = pd.to_datetime(text["Appt_Date"].replace("", None), errors="coerce", format="mixed")
+        payments = text["Appt_Payment"][appts.notna()]
+        kinds = payments.map(payment_type)
+        iso = visit_days.dt.isocalendar()
+        with self._lock:
+            self._reset()
+            self.visits_by_day.update(visit_days.dt.strftime("%Y-%m-%d").value_counts().to_dict())
+            self.visits_by_week.update(
+                (iso["year"].astype(str) + "-W" + iso["week"].astype(str).str.zfill(2)).value_counts().to_dict()
+            )
+            self.appointments_by_day.update(appts.dropna().dt.strftime("%Y-%m-%d").value_counts().to_dict())
+            self.payment_counts.update(kinds.value_counts().to_dict())
+            self.payment_amounts.update(payments.map(payment_amount).groupby(kinds).sum().to_dict())
+            diagnoses = text["Diagnosis"][text["Diagnosis"] != ""].str.split().str.join(" ").str.title()
+            self.diagnoses.update(diagnoses.value_counts().to_dict())
+            self.rows = len(df)
+            self.version += 1
+            self._save()
+        return self
+
+    def _save(self):
+        state = {"rows": self.rows, **{name: dict(getattr(self, name)) for name in STATS_TABLES}}
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    # ----- reading -----
+    def daily_visits(self, today, days=30):
+        return self._series(self.visits_by_day, today - timedelta(days=days - 1), today)
+
+    def weekly_visits(self, today, weeks=12):
+        keys = [_week(today - timedelta(weeks=w)) for w in reversed(range(weeks))]
+        with self._lock:
+            return pd.Series([self.visits_by_week.get(k, 0) for k in keys], index=keys, dtype=int)
+
+    def appointment_load(self, today, days=14):
+        return self._series(self.appointments_by_day, today, today + timedelta(days=days - 1))
+
+    def payments(self):
+        with self._lock:
+            return pd.DataFrame({
+                "Appointments": pd.Series(self.payment_counts, dtype=int),
+                "Amount": pd.Series(self.payment_amounts, dtype=float),
+            }).fillna(0).sort_values("Appointments", ascending=False)
+
+    def top_diagnoses(self, n=10):
+        with self._lock:
+            return pd.Series(dict(self.diagnoses.most_common(n)), dtype=int)
+
+    def _series(self, table, first, last):
+        days = pd.date_range(first, last, freq="D").strftime("%Y-%m-%d")
+        with self._lock:
+            return pd.Series([table.get(d, 0) for d in days], index=days, dtype=int)
+
+
+def render_charts(stats, today):
+    """PNG bytes per chart title; matplotlib is imported only when a chart is drawn."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    charts = {}
+
+    def save(title, series, kind="bar", horizontal=False):
+        fig, ax = plt.subplots(figsize=(7, 3))
+        if series.empty:
+            ax.text(0.5, 0.5, "No data yet", ha="center", va="center")
+            ax.set_axis_off()
+        elif horizontal:
+            series.iloc[::-1].plot.barh(ax=ax, color="#4c72b0")
+        else:
+            series.plot(kind=kind, ax=ax, color="#4c72b0")
+            ax.tick_params(axis="x", labelrotation=60, labelsize=7)
+        ax.set_title(title)
+        fig.tight_layout()
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png", dpi=100)
+        plt.close(fig)
+        charts[title] = buffer.getvalue()
+
+    daily = stats.daily_visits(today)
+    save("Visits per day (last 30 days)", daily.rename(index=lambda d: d[5:]))
+    save("Visits per week (last 12 weeks)", stats.weekly_visits(today), kind="line")
+    save("Appointments booked (next 14 days)", stats.appointment_load(today).rename(index=lambda d: d[5:]))
+    save("Appointments by payment type", stats.payments()["Appointments"])
+    save("Top diagnoses", stats.top_diagnoses(), horizontal=True)
+    return charts
@@ -0,0 +1,62 @@
+import threading
+import time
+
+# ---------- Shared, version-invalidated dataset ----------
+class SharedDataset:
+    """One DataFrame shared by every Streamlit session in the process.
+
+    ``loader`` does the expensive read (e.g. ``get_all_records``). ``probe`` is
+    a cheap remote check (e.g. the sheet's row count); once the TTL has passed
+    it is called and the data reloaded only when its answer changed. Local
+    writes call ``replace`` or ``invalidate`` so they never wait for the TTL.
+
+    Callers must treat the returned DataFrame as read-only.
+    """
+
+    def __init__(self, loader, probe=None, ttl=30.0):
+        self.loader = loader
+        self.probe = probe
+        self.ttl = ttl
+        self.version = 0
+        self._df = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _probe(self):
+        if self.probe is None:
+            return None
+        try:
+            return self.probe()
+        except Exception:
+            return None
+
+    def _reload(self):
+        self._df = self.loader()
+        self._signature = self._probe()
+        self._checked_at = time.monotonic()
+        self.version += 1
+
+    def get(self, force_check=False):
+        """Return the shared DataFrame, reloading it only if the remote changed."""
+        with self._lock:
+            if self._df is None:
+                self._reload()
+            elif force_check or time.monotonic() - self._checked_at >= self.ttl:
+                signature = self._probe()
+                self._checked_at = time.monotonic()
+                if self.probe is None or (signature is not None and signature != self._signature):
+                    self._reload()
+            return self._df
+
+    def replace(self, df, signature=None):
+        """Install data we just wrote ourselves, skipping the next download."""
+        with self._lock:
+            self._df = df
+            self._signature = signature if signature is not None else self._probe()
+            self._checked_at = time.monotonic()
+            self.version += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._df = None
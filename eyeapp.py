@@ -3,11 +3,25 @@ import pandas as pd
 import os
 import gspread
 from google.oauth2.service_account import Credentials
-from datetime import date, timedelta
+from datetime import date, datetime
+from appointment_slots import ClinicHours, SlotIndex, format_minutes, format_slot, parse_slot, slot_label
+from booking_keys import BookingKeys, booking_key
+from bookings_view import BookingsView
+from dataset_cache import SharedDataset
+from partitions import MonthPartitions, YearWorksheets, hot_rows
+from profiling import TracedWorksheet, profiler_panel, span, start_rerun, timed
+from sheet_connection import SHEET_STATUS_LABELS, SheetConnection
+from sheet_quota import QuotaWorksheet
+from sheet_sync import SyncQueue
 
 # ---------- Constants ----------
-CSV_FILE = "eye_data.csv"
+CSV_FILE = "eye_data.csv"  # imported into the month partitions on first run
+PARTITIONS_DIR = "bookings"
+YEAR_SHEET_PREFIX = "Bookings"  # eyeapp1.py keeps its own, its time column differs
+UPLOAD_QUEUE = "bookings.upload_queue.jsonl"
 SHEET_ID = "1keLx7iBH92_uKxj-Z70iTmAVus7X9jxaFXl_SQ-mZvU"
+BOOKINGS_TTL = 30  # seconds between remote change checks
+FREE_SLOTS_SHOWN = 5
 
 REQUIRED_COLUMNS = [
     "Patient Name",
@@ -16,9 +30,13 @@ REQUIRED_COLUMNS = [
     "Payment"
 ]
 
+# ---------- Profiling ----------
+# One trace line per rerun in clinic_trace.jsonl; spans below mark the I/O steps
+trace = start_rerun("eyeapp.py", st.session_state)
+trace.page = "Appointments"
+
 # ---------- Google Sheets Setup ----------
-@st.cache_resource
-def get_sheet():
+def open_sheet(connection):
     scope = [
         "https://www.googleapis.com/auth/spreadsheets",
         "https://www.googleapis.com/auth/drive",
@@ -26,13 +44,16 @@ def get_sheet():
     creds = Credentials.from_service_account_info(
         st.secrets["gcp_service_account"], scopes=scope
     )
+    quota = st.secrets.get("sheets_quota", {})  # reads_per_minute / writes_per_minute
     client = gspread.authorize(creds)
-    sheet = client.open_by_key(SHEET_ID).sheet1
+    spreadsheet = client.open_by_key(SHEET_ID)
+    # Every call is rate limited to the Sheets quota and retried on 429/5xx
+    sheet = QuotaWorksheet(spreadsheet.sheet1, **quota)
 
     # --- Check for duplicate headers ---
     headers = sheet.row_values(1)
     if len(headers) != len(set(headers)):
-        st.warning("Duplicate headers detected in Google Sheet, fixing automatically.")
+        connection.notify("Duplicate headers detected in Google Sheet, fixed automatically.")
         new_headers = []
         seen = {}
         for h in headers:
@@ -44,43 +65,170 @@ def get_sheet():
                 new_headers.append(h)
         sheet.update("1:1", [new_headers])
 
-    return sheet
+    # One worksheet per year ("Bookings 2025"); the all-years sheet is copied over once
+    years = YearWorksheets(
+        TracedWorksheet(sheet.sibling(spreadsheet)), REQUIRED_COLUMNS, "Appointment Date",
+        prefix=YEAR_SHEET_PREFIX, wrap=lambda worksheet: TracedWorksheet(sheet.sibling(worksheet)),
+    )
+    try:
+        years.split(sheet)
+    except ValueError as e:
+        connection.notify(f"Bookings were not copied from the first worksheet: {e}")
+    return years
+
+@st.cache_resource
+def get_sheet_connection():
+    # Auth and the header check run in the background; pages start from local data
+    return SheetConnection(open_sheet).start()
+
+connection = get_sheet_connection()
+
+# ---------- Local storage ----------
+def read_legacy_csv():
+    if not os.path.exists(CSV_FILE):
+        return pd.DataFrame(columns=REQUIRED_COLUMNS)
+    return pd.read_csv(CSV_FILE, dtype=str)
+
+@st.cache_resource
+@timed("store.open")
+def get_store():
+    # One file per appointment month; finished months are archived by the rollover
+    return MonthPartitions(PARTITIONS_DIR, REQUIRED_COLUMNS, "Appointment Date", import_from=read_legacy_csv)
+
+store = get_store()
+
+@st.cache_resource(max_entries=1)
+@timed("store.rollover")
+def rollover(month):
+    """Archive the months that have ended, once per month."""
+    return store.rollover(date.today())
+
+rollover(date.today().strftime("%Y-%m"))
+
+@st.cache_resource
+def get_upload_queue():
+    # Bookings saved here while Google Sheets was unreachable, uploaded in the background
+    return SyncQueue(lambda: connection.get(timeout=60), UPLOAD_QUEUE).start()
 
-sheet = get_sheet()
+upload_queue = get_upload_queue()
 
 # ---------- Functions ----------
-def load_bookings():
-    """Load data from Google Sheet or fallback CSV. Does NOT save automatically."""
+@timed("bookings.fetch")
+def fetch_bookings():
+    """Current and upcoming bookings from Google Sheets, or the local partitions while it is unreachable."""
+    today = date.today()
+    if not connection.ready:
+        return store.hot(today)
+    years = connection.sheet
     try:
-        records = sheet.get_all_records()
-        df = pd.DataFrame(records)
-        for col in REQUIRED_COLUMNS:
-            if col not in df.columns:
-                df[col] = ""
-        return df
+        if store.is_empty():
+            # First run on this PC: keep a local copy of every year once
+            with span("store.reset"):
+                store.reset(years.records(years.years()), today)
+        df = hot_rows(years.records(years.hot_years(today)), "Appointment Date", today)
     except Exception as e:
-        st.error(f"⚠️ Failed to load from Google Sheets, using local CSV. Error: {e}")
-        if not os.path.exists(CSV_FILE):
-            pd.DataFrame(columns=REQUIRED_COLUMNS).to_csv(CSV_FILE, index=False)
-        df = pd.read_csv(CSV_FILE)
-        for col in REQUIRED_COLUMNS:
-            if col not in df.columns:
-                df[col] = ""
-        return df
-
-def save_bookings(df):
-    """Save DataFrame locally and to Google Sheet (overwrite)."""
-    df.to_csv(CSV_FILE, index=False)
+        st.error(f"⚠️ Failed to load from Google Sheets, using local data. Error: {e}")
+        return store.hot(today)
+
+    # Bookings still waiting to upload are only on this PC; keep them
+    queued = pd.DataFrame(upload_queue.queued_rows(), columns=REQUIRED_COLUMNS)
+    df = pd.concat([df, hot_rows(queued, "Appointment Date", today)], ignore_index=True)
+
+    # Refresh the local hot months only when the sheet has rows we haven't stored
+    if len(df) != len(store.hot(today)):
+        with span("store.replace"):
+            store.replace(df, today)
+    return df
+
+@st.cache_resource
+def get_bookings_cache():
+    # Row counts of this and later years' worksheets are a cheap probe for rows added from other PCs
+    cache = SharedDataset(
+        fetch_bookings, probe=lambda: connection.get().signature(date.today()), ttl=BOOKINGS_TTL
+    )
+    # Swap the local snapshot for the sheet as soon as it is reachable
+    connection.on_ready(cache.invalidate)
+    return cache
+
+@timed("bookings.load")
+def load_bookings(fresh=False):
+    """Shared bookings DataFrame (read-only). fresh=True forces a remote change check."""
+    return get_bookings_cache().get(force_check=fresh)
+
+@st.cache_resource
+def get_booking_keys():
+    return BookingKeys("Patient Name", "Appointment Date", "Time")
+
+@timed("index.booking_keys")
+def booking_keys(df):
+    """Duplicate-check keys for df, rebuilt only if the data changed elsewhere."""
+    keys, version = get_booking_keys(), get_bookings_cache().version
+    if keys.version != version:
+        keys.rebuild(df, version)
+    return keys
+
+@st.cache_resource
+def get_slot_index():
+    # Opening hours, slot length, closed days and doctors come from the clinic_hours secret
+    return SlotIndex(ClinicHours(**st.secrets.get("clinic_hours", {})), "Appointment Date", "Time")
+
+@timed("index.slots")
+def slot_index(df):
+    """Booked intervals of this month and later, rebuilt only if the data changed elsewhere."""
+    slots, version = get_slot_index(), get_bookings_cache().version
+    if slots.version != version:
+        slots.rebuild(df, version)
+    return slots
+
+def next_free_slots(slots, day, length):
+    """The next free slots from ``day`` (from now on, if it is today)."""
+    now = datetime.now()
+    after = now.hour * 60 + now.minute if day == now.date() else None
+    return slots.free_slots(day, after=after, n=FREE_SLOTS_SHOWN, length=length)
+
+@timed("bookings.save")
+def save_booking(new_record):
+    """Append the booking to its month's partition and its year's worksheet."""
+    with span("store.insert"):
+        store.insert(new_record, date.today())
     try:
-        sheet.clear()
-        sheet.update([df.columns.values.tolist()] + df.values.tolist())
+        years = connection.get(timeout=10)
+        years.append(new_record)
     except Exception as e:
-        st.error(f"❌ Failed to save to Google Sheets: {e}")
+        # Retried in the background; until then the refresh keeps it from the queue
+        upload_queue.enqueue([[new_record[col] for col in REQUIRED_COLUMNS]])
+        get_bookings_cache().invalidate()
+        st.sidebar.warning(f"⚠️ Saved on this PC only; it will be uploaded when Google Sheets is reachable ({e})")
+        return False
+    df = load_bookings()
+    if not hot_rows(pd.DataFrame([new_record]), "Appointment Date", date.today()).empty:
+        df = pd.concat([df, pd.DataFrame([new_record])], ignore_index=True)
+    get_bookings_cache().replace(df)
+    get_booking_keys().add(
+        booking_key(new_record["Patient Name"], new_record["Appointment Date"], new_record["Time"]),
+        version=get_bookings_cache().version,
+    )
+    get_slot_index().add(new_record, version=get_bookings_cache().version)
+    return True
 
 # ---------- Page Setup ----------
 st.set_page_config(page_title="Dr Kawa Clinic (Appointments)", layout="wide")
 st.title("Dr Kawa Clinic (Appointments)")
 
+@st.fragment(run_every=None if connection.ready else 3)
+def sheet_status_badge(rendered_status):
+    st.caption(SHEET_STATUS_LABELS[connection.status])
+    while connection.notices:
+        st.warning(connection.notices.pop(0))
+    if connection.ready and rendered_status != "synced":
+        st.rerun()  # re-render the page from the sheet
+
+with st.sidebar:
+    sheet_status_badge(connection.status)
+    pending_uploads = upload_queue.pending()
+    if pending_uploads:
+        st.caption(f"🔄 Pending upload: {pending_uploads} bookings")
+
 # ---------- Sidebar Form ----------
 st.sidebar.header("Add New Appointment")
 
@@ -88,75 +236,123 @@ if "form_inputs" not in st.session_state:
     st.session_state.form_inputs = {"patient_name": "", "appt_date": date.today(),
                                     "appt_time": "", "payment": ""}
 
+def use_free_slot():
+    """Copy the picked free slot into the date and time inputs."""
+    if st.session_state.free_slot is not None:
+        day, start = st.session_state.free_slot
+        st.session_state.form_inputs.update(appt_date=day, appt_time=format_minutes(start))
+
+hours = get_slot_index().hours
 patient_name = st.sidebar.text_input("Patient Name", value=st.session_state.form_inputs["patient_name"])
 appt_date = st.sidebar.date_input("Appointment Date", value=st.session_state.form_inputs["appt_date"])
-appt_time = st.sidebar.text_input("Time", value=st.session_state.form_inputs["appt_time"])
+duration = st.sidebar.number_input("Duration (minutes)", min_value=5, max_value=240, step=5, value=hours.slot_minutes)
+slot_picker = st.sidebar.container()  # filled below, once this run's save is indexed
+appt_time = st.sidebar.text_input("Time", value=st.session_state.form_inputs["appt_time"], placeholder="HH:MM")
 payment = st.sidebar.text_input("Payment", value=st.session_state.form_inputs["payment"])
 
 if st.sidebar.button("💾 Save Appointment"):
+    slot = parse_slot(appt_time, hours, duration)
     if not patient_name:
         st.sidebar.error("Patient Name is required.")
     elif not appt_time:
         st.sidebar.error("Time is required.")
+    elif slot is None:
+        st.sidebar.error("Time not understood. Use HH:MM, e.g. 09:30 or 14:15.")
+    elif not hours.is_open(appt_date):
+        st.sidebar.error(f"The clinic is closed on {appt_date:%A}s.")
+    elif not hours.within(*slot):
+        st.sidebar.error(f"{appt_time} is outside clinic hours ({hours}).")
     else:
-        df = load_bookings()
+        df = load_bookings(fresh=True)
         new_record = {
             "Patient Name": patient_name.strip(),
             "Appointment Date": appt_date.strftime("%Y-%m-%d"),
-            "Time": appt_time.strip(),
+            "Time": format_slot(*slot, hours),
             "Payment": payment.strip()
         }
 
-        # Check for exact duplicate before saving
-        duplicate_check = df[
-            (df["Patient Name"] == new_record["Patient Name"]) &
-            (df["Appointment Date"] == new_record["Appointment Date"]) &
-            (df["Time"] == new_record["Time"])
-        ]
-        if not duplicate_check.empty:
+        # Check for duplicate (ignoring case and spacing) and for an overlapping booking before saving
+        key = booking_key(new_record["Patient Name"], new_record["Appointment Date"], new_record["Time"])
+        duplicate = key in booking_keys(df)
+        overlapping = not duplicate and slot_index(df).conflicts(appt_date, *slot)
+        if duplicate:
             st.sidebar.warning("This appointment already exists. No duplicate saved.")
-        else:
-            df = pd.concat([df, pd.DataFrame([new_record])], ignore_index=True)
-            save_bookings(df)
+        elif overlapping:
+            others = ", ".join(slot_label(*free, hours) for free in next_free_slots(slot_index(df), appt_date, slot[1]))
+            st.sidebar.warning(f"⛔ {new_record['Time']} is already booked. Next free: {others or 'none'}")
+        elif save_booking(new_record):
             st.sidebar.success("Appointment saved successfully.")
 
-        # Clear form inputs
-        st.session_state.form_inputs = {"patient_name": "", "appt_date": date.today(),
-                                        "appt_time": "", "payment": ""}
+        # Clear form inputs (kept after a clash so another time can be picked)
+        if not overlapping:
+            st.session_state.form_inputs = {"patient_name": "", "appt_date": date.today(),
+                                            "appt_time": "", "payment": ""}
+
+free_doctors = {
+    (day, start): free for day, start, free in next_free_slots(slot_index(load_bookings()), appt_date, duration)
+}
+slot_picker.selectbox(
+    "🕒 Next free slots", list(free_doctors),
+    format_func=lambda slot: slot_label(*slot, free_doctors[slot], hours),
+    index=None, placeholder="Pick a free slot" if free_doctors else "No free slots in the next 60 days",
+    key="free_slot", on_change=use_free_slot,
+)
 
 # ---------- Load Bookings ----------
+@st.cache_resource(max_entries=4)
+@timed("view.build")
+def get_bookings_view(version, today, _bookings):
+    """Day groups of the hot months, rebuilt only when the data version or the day changes."""
+    return BookingsView(_bookings, today, "Time")
+
+@st.cache_resource(max_entries=4)
+@timed("archive.load")
+def get_archive_view(version, today, start, end):
+    """Archived bookings in [start, end]; only the months in that range are read."""
+    return BookingsView(store.range(start, end), today, "Time")
+
 bookings = load_bookings()
-bookings["Appointment Date"] = pd.to_datetime(bookings["Appointment Date"], errors="coerce")
-yesterday = pd.Timestamp(date.today() - timedelta(days=1))
+view = get_bookings_view(get_bookings_cache().version, date.today(), bookings)
 
 # ---------- Main Tabs ----------
 tabs = st.tabs(["📌 Upcoming Appointments", "📂 Appointment Archive"])
 
 # Upcoming
 with tabs[0]:
-    upcoming = bookings[bookings["Appointment Date"] > yesterday]
     st.subheader("📌 Upcoming Appointments")
-    if upcoming.empty:
+    if not view.days:
         st.info("No upcoming appointments.")
     else:
-        upcoming_disp = upcoming.sort_values("Appointment Date")
-        for d in upcoming_disp["Appointment Date"].dt.date.unique():
-            day_df = upcoming_disp[upcoming_disp["Appointment Date"].dt.date == d]
+        for d, day_df_display in view.days:
             with st.expander(d.strftime("📅 %A, %d %B %Y")):
-                day_df_display = day_df[["Patient Name", "Time", "Payment"]].reset_index(drop=True)
-                day_df_display.index = range(1, len(day_df_display)+1)
                 st.dataframe(day_df_display, use_container_width=True)
 
 # Archive
 with tabs[1]:
-    archive = bookings[bookings["Appointment Date"] <= yesterday]
     st.subheader("📂 Appointment Archive")
-    if archive.empty:
+    bounds = store.archive_bounds(date.today())
+    if bounds is None:
         st.info("No archived appointments.")
     else:
-        archive_disp = archive.sort_values("Appointment Date", ascending=False).reset_index(drop=True)
-        archive_disp.index += 1
-        st.dataframe(
-            archive_disp[["Patient Name", "Appointment Date", "Time", "Payment"]],
-            use_container_width=True
+        col1, col2, col3 = st.columns(3)
+        # Nothing is read from the archive until a range is picked
+        date_range = col1.date_input(
+            "Date range", value=(), min_value=bounds[0], max_value=bounds[1], key="archive_range"
         )
+        if len(date_range) < 2:
+            st.caption(f"Archive from {bounds[0]:%B %Y}. Pick a date range to load it.")
+        else:
+            start, end = date_range
+            archive = get_archive_view(store.version, date.today(), start, end)
+            page_size = col2.selectbox("Rows per page", [25, 50, 100], index=1, key="archive_page_size")
+            _, total = archive.archive_page(start, end, page_size=page_size)
+            pages = max(1, -(-total // page_size))
+            page = col3.number_input("Page", min_value=1, max_value=pages, value=1, key=f"archive_page_{start}_{end}_{page_size}")
+            archive_disp, total = archive.archive_page(start, end, page=page, page_size=page_size)
+            st.caption(f"{total} appointments in range, page {page} of {pages}")
+            st.dataframe(archive_disp, use_container_width=True)
+
+# ---------- Profiler ----------
+if st.secrets.get("profiler", False):
+    profiler_panel(metrics=connection.sheet.metrics if connection.ready else None)
+trace.finish()
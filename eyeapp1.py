@@ -1,13 +1,30 @@
 import streamlit as st
 import pandas as pd
-import os
 import gspread
 from google.oauth2.service_account import Credentials
-from datetime import date, timedelta
+from datetime import date, datetime
+from appointment_slots import ClinicHours, SlotIndex, format_minutes, format_slot, parse_slot, slot_label
+from booking_keys import BookingKeys, booking_key
+from bookings_view import BookingsView
+from dataset_cache import SharedDataset
+from journal_store import JournalStore
+from partitions import MonthPartitions, SQLiteMonths, YearWorksheets, hot_rows
+from profiling import TracedWorksheet, profiler_panel, span, start_rerun, timed
+from sheet_connection import SHEET_STATUS_LABELS, SheetConnection
+from sheet_quota import QuotaWorksheet
+from sheet_sync import SyncQueue
+from sqlite_store import SQLiteStore, quote
+from typed_snapshot import BOOKING_SCHEMA
 
 # ---------- Constants ----------
-CSV_FILE = "eye_data.csv"
+CSV_FILE = "eye_data.csv"  # imported into the month partitions on first run
+PARTITIONS_DIR = "bookings_manual"  # eyeapp.py keeps its "Time" bookings in "bookings"
+YEAR_SHEET_PREFIX = "Manual Bookings"
+UPLOAD_QUEUE = "bookings_manual.upload_queue.jsonl"
 SHEET_ID = "1keLx7iBH92_uKxj-Z70iTmAVus7X9jxaFXl_SQ-mZvU"
+DB_PATH = "eye_data.db"
+BOOKINGS_TTL = 30  # seconds between remote change checks
+FREE_SLOTS_SHOWN = 5
 
 REQUIRED_COLUMNS = [
     "Patient Name",
@@ -16,9 +33,14 @@ REQUIRED_COLUMNS = [
     "Payment"
 ]
 
+# ---------- Profiling ----------
+# One trace line per rerun in clinic_trace.jsonl; spans below mark the I/O steps
+trace = start_rerun("eyeapp1.py", st.session_state)
+trace.page = "Appointments"
+
+
 # ---------- Google Sheets Setup ----------
-@st.cache_resource
-def get_sheet():
+def open_sheet(connection):
     scope = [
         "https://www.googleapis.com/auth/spreadsheets",
         "https://www.googleapis.com/auth/drive",
@@ -26,13 +48,16 @@ def get_sheet():
     creds = Credentials.from_service_account_info(
         st.secrets["gcp_service_account"], scopes=scope
     )
+    quota = st.secrets.get("sheets_quota", {})  # reads_per_minute / writes_per_minute
     client = gspread.authorize(creds)
-    sheet = client.open_by_key(SHEET_ID).sheet1
+    spreadsheet = client.open_by_key(SHEET_ID)
+    # Every call is rate limited to the Sheets quota and retried on 429/5xx
+    sheet = QuotaWorksheet(spreadsheet.sheet1, **quota)
 
     # --- Fix duplicate headers if exist ---
     headers = sheet.row_values(1)
     if len(headers) != len(set(headers)):
-        st.warning("Duplicate headers detected in Google Sheet, fixing automatically.")
+        connection.notify("Duplicate headers detected in Google Sheet, fixed automatically.")
         new_headers, seen = [], {}
         for h in headers:
             if h in seen:
@@ -43,51 +68,200 @@ def get_sheet():
                 new_headers.append(h)
         sheet.update("1:1", [new_headers])
 
-    return sheet
+    # One worksheet per year ("Manual Bookings 2025"); the all-years sheet is copied over once
+    years = YearWorksheets(
+        TracedWorksheet(sheet.sibling(spreadsheet)), REQUIRED_COLUMNS, "Appointment Date",
+        prefix=YEAR_SHEET_PREFIX, wrap=lambda worksheet: TracedWorksheet(sheet.sibling(worksheet)),
+    )
+    try:
+        years.split(sheet)
+    except ValueError as e:
+        connection.notify(f"Bookings were not copied from the first worksheet: {e}")
+    return years
+
+
+@st.cache_resource
+def get_sheet_connection():
+    # Auth and the header check run in the background; pages start from the local store
+    return SheetConnection(open_sheet).start()
+
+
+connection = get_sheet_connection()
+
+# ---------- Local storage ----------
+@st.cache_resource
+@timed("store.open")
+def get_store():
+    # "csv": one file per appointment month, finished months archived by the rollover;
+    # "sqlite": bookings table in eye_data.db, where the date index does the partitioning
+    if st.secrets.get("storage_backend", "csv") == "sqlite":
+        return SQLiteMonths(SQLiteStore(
+            DB_PATH, REQUIRED_COLUMNS, table="bookings",
+            indexes=[("idx_booking_date", quote("Appointment Date"), None)],
+        ), "Appointment Date")
+    return MonthPartitions(
+        PARTITIONS_DIR, REQUIRED_COLUMNS, "Appointment Date", schema=BOOKING_SCHEMA,
+        import_from=lambda: JournalStore(CSV_FILE, REQUIRED_COLUMNS, schema=BOOKING_SCHEMA).load(),
+    )
+
+store = get_store()
+
+
+@st.cache_resource(max_entries=1)
+@timed("store.rollover")
+def rollover(month):
+    """Archive the months that have ended, once per month."""
+    return store.rollover(date.today())
 
 
-sheet = get_sheet()
+rollover(date.today().strftime("%Y-%m"))
+
+
+@st.cache_resource
+def get_upload_queue():
+    # Bookings saved here while Google Sheets was unreachable, uploaded in the background
+    return SyncQueue(lambda: connection.get(timeout=60), UPLOAD_QUEUE).start()
+
+
+upload_queue = get_upload_queue()
 
 # ---------- Functions ----------
+@timed("bookings.fetch")
+def fetch_bookings():
+    """Current and upcoming bookings from Google Sheets, or the local copy while it is unreachable."""
+    today = date.today()
+    if not connection.ready:
+        return store.hot(today)
+    years = connection.sheet
+    try:
+        if store.is_empty():
+            # First run on this PC: keep a local copy of every year once
+            with span("store.reset"):
+                store.reset(years.records(years.years()), today)
+        df = hot_rows(years.records(years.hot_years(today)), "Appointment Date", today)
+    except Exception as e:
+        st.error(f"⚠️ Failed to load from Google Sheets, using local data. Error: {e}")
+        return store.hot(today)
+
+    # Bookings still waiting to upload are only on this PC; keep them
+    queued = pd.DataFrame(upload_queue.queued_rows(), columns=REQUIRED_COLUMNS)
+    df = pd.concat([df, hot_rows(queued, "Appointment Date", today)], ignore_index=True)
+
+    # Refresh the local hot months only when the sheet has rows we haven't stored
+    if len(df) != len(store.hot(today)):
+        with span("store.replace"):
+            store.replace(df, today)
+    return df
+
+
+@st.cache_resource
+def get_bookings_cache():
+    # Row counts of this and later years' worksheets are a cheap probe for rows added from other PCs
+    cache = SharedDataset(
+        fetch_bookings, probe=lambda: connection.get().signature(date.today()), ttl=BOOKINGS_TTL
+    )
+    # Swap the local copy for the sheet as soon as it is reachable
+    connection.on_ready(cache.invalidate)
+    return cache
+
+
+@timed("bookings.load")
 def load_bookings():
-    """Load CSV locally, create if missing, sync from Google Sheets."""
-    if not os.path.exists(CSV_FILE):
-        pd.DataFrame(columns=REQUIRED_COLUMNS).to_csv(CSV_FILE, index=False)
+    """Shared bookings DataFrame (read-only), reloaded only when the sheet changed."""
+    return get_bookings_cache().get()
+
 
-    # Always pull fresh from Google Sheet
-    records = sheet.get_all_records()
-    df = pd.DataFrame(records)
+@st.cache_resource
+def get_booking_keys():
+    return BookingKeys("Patient Name", "Appointment Date", "Appointment Time (manual)")
 
-    # Ensure required columns exist
-    for col in REQUIRED_COLUMNS:
-        if col not in df.columns:
-            df[col] = ""
 
-    # Save local copy
-    df.to_csv(CSV_FILE, index=False)
-    return df
+@timed("index.booking_keys")
+def booking_keys():
+    """Duplicate-check keys for the cached bookings, rebuilt only if the data changed elsewhere."""
+    keys, cache = get_booking_keys(), get_bookings_cache()
+    df = cache.get()
+    if keys.version != cache.version:
+        keys.rebuild(df, cache.version)
+    return keys
+
+
+@st.cache_resource
+def get_slot_index():
+    # Opening hours, slot length, closed days and doctors come from the clinic_hours secret
+    return SlotIndex(
+        ClinicHours(**st.secrets.get("clinic_hours", {})), "Appointment Date", "Appointment Time (manual)"
+    )
 
 
+@timed("index.slots")
+def slot_index():
+    """Booked intervals of this month and later, rebuilt only if the data changed elsewhere."""
+    slots, cache = get_slot_index(), get_bookings_cache()
+    df = cache.get()
+    if slots.version != cache.version:
+        slots.rebuild(df, cache.version)
+    return slots
+
+
+def next_free_slots(day, length):
+    """The next free slots from ``day`` (from now on, if it is today)."""
+    now = datetime.now()
+    after = now.hour * 60 + now.minute if day == now.date() else None
+    return slot_index().free_slots(day, after=after, n=FREE_SLOTS_SHOWN, length=length)
+
+
+@timed("bookings.save")
 def save_booking_to_sheet(new_record):
-    """Save only new record directly to Google Sheet + CSV."""
-    try:
-        # Append row to sheet
-        sheet.append_row(list(new_record.values()), value_input_option="RAW")
+    """Append the new record to its month's local partition and its year's worksheet.
 
-        # Append row to local CSV
-        df = pd.read_csv(CSV_FILE)
-        df = pd.concat([df, pd.DataFrame([new_record])], ignore_index=True)
-        df.to_csv(CSV_FILE, index=False)
-        return True
+    Returns False if the upload failed and was queued instead.
+    """
+    # Append row to the local month
+    with span("store.insert"):
+        store.insert(new_record, date.today())
+    try:
+        # Append row to the year's worksheet
+        years = connection.get(timeout=10)
+        years.append(new_record)
     except Exception as e:
-        st.error(f"❌ Failed to save booking: {e}")
+        # Retried in the background; until then the refresh keeps it from the queue
+        upload_queue.enqueue([[new_record[col] for col in REQUIRED_COLUMNS]])
+        get_bookings_cache().invalidate()
+        st.sidebar.warning(f"⚠️ Saved on this PC only; it will be uploaded when Google Sheets is reachable ({e})")
         return False
+    df = load_bookings()
+    if not hot_rows(pd.DataFrame([new_record]), "Appointment Date", date.today()).empty:
+        df = pd.concat([df, pd.DataFrame([new_record])], ignore_index=True)
+    get_bookings_cache().replace(df)
+    get_booking_keys().add(
+        booking_key(new_record["Patient Name"], new_record["Appointment Date"], new_record["Appointment Time (manual)"]),
+        version=get_bookings_cache().version,
+    )
+    get_slot_index().add(new_record, version=get_bookings_cache().version)
+    return True
 
 
 # ---------- Page Setup ----------
 st.set_page_config(page_title="Global Eye Center (Appointments)", layout="wide")
 st.title("Global Eye Center (Appointments)")
 
+
+@st.fragment(run_every=None if connection.ready else 3)
+def sheet_status_badge(rendered_status):
+    st.caption(SHEET_STATUS_LABELS[connection.status])
+    while connection.notices:
+        st.warning(connection.notices.pop(0))
+    if connection.ready and rendered_status != "synced":
+        st.rerun()  # re-render the page from the sheet
+
+
+with st.sidebar:
+    sheet_status_badge(connection.status)
+    pending_uploads = upload_queue.pending()
+    if pending_uploads:
+        st.caption(f"🔄 Pending upload: {pending_uploads} bookings")
+
 # ---------- Sidebar Form ----------
 st.sidebar.header("Add New Appointment")
 
@@ -99,26 +273,55 @@ if "form_inputs" not in st.session_state:
         "payment": ""
     }
 
+
+def use_free_slot():
+    """Copy the picked free slot into the date and time inputs."""
+    if st.session_state.free_slot is not None:
+        day, start = st.session_state.free_slot
+        st.session_state.form_inputs.update(appt_date=day, appt_time=format_minutes(start))
+
+
+hours = get_slot_index().hours
 patient_name = st.sidebar.text_input("Patient Name", value=st.session_state.form_inputs["patient_name"])
 appt_date = st.sidebar.date_input("Appointment Date", value=st.session_state.form_inputs["appt_date"])
+duration = st.sidebar.number_input("Duration (minutes)", min_value=5, max_value=240, step=5, value=hours.slot_minutes)
+slot_picker = st.sidebar.container()  # filled below, once this run's save is indexed
 appt_time = st.sidebar.text_input("Appointment Time (manual)", placeholder="HH:MM", value=st.session_state.form_inputs["appt_time"])
 payment = st.sidebar.text_input("Payment", placeholder="e.g., Cash / Card / None", value=st.session_state.form_inputs["payment"])
 
 if st.sidebar.button("💾 Save Appointment"):
+    slot = parse_slot(appt_time, hours, duration)
     if not patient_name:
         st.sidebar.error("Patient Name is required.")
     elif not appt_time:
         st.sidebar.error("Appointment Time is required.")
+    elif slot is None:
+        st.sidebar.error("Appointment Time not understood. Use HH:MM, e.g. 09:30 or 14:15.")
+    elif not hours.is_open(appt_date):
+        st.sidebar.error(f"The clinic is closed on {appt_date:%A}s.")
+    elif not hours.within(*slot):
+        st.sidebar.error(f"{appt_time} is outside clinic hours ({hours}).")
     else:
         new_record = {
             "Patient Name": patient_name.strip(),
             "Appointment Date": appt_date.strftime("%Y-%m-%d"),
-            "Appointment Time (manual)": appt_time.strip(),
+            "Appointment Time (manual)": format_slot(*slot, hours),
             "Payment": payment.strip()
         }
-        if save_booking_to_sheet(new_record):
-            st.sidebar.success("Appointment saved successfully.")
-            # Clear form
+        key = booking_key(
+            new_record["Patient Name"], new_record["Appointment Date"], new_record["Appointment Time (manual)"]
+        )
+        if key in booking_keys():
+            st.sidebar.warning("This appointment already exists. No duplicate saved.")
+        elif slot_index().conflicts(appt_date, *slot):
+            others = ", ".join(slot_label(*free, hours) for free in next_free_slots(appt_date, slot[1]))
+            st.sidebar.warning(
+                f"⛔ {new_record['Appointment Time (manual)']} is already booked. Next free: {others or 'none'}"
+            )
+        else:
+            if save_booking_to_sheet(new_record):
+                st.sidebar.success("Appointment saved successfully.")
+            # Clear form (a booking whose upload was queued is saved too)
             st.session_state.form_inputs = {
                 "patient_name": "",
                 "appt_date": date.today(),
@@ -126,15 +329,31 @@ if st.sidebar.button("💾 Save Appointment"):
                 "payment": ""
             }
 
+free_doctors = {(day, start): free for day, start, free in next_free_slots(appt_date, duration)}
+slot_picker.selectbox(
+    "🕒 Next free slots", list(free_doctors),
+    format_func=lambda slot: slot_label(*slot, free_doctors[slot], hours),
+    index=None, placeholder="Pick a free slot" if free_doctors else "No free slots in the next 60 days",
+    key="free_slot", on_change=use_free_slot,
+)
+
 # ---------- Load Bookings ----------
-bookings = load_bookings()
-bookings["Appointment Date"] = pd.to_datetime(bookings["Appointment Date"], errors="coerce")
+@st.cache_resource(max_entries=4)
+@timed("view.build")
+def get_bookings_view(version, today, _bookings):
+    """Day groups of the hot months, rebuilt only when the data version or the day changes."""
+    return BookingsView(_bookings, today, "Appointment Time (manual)")
+
 
-today = pd.Timestamp(date.today())
+@st.cache_resource(max_entries=4)
+@timed("archive.load")
+def get_archive_view(version, today, start, end):
+    """Archived bookings in [start, end]; only the months in that range are read."""
+    return BookingsView(store.range(start, end), today, "Appointment Time (manual)")
 
-# Split into upcoming & archive
-upcoming = bookings[bookings["Appointment Date"].dt.date >= today.date()]
-archive = bookings[bookings["Appointment Date"].dt.date < today.date()]
+
+bookings = load_bookings()
+view = get_bookings_view(get_bookings_cache().version, date.today(), bookings)
 
 # ---------- Main Tabs ----------
 tabs = st.tabs(["📌 Upcoming Appointments", "📂 Appointment Archive"])
@@ -143,27 +362,42 @@ tabs = st.tabs(["📌 Upcoming Appointments", "📂 Appointment Archive"])
 with tabs[0]:
     st.subheader("📌 Upcoming Appointments")
 
-    if upcoming.empty:
+    if not view.days:
         st.info("No upcoming appointments.")
     else:
-        upcoming_disp = upcoming.sort_values("Appointment Date")
-        for d in upcoming_disp["Appointment Date"].dt.date.unique():
-            day_df = upcoming_disp[upcoming_disp["Appointment Date"].dt.date == d]
+        for d, day_df_display in view.days:
             with st.expander(d.strftime("📅 %A, %d %B %Y")):
-                day_df_display = day_df[["Patient Name", "Appointment Time (manual)", "Payment"]].reset_index(drop=True)
-                day_df_display.index = range(1, len(day_df_display) + 1)
                 st.dataframe(day_df_display, use_container_width=True)
 
 # Archive
 with tabs[1]:
     st.subheader("📂 Appointment Archive")
 
-    if archive.empty:
+    bounds = store.archive_bounds(date.today())
+    if bounds is None:
         st.info("No archived appointments.")
     else:
-        archive_disp = archive.sort_values("Appointment Date", ascending=False).reset_index(drop=True)
-        archive_disp.index += 1
-        st.dataframe(
-            archive_disp[["Patient Name", "Appointment Date", "Appointment Time (manual)", "Payment"]],
-            use_container_width=True
+        col1, col2, col3 = st.columns(3)
+        # Nothing is read from the archive until a range is picked
+        date_range = col1.date_input(
+            "Date range", value=(), min_value=bounds[0], max_value=bounds[1], key="archive_range"
         )
+        if len(date_range) < 2:
+            st.caption(f"Archive from {bounds[0]:%B %Y}. Pick a date range to load it.")
+        else:
+            start, end = date_range
+            archive = get_archive_view(store.version, date.today(), start, end)
+            page_size = col2.selectbox("Rows per page", [25, 50, 100], index=1, key="archive_page_size")
+            _, total = archive.archive_page(start, end, page_size=page_size)
+            pages = max(1, -(-total // page_size))
+            page = col3.number_input(
+                "Page", min_value=1, max_value=pages, value=1, key=f"archive_page_{start}_{end}_{page_size}"
+            )
+            archive_disp, total = archive.archive_page(start, end, page=page, page_size=page_size)
+            st.caption(f"{total} appointments in range, page {page} of {pages}")
+            st.dataframe(archive_disp, use_container_width=True)
+
+# ---------- Profiler ----------
+if st.secrets.get("profiler", False):
+    profiler_panel(metrics=connection.sheet.metrics if connection.ready else None)
+trace.finish()
@@ -0,0 +1,145 @@
+import re
+import threading
+import time
+from collections import Counter
+
+import gspread
+from google.oauth2 import service_account
+
+# ---------- In-process stand-in for a gspread Worksheet ----------
+def _a1_start(range_name):
+    """First (row, column) of an A1 range such as "A5:D5" or "1:1" (1-based)."""
+    match = re.match(r"(?:.*!)?([A-Z]*)(\d*)", range_name)
+    letters, digits = match.groups()
+    col = 0
+    for ch in letters:
+        col = col * 26 + ord(ch) - 64
+    return int(digits or 1), max(col, 1)
+
+
+class FakeWorksheet:
+    """The Worksheet calls the apps make, served from a list of rows.
+
+    Every call sleeps ``latency`` seconds first (a Sheets round trip) and is
+    counted in ``calls``; ``cells`` adds up the cells read and written.
+    """
+
+    def __init__(self, rows=None, latency=0.0, title="Sheet1"):
+        self.rows = [list(map(str, row)) for row in rows or []]
+        self.latency = latency
+        self.title = title
+        self.calls = Counter()
+        self.cells = 0
+        self._lock = threading.Lock()
+
+    def _call(self, name, cells=0):
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls[name] += 1
+            self.cells += cells
+
+    @property
+    def row_count(self):
+        return len(self.rows)
+
+    # ----- reads -----
+    def get_all_values(self):
+        self._call("get_all_values", sum(map(len, self.rows)))
+        return [list(row) for row in self.rows]
+
+    def get_all_records(self):
+        self._call("get_all_records", sum(map(len, self.rows)))
+        if not self.rows:
+            return []
+        header = self.rows[0]
+        return [dict(zip(header, row + [""] * (len(header) - len(row)))) for row in self.rows[1:]]
+
+    def row_values(self, row):
+        values = list(self.rows[row - 1]) if len(self.rows) >= row else []
+        self._call("row_values", len(values))
+        return values
+
+    def col_values(self, col):
+        values = [row[col - 1] if len(row) >= col else "" for row in self.rows]
+        self._call("col_values", len(values))
+        return values
+
+    # ----- writes -----
+    def append_rows(self, values, value_input_option=None, **kwargs):
+        self._call("append_rows", sum(map(len, values)))
+        start = len(self.rows) + 1
+        self.rows.extend(list(map(str, row)) for row in values)
+        return {"updates": {"updatedRange": f"{self.title}!A{start}:Z{len(self.rows)}"}}
+
+    def append_row(self, values, value_input_option=None, **kwargs):
+        self._call("append_row", len(values))
+        self.rows.append(list(map(str, values)))
+        return {"updates": {"updatedRange": f"{self.title}!A{len(self.rows)}"}}
+
+    def _write(self, range_name, values):
+        row, col = _a1_start(range_name)
+        for offset, new in enumerate(values):
+            while len(self.rows) < row + offset:
+                self.rows.append([])
+            current = self.rows[row - 1 + offset]
+            current.extend([""] * (col - 1 + len(new) - len(current)))
+            current[col - 1:col - 1 + len(new)] = map(str, new)
+
+    def update(self, *args, **kwargs):
+        # update(values), update(range, values) and update(values, range)
+        if args and isinstance(args[0], str):
+            range_name, values = args[0], args[1]
+        else:
+            values = args[0] if args else kwargs["values"]
+            range_name = args[1] if len(args) > 1 else kwargs.get("range_name", "A1")
+        self._call("update", sum(map(len, values)))
+        self._write(range_name, values)
+
+    def batch_update(self, data, **kwargs):
+        self._call("batch_update", sum(sum(map(len, item["values"])) for item in data))
+        for item in data:
+            self._write(item["range"], item["values"])
+
+    def clear(self):
+        self._call("clear")
+        self.rows = []
+
+
+class FakeSpreadsheet:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.sheet1 = FakeWorksheet(latency=latency)
+        self._worksheets = {self.sheet1.title: self.sheet1}
+        self.opened = threading.Event()
+
+    def worksheets(self):
+        return list(self._worksheets.values())
+
+    def worksheet(self, title):
+        if title not in self._worksheets:
+            raise gspread.exceptions.WorksheetNotFound(title)
+        return self._worksheets[title]
+
+    def add_worksheet(self, title, rows=0, cols=0):
+        if title in self._worksheets:
+            raise gspread.exceptions.GSpreadException(f'A sheet with the name "{title}" already exists.')
+        self._worksheets[title] = FakeWorksheet(latency=self.latency, title=title)
+        return self._worksheets[title]
+
+
+def install(spreadsheet, auth_latency=0.0):
+    """Route service-account auth and ``open_by_key`` to ``spreadsheet``."""
+
+    class FakeClient:
+        def open_by_key(self, key):
+            time.sleep(spreadsheet.latency)
+            spreadsheet.opened.set()
+            return spreadsheet
+
+    def authorize(credentials):
+        time.sleep(auth_latency)
+        return FakeClient()
+
+    gspread.authorize = authorize
+    service_account.Credentials.from_service_account_info = staticmethod(lambda *args, **kwargs: None)
+    return spreadsheet
@@ -0,0 +1,245 @@
+import json
+import os
+import threading
+
+import pandas as pd
+
+from typed_snapshot import feather, read_snapshot, snapshot_columns, to_strings, to_typed, write_snapshot
+
+# ---------- Append-only journal storage ----------
+class JournalStore:
+    """A CSV snapshot plus an append-only JSONL journal of inserts and updates.
+
+    Each save appends one fsync'd journal line instead of rewriting the CSV,
+    so write cost stays constant as the history grows. Journal records carry
+    the row index they apply to, which makes replay idempotent: a crash in
+    the middle of compaction can only replay records the snapshot already
+    contains. Once the journal passes ``compact_bytes`` a background thread
+    folds it into a fresh snapshot.
+
+    The replayed frame is kept in memory and replaced on every write (never
+    changed in place, so a frame handed out stays as it was), so reruns do
+    not re-parse the files. ``version`` goes up on every write so
+    derived data (exports, charts) can be cached per version.
+
+    With a ``schema`` (and pyarrow installed) the snapshot is a typed,
+    uncompressed Feather file next to the CSV, read memory-mapped; the CSV is
+    still rewritten at compaction as the interchange copy.
+    """
+
+    def __init__(self, snapshot_path, columns, journal_path=None, compact_bytes=1_000_000, schema=None):
+        self.snapshot_path = snapshot_path
+        base = os.path.splitext(snapshot_path)[0]
+        self.journal_path = journal_path or base + ".journal.jsonl"
+        self.feather_path = base + ".feather" if schema is not None and feather is not None else None
+        self.schema = schema or {}
+        self.columns = list(columns)
+        self.compact_bytes = compact_bytes
+        self._lock = threading.Lock()
+        self._compaction_lock = threading.Lock()  # one compaction at a time
+        self._compacting = False
+        self._df = None
+        self.version = 0
+        self._typed = (None, None, None)
+        if not os.path.exists(snapshot_path):
+            pd.DataFrame(columns=self.columns).to_csv(snapshot_path, index=False)
+        if self.feather_path is not None and not os.path.exists(self.feather_path):
+            # One-time conversion; the journal (if any) still replays on top
+            write_snapshot(pd.read_csv(snapshot_path, dtype=str), self.feather_path, self.schema)
+
+    # ----- reading -----
+    def _read_journal(self, end=None):
+        if not os.path.exists(self.journal_path):
+            return [], 0
+        with open(self.journal_path, "rb") as f:
+            data = f.read() if end is None else f.read(end)
+        # A torn last line (crash mid-write) is ignored
+        records = []
+        for line in data.splitlines():
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        return records, len(data)
+
+    def _has_feather(self):
+        return self.feather_path is not None and os.path.exists(self.feather_path)
+
+    def _read_snapshot(self):
+        if self._has_feather():
+            return to_strings(read_snapshot(self.feather_path))
+        return pd.read_csv(self.snapshot_path, dtype=str)
+
+    def _write_snapshot(self, df):
+        if self.feather_path is not None:
+            write_snapshot(df, self.feather_path, self.schema)
+        _write_csv_atomic(df, self.snapshot_path)
+
+    def _replay(self, end=None):
+        df = self._read_snapshot()
+        for col in self.columns:
+            if col not in df.columns:
+                df[col] = None
+        records, offset = self._read_journal(end)
+        tail = {}
+        for rec in records:
+            i, values = rec["index"], _restore(rec["values"])
+            if i < len(df):
+                df.loc[i, list(values)] = list(values.values())
+            else:
+                tail.setdefault(i, {}).update(values)
+        if tail:
+            df = pd.concat(
+                [df, pd.DataFrame([tail[i] for i in sorted(tail)], columns=df.columns)],
+                ignore_index=True,
+            )
+        return df, offset
+
+    def _frame(self):
+        if self._df is None:
+            self._df, _ = self._replay()
+        return self._df
+
+    def frame(self):
+        """The current rows as a shared DataFrame of strings; treat it as read-only.
+
+        Later writes replace the frame instead of changing it, so the result
+        is a stable snapshot.
+        """
+        with self._lock:
+            return self._frame()
+
+    def load(self, columns=None):
+        """A copy of all rows (optionally only some columns)."""
+        df = self.frame()
+        return (df[columns] if columns else df).copy()
+
+    def typed(self, columns=None):
+        """Columns with real types (dates, Int64, categories), cached per version.
+
+        Right after compaction the journal is empty and the columns are read
+        straight from the memory-mapped snapshot; otherwise they are typed
+        from the in-memory frame.
+        """
+        columns = list(columns or self.columns)
+        version, cached_columns, df = self._typed
+        if version == self.version and cached_columns == columns:
+            return df
+        journal_empty = not os.path.exists(self.journal_path) or os.path.getsize(self.journal_path) == 0
+        if self._has_feather() and journal_empty and set(columns) <= set(snapshot_columns(self.feather_path)):
+            df = read_snapshot(self.feather_path, columns)
+        else:
+            df = to_typed(self.frame()[columns], self.schema)
+        self._typed = (self.version, columns, df)
+        return df
+
+    def rows(self, positions):
+        return self.frame().loc[list(positions)]
+
+    def row_count(self):
+        return len(self.frame())
+
+    # ----- writing -----
+    def _append(self, record):
+        with self._lock:
+            df = self._frame()
+            if record["index"] is None:
+                record["index"] = len(df)
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            values = _restore(record["values"])
+            if record["index"] < len(df):
+                df = df.copy()
+                df.loc[record["index"], list(values)] = list(values.values())
+                self._df = df
+            else:
+                self._df = pd.concat([df, pd.DataFrame([values], columns=df.columns)], ignore_index=True)
+            self.version += 1
+            size = os.path.getsize(self.journal_path)
+        if size >= self.compact_bytes:
+            self.compact_in_background()
+        return record["index"]
+
+    def insert(self, row):
+        """Append a new row; returns its index."""
+        return self._append({"op": "insert", "index": None, "values": _clean(row)})
+
+    def update(self, index, values):
+        """Overwrite some columns of an existing row."""
+        return self._append({"op": "update", "index": int(index), "values": _clean(values)})
+
+    def insert_many(self, rows):
+        """Append many rows (dicts) with one journal write and one fsync; returns their indexes."""
+        with self._lock:
+            df = self._frame()
+            start = len(df)
+            records = [
+                {"op": "insert", "index": start + i, "values": _clean(row)} for i, row in enumerate(rows)
+            ]
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+                f.flush()
+                os.fsync(f.fileno())
+            new = pd.DataFrame([_restore(record["values"]) for record in records], columns=df.columns)
+            self._df = pd.concat([df, new], ignore_index=True)
+            self.version += 1
+            size = os.path.getsize(self.journal_path)
+        if size >= self.compact_bytes:
+            self.compact_in_background()
+        return list(range(start, start + len(records)))
+
+    # ----- compaction -----
+    def compact(self):
+        """Fold the journal into a new snapshot; writes keep going meanwhile."""
+        with self._compaction_lock:
+            with self._lock:
+                if not os.path.exists(self.journal_path):
+                    return
+                offset = os.path.getsize(self.journal_path)
+            df, offset = self._replay(end=offset)
+            self._write_snapshot(df)
+            with self._lock:
+                # Carry over whatever was journaled while the snapshot was written
+                with open(self.journal_path, "rb") as f:
+                    f.seek(offset)
+                    tail = f.read()
+                tmp_path = self.journal_path + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(tail)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.journal_path)
+
+    def compact_in_background(self):
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+
+        def run():
+            try:
+                self.compact()
+            finally:
+                self._compacting = False
+
+        threading.Thread(target=run, name="journal-compaction", daemon=True).start()
+
+
+def _clean(values):
+    return {k: ("" if pd.isna(v) else str(v)) for k, v in values.items()}
+
+
+def _restore(values):
+    # Empty cells come back as missing, the same as read_csv gives
+    return {k: (v if v != "" else None) for k, v in values.items()}
+
+
+def _write_csv_atomic(df, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        df.to_csv(f, index=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
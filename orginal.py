@@ -1,27 +1,31 @@
 import streamlit as st
 import pandas as pd
-import os
 import gspread
-from fpdf import FPDF
-import tempfile
 from google.oauth2.service_account import Credentials
+from datetime import date as calendar_date, datetime
+from appointment_slots import ClinicHours, SlotIndex, format_minutes, format_slot, parse_slot, slot_label
+from booking_keys import BookingKeys, booking_key
+from clinic_stats import STATS_COLUMNS, ClinicStats, render_charts
+from journal_store import JournalStore
+from patient_ids import PatientIdAllocator, last_patient_number
+from patient_search import SEARCH_FIELDS, PatientSearchIndex, patient_key
+from patient_pdf import render_day_pdf, render_day_zip, render_patient_pdf
+from profiling import TracedWorksheet, profiler_panel, span, start_rerun, timed
+from record_export import EXPORT_FORMATS, export_records, iter_record_chunks
+from sheet_connection import SHEET_STATUS_LABELS, SheetConnection
+from sheet_quota import QuotaWorksheet
+from sheet_sync import SheetRowIndex, SyncQueue, SyncState
+from sqlite_store import SQLiteStore, quote
+from typed_snapshot import PATIENT_SCHEMA
+from waiting_queue import WAITING_FIELDS, WaitingQueue
 
-def generate_patient_pdf(record):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-    pdf.cell(0, 10, "Dr Kawa Khalil_ Clinic Patient Record Summary", ln=True, align="C")
-    pdf.ln(10)
-    for key, value in record.items():
-        pdf.cell(0, 8, f"{key}: {value}", ln=True)
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
-    pdf.output(temp_file.name)
-    return temp_file.name
+# ---------- Profiling ----------
+# One trace line per rerun in clinic_trace.jsonl; spans below mark the I/O steps
+trace = start_rerun("orginal.py", st.session_state)
 
 # ---------- Google Sheets Setup ----------
 SHEET_ID = "1keLx7iBH92_uKxj-Z70iTmAVus7X9jxaFXl_SQ-mZvU"
-@st.cache_resource
-def get_sheet():
+def open_sheet(connection):
     scope = [
         "https://www.googleapis.com/auth/spreadsheets",
         "https://www.googleapis.com/auth/drive",
@@ -29,87 +33,290 @@ def get_sheet():
     creds = Credentials.from_service_account_info(
         st.secrets["gcp_service_account"], scopes=scope
     )
+    quota = st.secrets.get("sheets_quota", {})  # reads_per_minute / writes_per_minute
     client = gspread.authorize(creds)
-    return client.open_by_key(SHEET_ID).sheet1
-sheet = get_sheet()
-
-# ---------- Append-only push to Google Sheets ----------
-def push_to_sheet_append(df):
-    try:
-        df = df.fillna("").astype(str)
-        existing_records = sheet.get_all_records()
-        existing_df = pd.DataFrame(existing_records)
-        if not existing_df.empty:
-            new_rows = df.merge(existing_df, how="outer", indicator=True).query('_merge=="left_only"').drop('_merge', axis=1)
-        else:
-            new_rows = df
-        if not new_rows.empty:
-            sheet.append_rows(new_rows.values.tolist(), value_input_option="RAW")
-        return True
-    except Exception as e:
-        st.error(f"❌ Google Sheets append failed: {e}")
-        return False
+    # Every call is rate limited to the Sheets quota and retried on 429/5xx
+    sheet = QuotaWorksheet(client.open_by_key(SHEET_ID).sheet1, **quota)
+    return TracedWorksheet(sheet)
+
+@st.cache_resource
+def get_sheet_connection():
+    # Auth runs in the background; every page renders from local data meanwhile
+    return SheetConnection(open_sheet).start()
+connection = get_sheet_connection()
+
+# ---------- Write-behind push to Google Sheets ----------
+@st.cache_resource
+def get_sync_queue():
+    return SyncQueue(
+        lambda: connection.get(timeout=60), "eye_data.sync_queue.jsonl",
+        row_index=SheetRowIndex("eye_data.sheet_rows.json"),
+        key_column=2,  # Patient_ID
+    ).start()
+sync_queue = get_sync_queue()
 
 # ---------- Page config ----------
 st.set_page_config(page_title="Clinic Patient Data", layout="wide")
 file_path = "eye_data.csv"
 
-# Initialize CSV if missing
-if not os.path.exists(file_path):
-    pd.DataFrame(columns=[
-        "Date", "Patient_ID", "Full_Name", "Age", "Gender", "Phone_Number",
-        "Visual_Acuity", "VAcc", "IOP", "Medication", "AC", "Fundus", "U/S",
-        "OCT/FFA", "Diagnosis", "Treatment", "Plan",
-        "Appt_Name", "Appt_Date", "Appt_Time", "Appt_Payment"
-    ]).to_csv(file_path, index=False)
+COLUMNS = [
+    "Date", "Patient_ID", "Full_Name", "Age", "Gender", "Phone_Number",
+    "Visual_Acuity", "VAcc", "IOP", "Medication", "AC", "Fundus", "U/S",
+    "OCT/FFA", "Diagnosis", "Treatment", "Plan",
+    "Appt_Name", "Appt_Date", "Appt_Time", "Appt_Payment"
+]
+
+# ---------- Local storage ----------
+# "csv" keeps eye_data.csv plus an append-only journal; "sqlite" keeps an
+# indexed eye_data.db and reads the CSV only once, to import existing data.
+STORAGE_BACKEND = st.secrets.get("storage_backend", "csv")
+DB_PATH = "eye_data.db"
+
+WAITING_SQL = " AND ".join(f"COALESCE({quote(col)}, '') = ''" for col in WAITING_FIELDS)
+APPOINTMENT_SQL = " OR ".join(
+    f"{quote(col)} IS NOT NULL" for col in ["Appt_Name", "Appt_Date", "Appt_Time", "Appt_Payment"]
+)
+SQLITE_INDEXES = [
+    ("idx_patient_id", quote("Patient_ID"), None),
+    ("idx_appt_date", quote("Appt_Date"), None),
+    ("idx_date", quote("Date"), None),
+    ("idx_waiting", "row_index", WAITING_SQL),
+]
+
+@st.cache_resource
+@timed("store.open")
+def get_store():
+    # Both create missing files and add any new columns
+    if STORAGE_BACKEND == "sqlite":
+        return SQLiteStore(
+            DB_PATH, COLUMNS, indexes=SQLITE_INDEXES,
+            import_from=lambda: JournalStore(file_path, COLUMNS, schema=PATIENT_SCHEMA).load(),
+        )
+    return JournalStore(file_path, COLUMNS, schema=PATIENT_SCHEMA)
+store = get_store()
+
+@timed("store.appointments")
+def appointment_rows(start=None, end=None):
+    """Appointment rows, optionally only those dated in [start, end] (either may be open)."""
+    columns = ["Appt_Name", "Appt_Date", "Appt_Time", "Appt_Payment"]
+    if STORAGE_BACKEND == "sqlite":
+        where, params = f"({APPOINTMENT_SQL})", []
+        if start is not None:
+            where, params = where + f" AND {quote('Appt_Date')} >= ?", params + [str(start)]
+        if end is not None:
+            where, params = where + f" AND {quote('Appt_Date')} <= ?", params + [str(end)]
+        return store.query(where, params, columns=columns)
+    # Typed columns, read memory-mapped when the snapshot is current
+    df = store.typed(columns).dropna(how="all")
+    if start is None and end is None:
+        return df
+    dates = pd.to_datetime(df["Appt_Date"], errors="coerce", format="mixed")
+    keep = dates.notna()
+    if start is not None:
+        keep &= dates >= pd.Timestamp(start)
+    if end is not None:
+        keep &= dates <= pd.Timestamp(end)
+    return df[keep]
+
+@timed("store.waiting")
+def waiting_rows():
+    if STORAGE_BACKEND == "sqlite":
+        return store.query(WAITING_SQL).fillna("")
+    df = store.frame().fillna("")
+    return df[(df[WAITING_FIELDS] == "").all(axis=1)]
+
+@timed("store.visits")
+def visit_rows(day):
+    """Pre-visit entries (not bare appointments) dated ``day``."""
+    if STORAGE_BACKEND == "sqlite":
+        return store.query(f"{quote('Date')} = ? AND {quote('Full_Name')} IS NOT NULL", (str(day),)).fillna("")
+    df = store.frame()
+    return df[(df["Date"] == str(day)) & df["Full_Name"].notna()].fillna("")
+
+@st.cache_resource
+def get_id_allocator():
+    return PatientIdAllocator("eye_data.next_id", last_used=lambda: last_patient_number(store))
+id_allocator = get_id_allocator()
+
+@st.cache_resource
+@timed("index.waiting")
+def get_waiting_queue():
+    return WaitingQueue(waiting_rows())
+waiting_queue = get_waiting_queue()
+
+@st.cache_resource
+@timed("index.search")
+def get_search_index():
+    """Name / phone / ID / diagnosis index, updated on every save."""
+    return PatientSearchIndex(SEARCH_FIELDS).rebuild(store.load(columns=SEARCH_FIELDS))
+search_index = get_search_index()
+SEARCH_LIMIT = 50
+
+@st.cache_resource
+@timed("stats.open")
+def get_clinic_stats():
+    # Saved with the data; rebuilt only when it doesn't cover every stored row
+    stats = ClinicStats("eye_data.stats.json")
+    if stats.rows != store.row_count():
+        stats.rebuild(store.load(columns=STATS_COLUMNS))
+    return stats
+clinic_stats = get_clinic_stats()
+
+@st.cache_resource(max_entries=2)
+@timed("stats.charts")
+def stats_charts(version, today):
+    """Chart images, redrawn only when the aggregates (or the day) change."""
+    return render_charts(clinic_stats, today)
+GENDERS = ["Male", "Female", "Child"]
+
+@st.cache_resource
+@timed("index.appointment_keys")
+def get_appointment_keys():
+    """Normalized (name, date, time) of every appointment, kept current on save."""
+    return BookingKeys("Appt_Name", "Appt_Date", "Appt_Time").rebuild(appointment_rows())
+appointment_keys = get_appointment_keys()
+
+@st.cache_resource
+@timed("index.slots")
+def get_slot_index():
+    """Booked intervals from today on, kept current on save; hours and doctors from the clinic_hours secret."""
+    hours = ClinicHours(**st.secrets.get("clinic_hours", {}))
+    return SlotIndex(hours, "Appt_Date", "Appt_Time").rebuild(appointment_rows(start=calendar_date.today()))
+slot_index = get_slot_index()
+FREE_SLOTS_SHOWN = 5
+
+def next_free_slots(length=None):
+    """The next free appointment slots from now on."""
+    now = datetime.now()
+    return slot_index.free_slots(now.date(), after=now.hour * 60 + now.minute, n=FREE_SLOTS_SHOWN, length=length)
 
-df = pd.read_csv(file_path)
+def use_free_slot():
+    """Copy the picked free slot into the appointment form."""
+    if st.session_state.free_slot is not None:
+        day, start = st.session_state.free_slot
+        st.session_state.appt_form_date = day
+        st.session_state.appt_form_time = format_minutes(start)
 
-# ====== Safely add new columns if missing ======
-for col in ["VAcc", "Appt_Name", "Appt_Date", "Appt_Time", "Appt_Payment"]:
-    if col not in df.columns:
-        df[col] = ""
+# ---------- Delta sync ----------
+@st.cache_resource
+@timed("sync.state")
+def get_sync_state():
+    return SyncState("eye_data.sync_state.json", baseline=store.load())
+sync_state = get_sync_state()
+
+@timed("sync.enqueue")
+def sync_changes(touched=()):
+    """Queue rows that are new or changed since the last sync, keyed by Patient_ID."""
+    with sync_state.lock:
+        changed_rows = sync_state.delta(store.row_count(), touched, store.rows)
+        sync_queue.enqueue(changed_rows.values.tolist(), keys=changed_rows["Patient_ID"].tolist())
+        sync_state.mark(changed_rows)
+
+@st.cache_resource(max_entries=4)
+@timed("export.build")
+def build_export(version, fmt, start, end):
+    """Export bytes, built on demand and reused until the data changes."""
+    return export_records(iter_record_chunks(store, start, end), fmt)
 
 # Session state
 if "selected_waiting_id" not in st.session_state:
     st.session_state.selected_waiting_id = None
 
 # Sidebar menu
-menu = st.sidebar.radio("📁 Menu", ["📅 Appointments", "🌟 New Patient", "📊 View Data"], index=0)
+menu = st.sidebar.radio("📁 Menu", ["📅 Appointments", "🌟 New Patient", "📊 View Data", "📈 Analytics"], index=0)
+trace.page = menu
+
+# Sync status
+@st.fragment(run_every=None if connection.ready else 3)
+def sheet_status_badge():
+    st.caption(SHEET_STATUS_LABELS[connection.status])
+
+with st.sidebar:
+    sheet_status_badge()
+pending_rows = sync_queue.pending()
+if pending_rows:
+    st.sidebar.caption(f"🔄 Pending sync: {pending_rows} rows")
+else:
+    st.sidebar.caption("✅ All rows synced")
+if sync_queue.last_error:
+    st.sidebar.warning(f"Google Sheets unreachable, retrying: {sync_queue.last_error}")
 
 # ========== APPOINTMENTS ==========
 if menu == "📅 Appointments":
     st.title("📅 Appointment Records")
 
+    hours = slot_index.hours
+    free_doctors = {(day, start): free for day, start, free in next_free_slots()}
+    st.selectbox(
+        "🕒 Next free slots", list(free_doctors),
+        format_func=lambda slot: slot_label(*slot, free_doctors[slot], hours),
+        index=None, placeholder="Pick a free slot" if free_doctors else "No free slots in the next 60 days",
+        key="free_slot", on_change=use_free_slot,
+    )
+
     with st.form("appt_form", clear_on_submit=True):
         appt_name = st.text_input("Patient Name")
-        appt_date = st.date_input("Appointment Date")
-        appt_time = st.text_input("Appointment Time (manual)")
+        appt_date = st.date_input("Appointment Date", key="appt_form_date")
+        appt_time = st.text_input("Appointment Time (manual)", placeholder="HH:MM", key="appt_form_time")
+        appt_minutes = st.number_input("Duration (minutes)", min_value=5, max_value=240, step=5, value=hours.slot_minutes)
         appt_payment = st.text_input("Payment")
         if st.form_submit_button("Save Appointment"):
-            new_appt = pd.DataFrame([{
-                "Date": "", "Patient_ID": "", "Full_Name": "", "Age": "", "Gender": "", "Phone_Number": "",
-                "Visual_Acuity": "", "VAcc": "", "IOP": "", "Medication": "", "AC": "", "Fundus": "", "U/S": "", "OCT/FFA": "",
-                "Diagnosis": "", "Treatment": "", "Plan": "",
-                "Appt_Name": appt_name, "Appt_Date": str(appt_date), "Appt_Time": appt_time, "Appt_Payment": appt_payment
-            }])
-            df = pd.concat([df, new_appt], ignore_index=True)
-            try:
-                df.to_csv(file_path, index=False)
-                st.success("✅ Appointment saved locally.")
-                push_to_sheet_append(df)
-                st.rerun()
-            except Exception as e:
-                st.error(f"❌ Save failed: {e}")
-
-    st.subheader("📋 All Appointments")
-    appt_df = df[["Appt_Name", "Appt_Date", "Appt_Time", "Appt_Payment"]].dropna(how="all")
+            slot = parse_slot(appt_time, hours, appt_minutes)
+            if not appt_time:
+                st.error("Appointment Time is required.")
+            elif slot is None:
+                st.error("Appointment Time not understood. Use HH:MM, e.g. 09:30 or 14:15.")
+            elif not hours.is_open(appt_date):
+                st.error(f"The clinic is closed on {appt_date:%A}s.")
+            elif not hours.within(*slot):
+                st.error(f"{appt_time} is outside clinic hours ({hours}).")
+            else:
+                appt_time = format_slot(*slot, hours)
+                new_appt = {
+                    "Date": "", "Patient_ID": "", "Full_Name": "", "Age": "", "Gender": "", "Phone_Number": "",
+                    "Visual_Acuity": "", "VAcc": "", "IOP": "", "Medication": "", "AC": "", "Fundus": "", "U/S": "", "OCT/FFA": "",
+                    "Diagnosis": "", "Treatment": "", "Plan": "",
+                    "Appt_Name": appt_name, "Appt_Date": str(appt_date), "Appt_Time": appt_time, "Appt_Payment": appt_payment
+                }
+                key = booking_key(appt_name, appt_date, appt_time)
+                if key in appointment_keys:
+                    st.warning("This appointment already exists. No duplicate saved.")
+                elif slot_index.conflicts(appt_date, *slot):
+                    others = ", ".join(slot_label(*free, hours) for free in next_free_slots(slot[1]))
+                    st.warning(f"⛔ {appt_date} {appt_time} is already booked. Next free: {others or 'none'}")
+                else:
+                    try:
+                        with span("store.insert"):
+                            waiting_queue.update(store.insert(new_appt), new_appt)
+                        appointment_keys.add(key)
+                        slot_index.add(new_appt)
+                        clinic_stats.apply(None, new_appt, new_row=True)
+                        st.success("✅ Appointment saved locally.")
+                        sync_changes()
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"❌ Save failed: {e}")
+
+    # Only this month and later by default; older appointments load on request
+    st.subheader("📋 Appointments This Month and Upcoming")
+    appt_df = appointment_rows(start=calendar_date.today().replace(day=1))
     if not appt_df.empty:
         appt_df_display = appt_df.iloc[::-1].reset_index(drop=True)
         appt_df_display.index = appt_df_display.index + 1
         st.dataframe(appt_df_display, use_container_width=True)
     else:
-        st.info("No appointments recorded yet.")
+        st.info("No appointments this month or later.")
+
+    st.subheader("📂 Appointment Archive")
+    archive_range = st.date_input("Date range", value=(), key="appt_archive_range")
+    if len(archive_range) < 2:
+        st.caption("Pick a date range to load older appointments.")
+    else:
+        archive_df = appointment_rows(*archive_range)
+        st.caption(f"{len(archive_df)} appointments in range")
+        archive_df_display = archive_df.iloc[::-1].reset_index(drop=True)
+        archive_df_display.index = archive_df_display.index + 1
+        st.dataframe(archive_df_display, use_container_width=True)
 
 # ========== NEW PATIENT SECTION ==========
 elif menu == "🌟 New Patient":
@@ -118,21 +325,67 @@ elif menu == "🌟 New Patient":
     # --- Pre-Visit Entry ---
     with tabs[0]:
         st.title("📋 Pre-Visit Entry")
-        try:
-            last_id = df["Patient_ID"].dropna().astype(str).str.extract('(\\d+)')[0].astype(int).max()
-            next_id = f"{last_id + 1:04d}"
-        except:
-            next_id = "0001"
+        next_id = id_allocator.peek()
         st.markdown(f"**Generated Patient ID:** `{next_id}`")
 
+        # --- Returning patient lookup ---
+        query = st.text_input(
+            "🔍 Returning patient", placeholder="Search name, phone, Patient ID or diagnosis", key="returning_search"
+        )
+        if query:
+            with span("search.query"):
+                hits = search_index.search(query, limit=SEARCH_LIMIT)
+            visits = store.rows(hits).fillna("")
+            visits = visits[visits["Full_Name"] != ""]
+            if visits.empty:
+                st.info("No matching patients.")
+            else:
+                # Visits grouped per patient, newest first
+                patients = {}
+                for idx, record in zip(visits.index, visits.to_dict("records")):
+                    patients.setdefault(patient_key(record), []).append(idx)
+                groups = list(patients.values())
+                labels = [
+                    f"👤 {visits.at[rows[0], 'Full_Name']} — 📞 {visits.at[rows[0], 'Phone_Number'] or 'no phone'}, "
+                    f"{len(rows)} visit(s), last {visits.at[rows[0], 'Date']}"
+                    for rows in groups
+                ]
+                choice = st.selectbox(
+                    "Matching patients", range(len(groups)), format_func=labels.__getitem__,
+                    index=None, placeholder=f"{len(groups)} patient(s) found", key="returning_choice"
+                )
+                if choice is not None:
+                    history = visits.loc[groups[choice]]
+                    st.dataframe(
+                        history[["Date", "Patient_ID", "Visual_Acuity", "IOP", "Diagnosis", "Treatment", "Plan"]],
+                        hide_index=True, use_container_width=True
+                    )
+                    if st.button("📋 Use these details for a new visit"):
+                        latest = history.iloc[0]
+                        st.session_state.prefill = {
+                            col: latest[col] for col in ["Full_Name", "Age", "Gender", "Phone_Number"]
+                        }
+                        st.rerun()
+
+        prefill = st.session_state.get("prefill", {})
+        if prefill and st.button(f"✖️ Clear details of {prefill['Full_Name']}"):
+            st.session_state.pop("prefill")
+            st.rerun()
+        prefill_age = pd.to_numeric(prefill.get("Age"), errors="coerce")
         with st.form("pre_visit_form", clear_on_submit=True):
             col1, col2 = st.columns(2)
             with col1:
                 date = st.date_input("Date")
-                full_name = st.text_input("Full Name")
-                age = st.number_input("Age", min_value=0, max_value=120)
-                gender = st.selectbox("Gender", ["Male", "Female", "Child"])
-                phone = st.text_input("Phone Number")
+                full_name = st.text_input("Full Name", value=prefill.get("Full_Name", ""))
+                age = st.number_input(
+                    "Age", min_value=0, max_value=120,
+                    value=0 if pd.isna(prefill_age) else min(max(int(prefill_age), 0), 120)
+                )
+                gender = st.selectbox(
+                    "Gender", GENDERS,
+                    index=GENDERS.index(prefill["Gender"]) if prefill.get("Gender") in GENDERS else 0
+                )
+                phone = st.text_input("Phone Number", value=prefill.get("Phone_Number", ""))
             with col2:
                 va = st.text_input("VA: RA / LA")
                 vacc = st.text_input("VAcc: RA / LA")  # new field
@@ -143,20 +396,28 @@ elif menu == "🌟 New Patient":
 
             if st.form_submit_button("Submit"):
                 visual_acuity = f"RA ({bcva_ra}) ; LA ({bcva_la})"
-                new_entry = pd.DataFrame([{
-                    "Date": str(date), "Patient_ID": next_id, "Full_Name": full_name, "Age": age,
+                # Reserved now, under the file lock, in case another desk took next_id
+                patient_id = id_allocator.allocate()
+                new_entry = {
+                    "Date": str(date), "Patient_ID": patient_id, "Full_Name": full_name, "Age": age,
                     "Gender": gender, "Phone_Number": phone,
                     "Visual_Acuity": visual_acuity, "VAcc": vacc,
                     "IOP": iop, "Medication": medication,
                     "AC": "", "Fundus": "", "U/S": "", "OCT/FFA": "",
                     "Diagnosis": "", "Treatment": "", "Plan": "",
                     "Appt_Name": "", "Appt_Date": "", "Appt_Time": "", "Appt_Payment": ""
-                }])
-                df = pd.concat([df, new_entry], ignore_index=True)
+                }
                 try:
-                    df.to_csv(file_path, index=False)
-                    st.success("✅ Data saved locally.")
-                    push_to_sheet_append(df)
+                    with span("store.insert"):
+                        new_index = store.insert(new_entry)
+                        # The stored row has Age as text, like the rows the indexes were built from
+                        saved = store.rows([new_index]).iloc[0].to_dict()
+                        waiting_queue.update(new_index, saved)
+                        search_index.add(new_index, saved)
+                    clinic_stats.apply(None, new_entry, new_row=True)
+                    st.session_state.pop("prefill", None)
+                    st.success(f"✅ Data saved locally as patient {patient_id}.")
+                    sync_changes()
                     st.rerun()
                 except Exception as e:
                     st.error(f"❌ Save failed: {e}")
@@ -164,64 +425,154 @@ elif menu == "🌟 New Patient":
     # --- Waiting List ---
     with tabs[1]:
         st.title("⏳ Patients Waiting for Doctor Update")
-        df = df.fillna("")
-        waiting_df = df[
-            (df["Diagnosis"] == "") & 
-            (df["Treatment"] == "") & 
-            (df["Plan"] == "") &
-            (df["Appt_Name"] == "")
-        ]
-        if waiting_df.empty:
+        waiting = waiting_queue.items()
+        if not waiting:
             st.success("🎉 No patients are currently waiting.")
         else:
-            for idx, row in waiting_df.iterrows():
-                with st.expander(f"🪪 {row['Patient_ID']} — {row['Full_Name']}, Age {row['Age']}"):
-                    selected = df[df["Patient_ID"] == row["Patient_ID"]]
-                    with st.form(f"form_{row['Patient_ID']}_{idx}", clear_on_submit=True):
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            ac = st.text_area("AC", height=100)
-                            fundus = st.text_area("Fundus", height=100)
-                            us = st.text_input("U/S")
-                            oct_ffa = st.text_input("OCT/FFA")
-                        with col2:
-                            diagnosis = st.text_input("Diagnosis", value=selected["Diagnosis"].values[0])
-                            treatment = st.text_input("Treatment")
-                            plan = st.text_input("Plan")
-                        submitted = st.form_submit_button("Update Record")
-
-                    if submitted:
-                        idx_df = df[df["Patient_ID"] == row["Patient_ID"]].index[0]
-                        df.loc[idx_df, ["AC", "Fundus", "U/S", "OCT/FFA", "Diagnosis", "Treatment", "Plan"]] = [
-                            ac.strip(), fundus.strip(), us.strip(), oct_ffa.strip(), diagnosis.strip(), treatment.strip(), plan.strip()
-                        ]
-                        try:
-                            df.to_csv(file_path, index=False)
-                            st.success("✅ Updated locally.")
-                            push_to_sheet_append(df)
-                            patient_record = df.loc[idx_df].to_dict()
-                            pdf_path = generate_patient_pdf(patient_record)
-                            with open(pdf_path, "rb") as f:
-                                pdf_bytes = f.read()
-                                st.download_button(
-                                    label=f"🖨️ Download PDF Summary for Patient {row['Patient_ID']}",
-                                    data=pdf_bytes,
-                                    file_name=f"Patient_{row['Patient_ID']}_summary.pdf",
-                                    mime="application/pdf",
-                                )
-                        except Exception as e:
-                            st.error(f"❌ Update failed: {e}")
+            labels = {idx: f"🪪 {pid} — {name}, Age {age}" for idx, (pid, name, age) in waiting}
+            st.dataframe(
+                pd.DataFrame([row for _, row in waiting], columns=["Patient_ID", "Full_Name", "Age"]),
+                hide_index=True, use_container_width=True
+            )
+            idx_df = st.selectbox(
+                "Select a patient to update", list(labels), format_func=labels.get,
+                index=None, placeholder=f"{len(waiting)} patients waiting"
+            )
+            st.session_state.selected_waiting_id = idx_df
+
+            # Only the selected patient's form is built
+            if idx_df is not None:
+                selected = store.rows([idx_df]).iloc[0].fillna("")
+                with st.form(f"form_{selected['Patient_ID']}_{idx_df}", clear_on_submit=True):
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        ac = st.text_area("AC", height=100)
+                        fundus = st.text_area("Fundus", height=100)
+                        us = st.text_input("U/S")
+                        oct_ffa = st.text_input("OCT/FFA")
+                    with col2:
+                        diagnosis = st.text_input("Diagnosis", value=selected["Diagnosis"])
+                        treatment = st.text_input("Treatment")
+                        plan = st.text_input("Plan")
+                    submitted = st.form_submit_button("Update Record")
+
+                if submitted:
+                    doctor_update = dict(zip(
+                        ["AC", "Fundus", "U/S", "OCT/FFA", "Diagnosis", "Treatment", "Plan"],
+                        [ac.strip(), fundus.strip(), us.strip(), oct_ffa.strip(), diagnosis.strip(), treatment.strip(), plan.strip()]
+                    ))
+                    try:
+                        with span("store.update"):
+                            store.update(idx_df, doctor_update)
+                            waiting_queue.update(idx_df, {**selected.to_dict(), **doctor_update})
+                            search_index.add(idx_df, {**selected.to_dict(), **doctor_update})
+                            clinic_stats.apply(selected.to_dict(), {**selected.to_dict(), **doctor_update})
+                        st.success("✅ Updated locally.")
+                        sync_changes(touched=[idx_df])
+                        patient_record = store.rows([idx_df]).iloc[0].to_dict()
+                        with span("pdf.patient"):
+                            pdf_bytes = render_patient_pdf(patient_record)
+                        st.download_button(
+                            label=f"🖨️ Download PDF Summary for Patient {selected['Patient_ID']}",
+                            data=pdf_bytes,
+                            file_name=f"Patient_{selected['Patient_ID']}_summary.pdf",
+                            mime="application/pdf",
+                        )
+                    except Exception as e:
+                        st.error(f"❌ Update failed: {e}")
 
 # ========== VIEW DATA ==========
 elif menu == "📊 View Data":
     st.title("📊 Patient Records")
-    tab1, tab2 = st.tabs(["📋 All Records", "🗕️ Download CSV"])
+    tab1, tab2, tab3 = st.tabs(["📋 All Records", "🗕️ Download", "🖨️ Day Summaries"])
     with tab1:
-        st.dataframe(df, use_container_width=True)
-    with tab2:
-        st.download_button(
-            label="⬇️ Download All Records",
-            data=df.to_csv(index=False),
-            file_name="all_eye_patients.csv",
-            mime="text/csv"
+        query = st.text_input(
+            "🔍 Search records", placeholder="Name, phone, Patient ID or diagnosis", key="records_search"
         )
+        if query:
+            with span("search.query"):
+                hits = search_index.search(query, limit=500)
+            st.caption(f"{len(hits)} matching records" + (" (newest 500 shown)" if len(hits) == 500 else ""))
+            st.dataframe(store.rows(hits), use_container_width=True)
+        else:
+            # Only the rows on screen are read and serialized
+            total = store.row_count()
+            col1, col2 = st.columns(2)
+            page_size = col1.selectbox("Rows per page", [50, 100, 500], index=1, key="records_page_size")
+            pages = max(1, -(-total // page_size))
+            page = col2.number_input("Page", min_value=1, max_value=pages, value=1, key=f"records_page_{page_size}")
+            first = (page - 1) * page_size
+            st.caption(f"{total} records, page {page} of {pages}")
+            with span("store.page"):
+                page_rows = store.rows(range(first, min(first + page_size, total)))
+            st.dataframe(page_rows, use_container_width=True)
+    with tab2:
+        col1, col2 = st.columns(2)
+        fmt = col1.selectbox("Format", list(EXPORT_FORMATS), key="export_format")
+        date_range = col2.date_input("Date range (visit or appointment)", value=(), key="export_range")
+        start, end = (date_range if len(date_range) == 2 else (None, None))
+        if st.button("📦 Prepare export"):
+            st.session_state.export = (fmt, start, end, build_export(store.version, fmt, start, end))
+        if "export" in st.session_state:
+            fmt, start, end, data = st.session_state.export
+            extension, mime = EXPORT_FORMATS[fmt]
+            suffix = f"_{start}_{end}" if start else ""
+            if data:
+                st.download_button(
+                    label="⬇️ Download All Records" if not start else f"⬇️ Download Records {start} – {end}",
+                    data=data,
+                    file_name=f"all_eye_patients{suffix}.{extension}",
+                    mime=mime
+                )
+            else:
+                st.info("No records in this range.")
+    with tab3:
+        day = st.date_input("Visit date", key="summary_day")
+        output = st.radio("Output", ["One merged PDF", "ZIP of PDFs"], horizontal=True)
+        if st.button("🖨️ Prepare summaries"):
+            visits = visit_rows(day)
+            if visits.empty:
+                st.info("No visits recorded on this day.")
+            else:
+                records = visits.to_dict("records")
+                if output == "One merged PDF":
+                    with span("pdf.day", records=len(records)):
+                        data = render_day_pdf(records)
+                    file_name, mime = f"summaries_{day}.pdf", "application/pdf"
+                else:
+                    names = [f"Patient_{r['Patient_ID']}_summary.pdf" for r in records]
+                    with span("pdf.zip", records=len(records)):
+                        data = render_day_zip(records, names)
+                    file_name, mime = f"summaries_{day}.zip", "application/zip"
+                st.session_state.day_summaries = (file_name, mime, data, len(records))
+        if "day_summaries" in st.session_state:
+            file_name, mime, data, count = st.session_state.day_summaries
+            st.download_button(
+                label=f"⬇️ Download {count} summaries ({file_name})",
+                data=data, file_name=file_name, mime=mime,
+            )
+
+# ========== ANALYTICS ==========
+elif menu == "📈 Analytics":
+    st.title("📈 Clinic Analytics")
+    today = calendar_date.today()
+    daily = clinic_stats.daily_visits(today, days=7)
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Visits today", int(daily.iloc[-1]))
+    col2.metric("Visits last 7 days", int(daily.sum()))
+    col3.metric("Appointments today", int(clinic_stats.appointment_load(today, days=1).iloc[0]))
+
+    charts = stats_charts(clinic_stats.version, today)
+    titles = list(charts)
+    for left, right in zip(titles[::2], titles[1::2] + [None]):
+        col1, col2 = st.columns(2)
+        col1.image(charts[left], use_container_width=True)
+        if right is not None:
+            col2.image(charts[right], use_container_width=True)
+    st.subheader("💳 Payments by type")
+    st.dataframe(clinic_stats.payments(), use_container_width=True)
+
+# ---------- Profiler ----------
+if st.secrets.get("profiler", False):
+    profiler_panel(metrics=connection.sheet.metrics if connection.ready else None)
+trace.finish()
@@ -0,0 +1,436 @@
+import os
+import threading
+from collections import Counter
+from datetime import date, timedelta
+
+import pandas as pd
+
+from sqlite_store import quote
+from typed_snapshot import feather, read_snapshot, to_strings, write_snapshot
+
+# ---------- Month keys ----------
+UNDATED = "undated"  # partition / worksheet of rows without a readable date
+
+
+def month_keys(series):
+    """"2025-08-14" -> "2025-08" for a whole column; unreadable dates -> "undated"."""
+    parsed = pd.to_datetime(series, errors="coerce", format="mixed")
+    return parsed.dt.strftime("%Y-%m").fillna(UNDATED)
+
+
+def month_key(value):
+    return month_keys(pd.Series([value], dtype=object)).iloc[0]
+
+
+def year_keys(series):
+    keys = month_keys(series)
+    return keys.where(keys == UNDATED, keys.str[:4])
+
+
+def year_key(value):
+    return year_keys(pd.Series([value], dtype=object)).iloc[0]
+
+
+def month_start(day):
+    """First day of ``day``'s month as "YYYY-MM-01"."""
+    return day.strftime("%Y-%m-01")
+
+
+def hot_rows(df, date_column, today):
+    """Rows dated in ``today``'s month or later."""
+    keys = month_keys(df[date_column])
+    return df[(keys != UNDATED) & (keys >= today.strftime("%Y-%m"))].reset_index(drop=True)
+
+
+def _in_range(df, date_column, start, end):
+    dates = pd.to_datetime(df[date_column], errors="coerce", format="mixed").dt.normalize()
+    return df[(dates >= pd.Timestamp(start)) & (dates <= pd.Timestamp(end))]
+
+
+# ---------- Local month partitions ----------
+class MonthPartitions:
+    """Records split into one file per month of ``date_column``.
+
+    The current and later months are hot: plain CSVs in ``directory`` that a
+    save appends one line to. ``rollover`` moves earlier months to
+    ``directory/archive`` as typed Feather files (gzip CSV without pyarrow),
+    which are read only when a date range asks for them, so the working set
+    stays one or two months however old the clinic is. Rows without a
+    readable date are kept in an "undated" archive partition.
+
+    ``import_from`` seeds the partitions from an unpartitioned table the
+    first time the directory is created. ``version`` goes up on every write.
+    """
+
+    def __init__(self, directory, columns, date_column, schema=None, import_from=None):
+        self.directory = directory
+        self.archive_dir = os.path.join(directory, "archive")
+        self.columns = list(columns)
+        self.date_column = date_column
+        self.schema = schema or {}
+        self.version = 0
+        self._lock = threading.Lock()
+        fresh = not os.path.isdir(directory)
+        os.makedirs(self.archive_dir, exist_ok=True)
+        if fresh and import_from is not None:
+            self.reset(import_from(), date.today())
+
+    # ----- files -----
+    def _hot_path(self, month):
+        return os.path.join(self.directory, month + ".csv")
+
+    def _cold_path(self, month):
+        extension = ".feather" if feather is not None else ".csv.gz"
+        return os.path.join(self.archive_dir, month + extension)
+
+    def _files(self):
+        """month -> path of every partition, hot and archived."""
+        files = {}
+        for folder in (self.archive_dir, self.directory):
+            for name in os.listdir(folder):
+                if name.endswith((".csv", ".csv.gz", ".feather")):
+                    files[name.split(".", 1)[0]] = os.path.join(folder, name)
+        return files
+
+    def _read(self, path):
+        if path.endswith(".feather"):
+            df = to_strings(read_snapshot(path))
+        else:
+            df = pd.read_csv(path, dtype=str)
+        return df.reindex(columns=self.columns)
+
+    def _write(self, month, df, today):
+        """Write one month where it belongs: hot CSV, or the archive."""
+        df = df.reindex(columns=self.columns)
+        hot = month != UNDATED and month >= today.strftime("%Y-%m")
+        path = self._hot_path(month) if hot else self._cold_path(month)
+        tmp_path = path + ".tmp"
+        if path.endswith(".feather"):
+            write_snapshot(df, tmp_path, self.schema)
+        else:
+            df.to_csv(tmp_path, index=False, compression="gzip" if path.endswith(".gz") else None)
+        os.replace(tmp_path, path)
+        stale = self._files().get(month)
+        if stale is not None and stale != path:
+            os.remove(stale)
+
+    # ----- reading -----
+    def hot(self, today):
+        """Rows of ``today``'s month and later."""
+        current = today.strftime("%Y-%m")
+        with self._lock:
+            paths = [p for month, p in sorted(self._files().items()) if month != UNDATED and month >= current]
+            frames = [self._read(p) for p in paths]
+        return _concat(frames, self.columns)
+
+    def range(self, start, end):
+        """Rows dated in [start, end], read only from the months that range covers."""
+        months = set(pd.period_range(start, end, freq="M").strftime("%Y-%m"))
+        with self._lock:
+            frames = [self._read(p) for month, p in sorted(self._files().items()) if month in months]
+        return _in_range(_concat(frames, self.columns), self.date_column, start, end)
+
+    def load(self):
+        """Every partition, hot and archived (bulk imports and exports only)."""
+        with self._lock:
+            frames = [self._read(p) for _, p in sorted(self._files().items())]
+        return _concat(frames, self.columns)
+
+    def archive_bounds(self, today):
+        """(first, last) day before ``today`` that has a partition, from file names only."""
+        with self._lock:
+            months = sorted(m for m in self._files() if m != UNDATED)
+        if not months or pd.Timestamp(months[0] + "-01").date() >= today:
+            return None
+        return pd.Timestamp(months[0] + "-01").date(), today - timedelta(days=1)
+
+    def is_empty(self):
+        with self._lock:
+            return not self._files()
+
+    # ----- writing -----
+    def insert(self, row, today):
+        """Add one row: a line appended to a hot month, a rewrite of an archived one."""
+        self.insert_many(pd.DataFrame([row]), today)
+
+    def insert_many(self, df, today):
+        """Add many rows: one append per hot month, one rewrite per archived month."""
+        df = df.reindex(columns=self.columns).fillna("").astype(str)
+        current = today.strftime("%Y-%m")
+        with self._lock:
+            files = self._files()
+            for month, rows in df.groupby(month_keys(df[self.date_column]), sort=True):
+                path = files.get(month)
+                if path is None and month != UNDATED and month >= current:
+                    path = self._hot_path(month)
+                if path is not None and path.endswith(".csv"):
+                    exists = os.path.exists(path)
+                    with open(path, "a", encoding="utf-8", newline="") as f:
+                        rows.to_csv(f, header=not exists, index=False)
+                        f.flush()
+                        os.fsync(f.fileno())
+                else:
+                    old = self._read(path) if path is not None else pd.DataFrame(columns=self.columns)
+                    self._write(month, _concat([old, rows], self.columns), today)
+            self.version += 1
+
+    def replace(self, df, today):
+        """Make the hot months exactly ``df`` (e.g. the sheet's current rows)."""
+        df = hot_rows(df, self.date_column, today)
+        keys = month_keys(df[self.date_column])
+        current, kept = today.strftime("%Y-%m"), set(keys)
+        with self._lock:
+            for month, path in self._files().items():
+                if month != UNDATED and month >= current and month not in kept:
+                    os.remove(path)
+            for month, rows in df.groupby(keys, sort=True):
+                self._write(month, rows, today)
+            self.version += 1
+
+    def reset(self, df, today):
+        """Replace every partition with ``df`` split by month."""
+        with self._lock:
+            for path in self._files().values():
+                os.remove(path)
+            for month, rows in df.groupby(month_keys(df[self.date_column]), sort=True):
+                self._write(month, rows, today)
+            self.version += 1
+
+    def rollover(self, today):
+        """Move hot months that have ended to the archive; returns the months moved."""
+        current = today.strftime("%Y-%m")
+        moved = []
+        with self._lock:
+            for month, path in sorted(self._files().items()):
+                if path.endswith(".csv") and (month == UNDATED or month < current):
+                    self._write(month, self._read(path), today)
+                    moved.append(month)
+            if moved:
+                self.version += 1
+        return moved
+
+
+class SQLiteMonths:
+    """The MonthPartitions interface over a SQLiteStore table.
+
+    The table's index on ``date_column`` already prunes by date, so the hot
+    set and archive ranges are range queries and ``rollover`` has nothing to
+    move. Dates are compared as "YYYY-MM-DD" text, the format the apps save.
+    """
+
+    def __init__(self, store, date_column):
+        self.store = store
+        self.date_column = date_column
+        self._date = quote(date_column)
+
+    @property
+    def version(self):
+        return self.store.version
+
+    def hot(self, today):
+        return self.store.query(f"{self._date} >= ?", (month_start(today),))
+
+    def range(self, start, end):
+        return self.store.query(f"{self._date} BETWEEN ? AND ?", (str(start), str(end)))
+
+    def archive_bounds(self, today):
+        first = self.store.scalar(
+            f"SELECT MIN({self._date}) FROM {self.store.table} WHERE {self._date} < ?", (str(today),)
+        )
+        first = pd.to_datetime(first, errors="coerce")
+        return None if pd.isna(first) else (first.date(), today - timedelta(days=1))
+
+    def load(self):
+        return self.store.load()
+
+    def is_empty(self):
+        return self.store.row_count() == 0
+
+    def insert(self, row, today):
+        return self.store.insert(row)
+
+    def insert_many(self, df, today):
+        return self.store.insert_many(df.to_dict("records"))
+
+    def replace(self, df, today):
+        self.store.replace(f"{self._date} >= ?", (month_start(today),), hot_rows(df, self.date_column, today))
+
+    def reset(self, df, today):
+        self.store.reset(df)
+
+    def rollover(self, today):
+        return []
+
+
+def _concat(frames, columns):
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+
+# ---------- Per-year worksheets ----------
+class YearWorksheets:
+    """Bookings spread over one worksheet per year of ``date_column``.
+
+    Worksheets are titled "<prefix> <year>" ("<prefix> undated" for rows
+    without a readable date) and created on first write with ``header`` as
+    row 1. Reads fetch only the years asked for, so loading the hot set costs
+    the same however old the clinic is. ``wrap`` is applied to every
+    worksheet opened (quota, tracing). A "<prefix> split done" worksheet
+    records that ``split`` copied every year of the old single worksheet.
+    """
+
+    def __init__(self, spreadsheet, header, date_column, prefix="Bookings", wrap=None):
+        self.spreadsheet = spreadsheet
+        self.header = list(header)
+        self.date_column = date_column
+        self.prefix = prefix
+        self.wrap = wrap or (lambda worksheet: worksheet)
+        self._sheets = None
+        self._split_done = False
+        self._lock = threading.Lock()
+
+    @property
+    def metrics(self):
+        """Quota counters of the spreadsheet wrapper, if it keeps any."""
+        return getattr(self.spreadsheet, "metrics", None)
+
+    @property
+    def split_marker(self):
+        return f"{self.prefix} split done"
+
+    def refresh(self):
+        """List the year worksheets again (picks up years created on other PCs)."""
+        prefix = self.prefix + " "
+        worksheets = self.spreadsheet.worksheets()
+        sheets = {
+            ws.title[len(prefix):]: self.wrap(ws)
+            for ws in worksheets
+            if ws.title.startswith(prefix) and (ws.title[len(prefix):].isdigit() or ws.title[len(prefix):] == UNDATED)
+        }
+        with self._lock:
+            self._sheets = sheets
+            self._split_done = any(ws.title == self.split_marker for ws in worksheets)
+        return sheets
+
+    def years(self):
+        sheets = self._sheets if self._sheets is not None else self.refresh()
+        return sorted(sheets)
+
+    def hot_years(self, today):
+        return [y for y in self.years() if y != UNDATED and int(y) >= today.year]
+
+    def worksheet(self, year, create=False):
+        sheets = self._sheets if self._sheets is not None else self.refresh()
+        worksheet = sheets.get(year)
+        if worksheet is None and create:
+            # Another PC may have created the year since we last listed them
+            worksheet = self.refresh().get(year)
+        if worksheet is None and create:
+            try:
+                worksheet = self.wrap(self.spreadsheet.add_worksheet(
+                    f"{self.prefix} {year}", rows=1000, cols=len(self.header)
+                ))
+            except Exception:
+                worksheet = self.refresh().get(year)
+                if worksheet is None:
+                    raise
+            else:
+                worksheet.update("1:1", [self.header])
+                with self._lock:
+                    self._sheets[year] = worksheet
+        return worksheet
+
+    def records(self, years):
+        """All rows of the given years' worksheets, one read per worksheet."""
+        frames = [pd.DataFrame(self.worksheet(y).get_all_records()) for y in years if self.worksheet(y)]
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        for col in self.header:
+            if col not in df.columns:
+                df[col] = ""
+        return df
+
+    def signature(self, today):
+        """Cheap change probe for the hot set: rows in column A per hot year."""
+        self.refresh()
+        return tuple((y, len(self.worksheet(y).col_values(1))) for y in self.hot_years(today))
+
+    def append(self, row):
+        """Append one record (a dict) to its year's worksheet."""
+        worksheet = self.worksheet(year_key(row[self.date_column]), create=True)
+        return worksheet.append_row([row.get(c, "") for c in self.header], value_input_option="RAW")
+
+    def append_rows(self, rows, value_input_option="RAW"):
+        """Append value lists in ``header`` order, one request per year (lets a SyncQueue drain here)."""
+        position = self.header.index(self.date_column)
+        by_year = {}
+        for row in rows:
+            by_year.setdefault(year_key(row[position]), []).append(row)
+        response = None
+        for year, year_rows in sorted(by_year.items()):
+            response = self.worksheet(year, create=True).append_rows(year_rows, value_input_option=value_input_option)
+        return response
+
+    def split(self, legacy):
+        """Copy a single all-years worksheet into per-year ones, once.
+
+        ``legacy`` is left as it was. Its columns are matched to ``header`` by
+        name; raises ValueError if any are missing (``legacy`` holds something
+        else). The split-done worksheet is added only after every year is
+        copied, so a split cut short (quota, network) resumes on the next
+        call: a year worksheet created but left empty is filled, and one that
+        already has rows gets only the legacy rows it lacks. Returns the years
+        written to.
+        """
+        self.refresh()
+        if self._split_done:
+            return []
+        values = legacy.get_all_values()
+        if len(values) < 2:
+            return []
+        header = values[0]
+        missing = [col for col in self.header if col not in header]
+        if missing:
+            raise ValueError(
+                f"'{legacy.title}' is not a bookings sheet (missing columns: {', '.join(missing)}); "
+                f"nothing copied to the '{self.prefix} <year>' worksheets"
+            )
+        df = pd.DataFrame([row + [""] * (len(header) - len(row)) for row in values[1:]], columns=header)
+        df = df.loc[:, ~df.columns.duplicated()][self.header]
+        written = []
+        for year, rows in df.groupby(year_keys(df[self.date_column]), sort=True):
+            rows = rows.values.tolist()
+            worksheet = self._sheets.get(year)
+            if worksheet is None:
+                worksheet = self.wrap(self.spreadsheet.add_worksheet(
+                    f"{self.prefix} {year}", rows=len(rows) + 1, cols=len(self.header)
+                ))
+                with self._lock:
+                    self._sheets[year] = worksheet
+                existing = []
+            else:
+                existing = worksheet.get_all_values()
+            if not existing:
+                worksheet.update("A1", [self.header] + rows)
+            else:
+                # Filled by an earlier attempt, or created since for new bookings
+                have = Counter(tuple(_padded(row, len(self.header))) for row in existing[1:])
+                todo = []
+                for row in rows:
+                    key = tuple(row)
+                    if have[key]:
+                        have[key] -= 1
+                    else:
+                        todo.append(row)
+                if not todo:
+                    continue
+                worksheet.append_rows(todo, value_input_option="RAW")
+            written.append(year)
+        self.spreadsheet.add_worksheet(self.split_marker, rows=1, cols=1)
+        self.refresh()
+        return written
+
+
+def _padded(row, width):
+    return [str(cell) for cell in row[:width]] + [""] * (width - len(row))
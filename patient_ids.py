@@ -0,0 +1,84 @@
+import fcntl
+import os
+from contextlib import contextmanager
+
+import pandas as pd
+
+# ---------- Patient ID allocation ----------
+def last_patient_number(store):
+    """Highest number in the stored Patient_IDs (digits only, e.g. "P-0042" -> 42); 0 if none."""
+    ids = pd.to_numeric(store.load(columns=["Patient_ID"])["Patient_ID"].dropna().astype(str)
+                        .str.extract(r"(\d+)")[0], errors="coerce")
+    return 0 if ids.empty or pd.isna(ids.max()) else int(ids.max())
+
+
+class PatientIdAllocator:
+    """Next Patient ID kept in a small counter file next to the data.
+
+    ``allocate`` reads and bumps the counter under an exclusive file lock, so
+    two reception desks submitting at once never get the same ID. The counter
+    is rebuilt from ``last_used()`` (a scan of the data) only when the file
+    is missing.
+    """
+
+    def __init__(self, counter_path, last_used, width=4):
+        self.counter_path = counter_path
+        self.last_used = last_used
+        self.width = width
+
+    @contextmanager
+    def _locked(self):
+        with open(self.counter_path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self):
+        try:
+            with open(self.counter_path, encoding="utf-8") as f:
+                return int(f.read().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write(self, number):
+        tmp_path = self.counter_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(str(number))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.counter_path)
+
+    def format(self, number):
+        """``number`` as a Patient ID, zero-padded to ``width``."""
+        return f"{number:0{self.width}d}"
+
+    def peek(self):
+        """The ID the next ``allocate`` will most likely return (for display)."""
+        number = self._read()
+        if number is None:
+            with self._locked():
+                number = self._read()
+                if number is None:
+                    number = (self.last_used() or 0) + 1
+                    self._write(number)
+        return self.format(number)
+
+    def allocate(self):
+        """Reserve and return the next ID."""
+        return self.allocate_many(1)[0]
+
+    def allocate_many(self, count, above=0):
+        """Reserve ``count`` consecutive IDs in one locked step (bulk imports).
+
+        ``above`` is the highest ID the caller is keeping as-is; the block and
+        every later ID start after it.
+        """
+        with self._locked():
+            number = self._read()
+            if number is None:
+                number = (self.last_used() or 0) + 1
+            number = max(number, above + 1)
+            self._write(number + count)
+        return [self.format(n) for n in range(number, number + count)]
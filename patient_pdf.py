@@ -0,0 +1,50 @@
+import io
+import zipfile
+
+from fpdf import FPDF
+
+# ---------- Patient summary PDFs ----------
+TITLE = "Dr Kawa Khalil_ Clinic Patient Record Summary"
+
+
+def _add_summary_page(pdf, record):
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+    pdf.cell(0, 10, TITLE, ln=True, align="C")
+    pdf.ln(10)
+    for key, value in record.items():
+        pdf.cell(0, 8, f"{key}: {value}", ln=True)
+
+
+def _to_bytes(pdf):
+    # fpdf 1.x returns a latin-1 str, fpdf2 a bytearray
+    out = pdf.output(dest="S")
+    return out.encode("latin-1") if isinstance(out, str) else bytes(out)
+
+
+def render_patient_pdf(record):
+    """One patient's visit summary as PDF bytes, without touching the disk."""
+    pdf = FPDF()
+    _add_summary_page(pdf, record)
+    return _to_bytes(pdf)
+
+
+def render_day_pdf(records):
+    """All summaries as pages of a single PDF."""
+    pdf = FPDF()
+    for record in records:
+        _add_summary_page(pdf, record)
+    return _to_bytes(pdf)
+
+
+def render_day_zip(records, names):
+    """One PDF per patient in a ZIP."""
+    # Rendered in this thread: fork()ing the multithreaded server can deadlock a child
+    # on a lock held by another thread, and fpdf is pure Python, so threads would not help
+    pdfs = [render_patient_pdf(record) for record in records]
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in zip(names, pdfs):
+            zf.writestr(name, data)
+    return buffer.getvalue()
@@ -0,0 +1,138 @@
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+# ---------- Patient search ----------
+SEARCH_FIELDS = ["Patient_ID", "Full_Name", "Phone_Number", "Diagnosis"]
+
+# Arabic / Kurdish (Sorani) spelling variants folded to one letter, and
+# Arabic-Indic / Persian digits to ASCII. Hamza and madda carriers are split
+# off by NFKD and dropped with the other combining marks.
+_LETTERS = str.maketrans({
+    "ٱ": "ا",
+    "ى": "ي", "ی": "ي", "ێ": "ي",
+    "ک": "ك",
+    "ة": "ه", "ە": "ه", "ھ": "ه", "ۀ": "ه",
+    "ۆ": "و", "ڵ": "ل", "ڕ": "ر",
+    "ـ": "",  # tatweel
+    **{chr(0x0660 + d): str(d) for d in range(10)},
+    **{chr(0x06F0 + d): str(d) for d in range(10)},
+})
+_INITIAL_YEH_HAMZA = re.compile(r"(?<!\w)ئ")
+_NON_WORD = re.compile(r"[\W_]+")
+_NON_DIGIT = re.compile(r"\D+")
+
+
+def normalize_search(value):
+    """Accent-, case- and spelling-variant-insensitive words of ``value``."""
+    if value is None or value != value:  # None / NaN
+        return ""
+    # Kurdish writes a word-initial vowel on ئ where Arabic uses ا
+    text = _INITIAL_YEH_HAMZA.sub("ا", str(value))
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = text.casefold().translate(_LETTERS)
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+def _field_text(field, value):
+    text = normalize_search(value)
+    if field == "Phone_Number":
+        # Digits only, so "0750 123 4567" matches "07501234567"
+        return _NON_DIGIT.sub("", text)
+    if field == "Patient_ID" and text.isdigit():
+        return f"{text} {int(text)}"  # "0012" also found as "12"
+    return text
+
+
+def patient_key(record):
+    """Groups one patient's visits: normalized name plus phone digits."""
+    return normalize_search(record.get("Full_Name")), _field_text("Phone_Number", record.get("Phone_Number"))
+
+
+def _grams(doc):
+    grams = set()
+    for word in doc.split():
+        padded = " " + word  # the leading space makes " ab" a word-prefix gram
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _query_grams(word):
+    if len(word) >= 3:
+        return {word[i:i + 3] for i in range(len(word) - 2)}
+    return {" " + word}
+
+
+class PatientSearchIndex:
+    """Trigram inverted index over the search fields of every stored row.
+
+    A query matches rows containing every query word (two-letter words as a
+    word prefix, longer ones anywhere). Lookups intersect the posting sets of
+    the query's trigrams and confirm against the row's text. ``add`` keeps
+    the index current on every save, so it is only built once.
+    """
+
+    def __init__(self, fields=SEARCH_FIELDS):
+        self.fields = list(fields)
+        self._postings = defaultdict(set)
+        self._docs = {}
+        self._lock = threading.Lock()
+
+    def _doc(self, record):
+        return " " + " ".join(filter(None, (_field_text(f, record.get(f)) for f in self.fields)))
+
+    def _remove(self, index):
+        doc = self._docs.pop(index, None)
+        for gram in _grams(doc or ""):
+            postings = self._postings.get(gram)
+            if postings is not None:
+                postings.discard(index)
+                if not postings:
+                    del self._postings[gram]
+
+    def add(self, index, record):
+        """Index a new row, or re-index a row whose fields changed."""
+        index, doc = int(index), self._doc(record)
+        with self._lock:
+            self._remove(index)
+            if doc.strip():
+                self._docs[index] = doc
+                for gram in _grams(doc):
+                    self._postings[gram].add(index)
+
+    def rebuild(self, df):
+        """Index every row of ``df`` (indexed by row position)."""
+        with self._lock:
+            self._postings.clear()
+            self._docs.clear()
+        for index, record in zip(df.index, df[self.fields].to_dict("records")):
+            self.add(index, record)
+        return self
+
+    def search(self, query, limit=50):
+        """Row indexes matching ``query``, newest first."""
+        words = [w for w in normalize_search(query).split() if len(w) >= 2]
+        if not words:
+            return []
+        with self._lock:
+            postings = sorted(
+                (self._postings.get(gram, set()) for word in words for gram in _query_grams(word)), key=len
+            )
+            # The two rarest grams narrow the candidates enough; every word is
+            # confirmed against the row text anyway, newest rows first, until
+            # ``limit`` real matches are found
+            candidates = postings[0].intersection(*postings[1:2])
+            needles = [" " + w if len(w) < 3 else w for w in words]
+            matches = []
+            for i in sorted(candidates, reverse=True):
+                doc = self._docs[i]
+                if all(needle in doc for needle in needles):
+                    matches.append(i)
+                    if len(matches) == limit:
+                        break
+        return matches
+
+    def __len__(self):
+        return len(self._docs)
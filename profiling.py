@@ -0,0 +1,231 @@
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+
+# ---------- Per-rerun timing spans ----------
+TRACE_FILE = "clinic_trace.jsonl"
+TRACE_MAX_BYTES = 5_000_000  # rotated to <file>.1 beyond this
+
+_local = threading.local()
+_write_lock = threading.Lock()
+
+
+class RerunTrace:
+    """Timing spans and Sheets traffic of one script run.
+
+    ``start_rerun`` makes it the current trace of the script thread; ``span``
+    blocks and traced worksheet calls record into it. ``finish`` appends one
+    JSON line to the trace file.
+    """
+
+    def __init__(self, app, session, path):
+        self.app = app
+        self.session = session
+        self.path = path
+        self.page = None
+        self.started = time.time()
+        self.spans = []
+        self.sheet_calls = 0
+        self.sheet_cells = 0
+        self.finished = False
+        self._t0 = time.perf_counter()
+        self._last = self._t0
+        self._depth = 0
+
+    def _elapsed_ms(self, end=None):
+        return round(((end or time.perf_counter()) - self._t0) * 1000, 2)
+
+    def record(self, name, start, end, depth, **meta):
+        self.spans.append({"name": name, "start_ms": self._elapsed_ms(start),
+                           "ms": round((end - start) * 1000, 2), "depth": depth, **meta})
+        self._last = end
+
+    def finish(self, interrupted=False):
+        """Write the trace. An interrupted run (st.rerun / st.stop) ends at its last span."""
+        if self.finished:
+            return
+        self.finished = True
+        end = self._last if interrupted else time.perf_counter()
+        record = {
+            "ts": round(self.started, 3), "app": self.app, "page": self.page, "session": self.session,
+            "total_ms": self._elapsed_ms(end), "interrupted": interrupted,
+            "sheet_calls": self.sheet_calls, "sheet_cells": self.sheet_cells, "spans": self.spans,
+        }
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with _write_lock:
+            if os.path.exists(self.path) and os.path.getsize(self.path) > TRACE_MAX_BYTES:
+                os.replace(self.path, self.path + ".1")
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+def start_rerun(app, state, path=TRACE_FILE):
+    """Begin tracing this script run; ``state`` is the session state."""
+    previous = state.get("_rerun_trace")
+    if previous is not None:
+        previous.finish(interrupted=True)
+    if "_trace_session" not in state:
+        state["_trace_session"] = uuid.uuid4().hex[:8]
+    trace = RerunTrace(app, state["_trace_session"], path)
+    state["_rerun_trace"] = trace
+    _local.trace = trace
+    return trace
+
+
+def current_trace():
+    trace = getattr(_local, "trace", None)
+    return None if trace is None or trace.finished else trace
+
+
+@contextmanager
+def span(name, **meta):
+    """Time a block in the current trace (a no-op outside a traced script run)."""
+    trace = current_trace()
+    if trace is None:
+        yield
+        return
+    depth = trace._depth
+    trace._depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace._depth = depth
+        trace.record(name, start, time.perf_counter(), depth, **meta)
+
+
+def timed(name):
+    """Decorator form of ``span``."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _payload_shape(value):
+    """(rows, cells) of a Sheets payload, counted with ``len`` instead of serializing it."""
+    if isinstance(value, dict):
+        return _payload_shape(value["values"]) if "values" in value else (0, 0)
+    if not isinstance(value, (list, tuple)) or not value:
+        return 0, 0
+    first = value[0]
+    if isinstance(first, dict) and "values" in first:  # batch_update ranges
+        shapes = [_payload_shape(item) for item in value]
+        return sum(r for r, _ in shapes), sum(c for _, c in shapes)
+    if isinstance(first, (list, tuple, dict)):  # rows of cells, or get_all_records
+        return len(value), sum(len(row) for row in value)
+    if isinstance(first, (str, int, float)):
+        return 1, len(value)  # one row or column of cells
+    return 0, 0  # e.g. the Worksheet objects of worksheets()
+
+
+def _call_shape(args, kwargs):
+    shapes = [_payload_shape(value) for value in [*args, *kwargs.values()]]
+    return sum(r for r, _ in shapes), sum(c for _, c in shapes)
+
+
+class TracedWorksheet:
+    """Worksheet proxy that records every call as a ``sheets.<method>`` span."""
+
+    def __init__(self, sheet):
+        self._sheet = sheet
+
+    def __getattr__(self, name):
+        attr = getattr(self._sheet, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            trace = current_trace()
+            if trace is None:
+                return attr(*args, **kwargs)
+            start = time.perf_counter()
+            result = attr(*args, **kwargs)
+            end = time.perf_counter()
+            (rows_sent, cells_sent), (rows_received, cells_received) = _call_shape(args, kwargs), _payload_shape(result)
+            trace.sheet_calls += 1
+            trace.sheet_cells += cells_sent + cells_received
+            trace.record(
+                f"sheets.{name}", start, end, trace._depth, rows_sent=rows_sent, cells_sent=cells_sent,
+                rows_received=rows_received, cells_received=cells_received,
+            )
+            return result
+        return call
+
+
+# ---------- Reading traces ----------
+def read_traces(path=TRACE_FILE, limit=100):
+    """The last ``limit`` traces, oldest first."""
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        lines = deque(f, maxlen=limit)
+    traces = []
+    for line in lines:
+        try:
+            traces.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+    return traces
+
+
+def page_percentiles(traces):
+    """Reruns, p50 and p95 of the total time per (app, page)."""
+    df = pd.DataFrame([{"app": t["app"], "page": t["page"], "ms": t["total_ms"]} for t in traces])
+    if df.empty:
+        return df
+    grouped = df.groupby(["app", "page"], dropna=False)["ms"]
+    return pd.DataFrame({
+        "reruns": grouped.size(),
+        "p50_ms": grouped.quantile(0.5).round(1),
+        "p95_ms": grouped.quantile(0.95).round(1),
+    }).reset_index()
+
+
+def rerun_breakdown(traces):
+    """One row per rerun: total, top-level spans by name and the unaccounted rest."""
+    rows = []
+    for t in reversed(traces):
+        top = {}
+        for s in t["spans"]:
+            if s["depth"] == 0:
+                top[s["name"]] = top.get(s["name"], 0) + s["ms"]
+        rows.append({
+            "time": pd.Timestamp(t["ts"], unit="s").strftime("%H:%M:%S"), "page": t["page"],
+            "total_ms": t["total_ms"], "sheet_calls": t["sheet_calls"], "sheet_cells": t.get("sheet_cells", 0),
+            **{name: round(ms, 1) for name, ms in top.items()},
+            "render/other_ms": round(t["total_ms"] - sum(top.values()), 1),
+        })
+    return pd.DataFrame(rows).fillna(0)
+
+
+def profiler_panel(path=TRACE_FILE, metrics=None):
+    """Admin sidebar panel with the breakdown of the last N reruns.
+
+    ``metrics`` (e.g. the Sheets quota counters) are shown above it.
+    """
+    with st.sidebar.expander("⏱️ Profiler"):
+        if metrics is not None:
+            st.caption("Google Sheets requests")
+            st.json(metrics, expanded=False)
+        limit = st.number_input("Last N reruns", min_value=10, max_value=2000, value=50, step=10, key="profiler_n")
+        traces = read_traces(path, int(limit))
+        if not traces:
+            st.caption("No reruns traced yet.")
+            return
+        st.caption("Per page")
+        st.dataframe(page_percentiles(traces), hide_index=True, use_container_width=True)
+        st.caption("Per rerun (newest first)")
+        st.dataframe(rerun_breakdown(traces), hide_index=True, use_container_width=True)
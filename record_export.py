@@ -0,0 +1,72 @@
+import gzip
+import io
+
+from sqlite_store import SQLiteStore, quote
+
+# ---------- Chunked record export ----------
+CHUNK_ROWS = 5000
+
+EXPORT_FORMATS = {
+    # label: (file extension, mime type)
+    "CSV (gzip)": ("csv.gz", "application/gzip"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "CSV": ("csv", "text/csv"),
+}
+
+
+def iter_record_chunks(store, start=None, end=None, chunk_rows=CHUNK_ROWS):
+    """Yield the stored records in chunks, optionally limited to a date range.
+
+    A row is in range when its visit ``Date`` or its ``Appt_Date`` falls in
+    [start, end]. SQLite is read with keyset pagination on row_index, so no
+    more than one chunk is materialized at a time.
+    """
+    if isinstance(store, SQLiteStore):
+        where, params = "1", []
+        if start is not None:
+            where = (
+                f"(({quote('Date')} BETWEEN ? AND ?) OR ({quote('Appt_Date')} BETWEEN ? AND ?))"
+            )
+            params = [str(start), str(end)] * 2
+        last = -1
+        while True:
+            chunk = store.query(f"{where} AND row_index > ?", params + [last], limit=chunk_rows)
+            if chunk.empty:
+                return
+            yield chunk
+            last = int(chunk.index[-1])
+    else:
+        df = store.frame()
+        if start is not None:
+            in_range = lambda col: df[col].between(str(start), str(end))
+            df = df[in_range("Date") | in_range("Appt_Date")]
+        for i in range(0, len(df), chunk_rows):
+            yield df.iloc[i:i + chunk_rows]
+
+
+def export_records(chunks, fmt):
+    """Serialize record chunks into ``fmt`` (a key of EXPORT_FORMATS) as bytes."""
+    buffer = io.BytesIO()
+    if fmt == "Parquet":
+        # pyarrow is optional; it ships with Streamlit but is not required here
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk.astype("string"), preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(buffer, table.schema, compression="zstd")
+            writer.write_table(table)
+        if writer is not None:
+            writer.close()
+        return buffer.getvalue()
+
+    out = gzip.GzipFile(fileobj=buffer, mode="wb") if fmt == "CSV (gzip)" else buffer
+    header = True
+    for chunk in chunks:
+        out.write(chunk.to_csv(index=False, header=header).encode("utf-8"))
+        header = False
+    if out is not buffer:
+        out.close()
+    return buffer.getvalue()
@@ -0,0 +1,88 @@
+import threading
+import time
+
+# ---------- Background Google Sheets connection ----------
+SHEET_STATUS_LABELS = {
+    "connecting": "🟡 Connecting to Google Sheets… showing local data",
+    "offline": "🔴 Google Sheets unreachable, retrying… showing local data",
+    "synced": "🟢 Google Sheets: synced",
+}
+
+
+class SheetUnavailable(Exception):
+    """The worksheet isn't connected (yet)."""
+
+
+class SheetConnection:
+    """A worksheet opened in a background thread so pages never wait for it.
+
+    ``connect(connection)`` does the slow part (service-account auth,
+    ``open_by_key``, header checks) and returns the worksheet; it may call
+    ``connection.notify(message)`` for anything the user should see. Failed
+    attempts are retried with exponential backoff. Until it succeeds
+    ``sheet`` is None and ``status`` is "connecting" or "offline".
+    """
+
+    def __init__(self, connect, retry=5.0, max_backoff=300.0):
+        self.connect = connect
+        self.retry = retry
+        self.max_backoff = max_backoff
+        self.sheet = None
+        self.last_error = None
+        self.notices = []
+        self._ready = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def status(self):
+        if self._ready.is_set():
+            return "synced"
+        return "offline" if self.last_error else "connecting"
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def notify(self, message):
+        self.notices.append(message)
+
+    def on_ready(self, callback):
+        """Call ``callback()`` once connected (right away if already connected)."""
+        with self._lock:
+            if not self._ready.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def get(self, timeout=0):
+        """The worksheet, waiting up to ``timeout`` seconds for the connection."""
+        if not self._ready.wait(timeout):
+            raise SheetUnavailable(self.last_error or "Google Sheets is still connecting")
+        return self.sheet
+
+    def _run(self):
+        delay = self.retry
+        while True:
+            try:
+                sheet = self.connect(self)
+            except Exception as e:
+                self.last_error = str(e)
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+                continue
+            with self._lock:
+                self.sheet = sheet
+                self.last_error = None
+                self._ready.set()
+                callbacks, self._callbacks = self._callbacks, []
+            for callback in callbacks:
+                callback()
+            return
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="sheet-connect", daemon=True)
+            self._thread.start()
+        return self
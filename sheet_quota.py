@@ -0,0 +1,176 @@
+import random
+import threading
+import time
+from collections import Counter
+
+import requests
+from gspread.exceptions import APIError
+
+# ---------- Quota-aware worksheet ----------
+READ_METHODS = {
+    "get_all_records", "get_all_values", "get_values", "get", "batch_get",
+    "row_values", "col_values", "acell", "cell", "find", "findall", "worksheets",
+}
+# Range-addressed writes: sending one twice leaves the sheet as sending it once
+IDEMPOTENT_WRITES = {
+    "update", "batch_update", "update_cell", "update_cells", "clear", "batch_clear", "resize", "format",
+}
+WRITE_METHODS = IDEMPOTENT_WRITES | {
+    "append_row", "append_rows", "insert_row", "insert_rows", "delete_rows", "add_worksheet",
+}
+
+
+class TokenBucket:
+    """Allows ``per_minute`` requests a minute, in bursts of up to ``burst``."""
+
+    def __init__(self, per_minute, burst=None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or max(1, per_minute // 6)
+        self.tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, sleeping until one is free; returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+def is_retryable(error):
+    """429 (quota), 5xx and dropped connections are worth retrying."""
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    if isinstance(error, APIError):
+        status = getattr(getattr(error, "response", None), "status_code", None)
+        return status == 429 or (status is not None and status >= 500)
+    return False
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Quota:
+    """Buckets, in-flight reads and counters shared by a worksheet and its siblings."""
+
+    def __init__(self, reads_per_minute, writes_per_minute, max_retries, base_delay, max_delay):
+        self.read_bucket = TokenBucket(reads_per_minute)
+        self.write_bucket = TokenBucket(writes_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.counts = Counter()
+        self.throttled = 0.0
+
+
+class QuotaWorksheet:
+    """Worksheet wrapper that keeps the app inside the Sheets API quotas.
+
+    Reads and writes each take a token from their own bucket (the API's
+    per-minute read and write quotas). Identical reads already in flight
+    (same worksheet, method and arguments, from any session) are coalesced:
+    later callers wait for and share the first caller's result, which they
+    must treat as read-only. Reads and range-addressed writes are retried on
+    429/5xx with exponential backoff and jitter. Appends, inserts and
+    ``add_worksheet`` are sent once: a timed-out one may already be applied,
+    so the error goes back to the caller (the write-behind queues, the
+    import checkpoint) instead of risking a duplicate. ``sibling`` wraps
+    other worksheets of the spreadsheet under the same buckets and counters,
+    since the quotas are per project.
+    """
+
+    def __init__(self, sheet, reads_per_minute=60, writes_per_minute=60,
+                 max_retries=5, base_delay=1.0, max_delay=64.0):
+        self.sheet = sheet
+        self._quota = _Quota(reads_per_minute, writes_per_minute, max_retries, base_delay, max_delay)
+
+    @property
+    def metrics(self):
+        """Requests sent, calls saved by coalescing, retries, errors and time spent throttled."""
+        quota = self._quota
+        with quota.lock:
+            return {
+                "requests": sum(quota.requests.values()),
+                "coalesced": quota.counts["coalesced"],
+                "retries": quota.counts["retries"],
+                "errors": quota.counts["errors"],
+                "throttled_s": round(quota.throttled, 3),
+                "by_method": dict(quota.requests),
+            }
+
+    def sibling(self, sheet):
+        """Wrap another worksheet (or the spreadsheet) under this one's quota and counters."""
+        twin = object.__new__(QuotaWorksheet)
+        twin.sheet, twin._quota = sheet, self._quota
+        return twin
+
+    def _call(self, name, args, kwargs, bucket, retry=True):
+        quota = self._quota
+        delay = quota.base_delay
+        for attempt in range(quota.max_retries + 1):
+            waited = bucket.acquire()
+            with quota.lock:
+                quota.throttled += waited
+                quota.requests[name] += 1
+            try:
+                return getattr(self.sheet, name)(*args, **kwargs)
+            except Exception as e:
+                if not retry or attempt == quota.max_retries or not is_retryable(e):
+                    with quota.lock:
+                        quota.counts["errors"] += 1
+                    raise
+                with quota.lock:
+                    quota.counts["retries"] += 1
+                time.sleep(delay + random.uniform(0, delay / 2))
+                delay = min(delay * 2, quota.max_delay)
+
+    def _coalesced(self, name, args, kwargs):
+        quota = self._quota
+        key = (id(self.sheet), name, repr(args), repr(sorted(kwargs.items())))
+        with quota.lock:
+            flight = quota.inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = quota.inflight[key] = _Flight()
+            else:
+                quota.counts["coalesced"] += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = self._call(name, args, kwargs, quota.read_bucket)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with quota.lock:
+                del quota.inflight[key]
+            flight.done.set()
+
+    def __getattr__(self, name):
+        attr = getattr(self.sheet, name)
+        if name in READ_METHODS:
+            return lambda *args, **kwargs: self._coalesced(name, args, kwargs)
+        if name in WRITE_METHODS:
+            retry = name in IDEMPOTENT_WRITES
+            return lambda *args, **kwargs: self._call(name, args, kwargs, self._quota.write_bucket, retry)
+        return attr
@@ -0,0 +1,277 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# ---------- Sheet row index ----------
+def col_letter(n):
+    """1-based column number to A1 letters (1 -> A, 27 -> AA)."""
+    letters = ""
+    while n:
+        n, rem = divmod(n - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+class SheetRowIndex:
+    """Local cache of key (Patient_ID) -> sheet row number.
+
+    Built once from the key column when the cache file is missing, then kept
+    current from the ranges returned by ``append_rows``.
+    """
+
+    def __init__(self, index_path):
+        self.index_path = index_path
+        self.rows = None
+        if os.path.exists(index_path):
+            with open(index_path, encoding="utf-8") as f:
+                self.rows = json.load(f)
+
+    def ensure(self, sheet, key_column):
+        if self.rows is None:
+            column = sheet.col_values(key_column)
+            # Row 1 is the header; later rows win if a key was appended twice
+            self.rows = {key: i for i, key in enumerate(column, start=1) if i > 1 and key}
+            self.save()
+        return self.rows
+
+    def save(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.rows, f)
+        os.replace(tmp_path, self.index_path)
+
+
+# ---------- Write-behind queue for Google Sheets ----------
+class SyncQueue:
+    """Persistent local queue of rows waiting to be pushed to Google Sheets.
+
+    Rows are appended to a JSONL file (fsync'd) so a restart never loses them.
+    A background thread drains the queue once per interval and backs off
+    exponentially while the sheet is unreachable. Rows whose key already has a
+    sheet row become one ``batch_update`` of range writes; everything else goes
+    out in a single ``append_rows`` call. ``sheet`` is a worksheet or a
+    function returning one (and raising while it isn't available).
+    """
+
+    def __init__(self, sheet, queue_path, row_index=None, key_column=None,
+                 interval=5.0, max_backoff=300.0):
+        self.sheet = sheet
+        self.queue_path = queue_path
+        self.row_index = row_index
+        self.key_column = key_column
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _read(self):
+        if not os.path.exists(self.queue_path):
+            return []
+        with open(self.queue_path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def enqueue(self, rows, keys=None):
+        """Persist rows (lists of cell values) for the next batch.
+
+        ``keys`` optionally gives each row's Patient_ID so later edits of the
+        same patient overwrite its sheet row instead of appending a new one.
+        """
+        if not rows:
+            return
+        keys = keys or [None] * len(rows)
+        with self._lock:
+            with open(self.queue_path, "a", encoding="utf-8") as f:
+                for values, key in zip(rows, keys):
+                    f.write(json.dumps({"key": key or None, "values": values}, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def pending(self):
+        with self._lock:
+            return len(self._read())
+
+    def queued_rows(self):
+        """Values of the rows still waiting to be sent, oldest first."""
+        with self._lock:
+            return [item["values"] for item in self._read()]
+
+    def _send(self, items):
+        sheet = self.sheet() if callable(self.sheet) else self.sheet
+        index = {}
+        if self.row_index is not None and any(item.get("key") for item in items):
+            index = self.row_index.ensure(sheet, self.key_column)
+
+        # Collapse repeated edits of one key to its latest values
+        latest, appends = {}, []
+        for item in items:
+            key = item.get("key")
+            if key is None:
+                appends.append((None, item["values"]))
+            elif key not in latest:
+                latest[key] = item["values"]
+                appends.append((key, None))
+            else:
+                latest[key] = item["values"]
+        appends = [(key, values if key is None else latest[key]) for key, values in appends]
+        updates = [(index[key], values) for key, values in appends if key is not None and key in index]
+        appends = [(key, values) for key, values in appends if key is None or key not in index]
+
+        if updates:
+            sheet.batch_update([
+                {"range": f"A{row}:{col_letter(len(values))}{row}", "values": [values]}
+                for row, values in updates
+            ], value_input_option="RAW")
+        if appends:
+            response = sheet.append_rows([values for _, values in appends], value_input_option="RAW")
+            first_row = first_appended_row(response)
+            if first_row is not None and self.row_index is not None:
+                for offset, (key, _) in enumerate(appends):
+                    if key is not None:
+                        index[key] = first_row + offset
+                self.row_index.save()
+
+    def flush(self):
+        """Send all pending rows. Raises if a sheet call fails."""
+        with self._lock:
+            items = self._read()
+        if not items:
+            return 0
+        self._send(items)
+        with self._lock:
+            # Keep anything enqueued while the request was in flight
+            remaining = self._read()[len(items):]
+            tmp_path = self.queue_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for item in remaining:
+                    f.write(json.dumps(item, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.queue_path)
+        return len(items)
+
+    def _run(self):
+        delay = self.interval
+        while True:
+            time.sleep(delay)
+            try:
+                self.flush()
+                self.last_error = None
+                delay = self.interval
+            except Exception as e:
+                self.last_error = str(e)
+                delay = min(max(delay, self.interval) * 2, self.max_backoff)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="sheet-sync", daemon=True)
+            self._thread.start()
+        return self
+
+
+def first_appended_row(response):
+    """Row number of the first appended row, parsed from ``updatedRange``."""
+    try:
+        updated_range = response["updates"]["updatedRange"]
+    except (KeyError, TypeError):
+        return None
+    start = updated_range.split("!")[-1].split(":")[0]
+    digits = "".join(ch for ch in start if ch.isdigit())
+    return int(digits) if digits else None
+
+
+# ---------- Delta tracking ----------
+def row_hash(values):
+    return hashlib.sha1("\x1f".join(values).encode("utf-8")).hexdigest()
+
+
+class SyncState:
+    """Watermark plus per-row content hashes of what has been handed to the queue.
+
+    Rows past ``last_synced_row`` are new; rows before it are only re-sent when
+    a save path reports them as touched and their hash actually changed, so the
+    cost of a save depends on the size of the change rather than the sheet.
+
+    ``mark`` appends just the changed hashes to a JSONL log next to the state
+    file; the log is folded into the state file once it passes
+    ``compact_bytes``. Callers serialize ``delta`` and ``mark`` with ``lock``.
+    """
+
+    def __init__(self, state_path, baseline=None, compact_bytes=1_000_000):
+        self.state_path = state_path
+        self.log_path = os.path.splitext(state_path)[0] + ".log.jsonl"
+        self.compact_bytes = compact_bytes
+        self.lock = threading.Lock()
+        if os.path.exists(state_path):
+            with open(state_path, encoding="utf-8") as f:
+                state = json.load(f)
+            self.last_synced_row = state["last_synced_row"]
+            self.hashes = state["hashes"]
+            self._replay_log()
+        else:
+            # No state yet: treat the existing local data as already in the sheet
+            self.last_synced_row = 0
+            self.hashes = {}
+            if baseline is not None:
+                self._apply(self._hashes_of(baseline.fillna("").astype(str)))
+            self.compact()
+
+    def _replay_log(self):
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn last line (crash mid-write)
+                self._apply(entry["hashes"])
+
+    @staticmethod
+    def _hashes_of(rows):
+        return {str(i): row_hash(values) for i, values in zip(rows.index, rows.values.tolist())}
+
+    def _apply(self, hashes):
+        self.hashes.update(hashes)
+        if hashes:
+            self.last_synced_row = max(self.last_synced_row, max(int(i) for i in hashes) + 1)
+
+    def delta(self, row_count, touched, fetch):
+        """Rows (str-typed, indexed by position) that are new or changed.
+
+        ``fetch(positions)`` returns those rows from the local store, so only
+        new and touched rows are ever read.
+        """
+        new = list(range(self.last_synced_row, row_count))
+        touched = sorted(i for i in set(touched) if i < self.last_synced_row)
+        rows = fetch(touched + new).fillna("").astype(str)
+        changed = [i for i in touched if self.hashes.get(str(i)) != row_hash(rows.loc[i].tolist())]
+        return rows.loc[changed + new]
+
+    def mark(self, rows):
+        """Record ``rows`` as handed to the queue: one fsync'd log line of their hashes."""
+        hashes = self._hashes_of(rows)
+        if not hashes:
+            return
+        self._apply(hashes)
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"hashes": hashes}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        if size >= self.compact_bytes:
+            self.compact()
+
+    def compact(self):
+        """Write the whole state to the state file and empty the log."""
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"last_synced_row": self.last_synced_row, "hashes": self.hashes}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.state_path)
+        # A crash before this only replays hashes the state file already has
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
@@ -0,0 +1,147 @@
+import sqlite3
+import threading
+
+import pandas as pd
+
+# ---------- Embedded SQLite storage ----------
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+class SQLiteStore:
+    """Records in a local SQLite table with the same interface as JournalStore.
+
+    Every column is TEXT (NULL for empty cells) and ``row_index`` is the row's
+    position, so sync and journal code can address rows the same way in both
+    backends. ``indexes`` is a list of ``(name, expression, where)`` tuples;
+    ``where`` makes a partial index, e.g. for the doctor's waiting list.
+    ``version`` goes up on every write made through this store.
+    """
+
+    def __init__(self, db_path, columns, indexes=(), import_from=None, table="records"):
+        self.db_path = db_path
+        self.columns = list(columns)
+        self.table = table
+        self.version = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (row_index INTEGER PRIMARY KEY)")
+            existing = {r[1] for r in self._conn.execute(f"PRAGMA table_info({table})")}
+            for col in self.columns:
+                if col not in existing:
+                    self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {quote(col)} TEXT")
+            for name, expression, where in indexes:
+                sql = f"CREATE INDEX IF NOT EXISTS {name} ON {table}({expression})"
+                self._conn.execute(sql + (f" WHERE {where}" if where else ""))
+        if import_from is not None and self.row_count() == 0:
+            self.reset(import_from())
+
+    # ----- reading -----
+    def query(self, where="1", params=(), columns=None, order_by="row_index", limit=None, offset=0):
+        """Rows matching a SQL condition, as strings indexed by row_index."""
+        cols = ", ".join(quote(c) for c in (columns or self.columns))
+        sql = f"SELECT row_index, {cols} FROM {self.table} WHERE {where} ORDER BY {order_by}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)} OFFSET {int(offset)}"
+        with self._lock:
+            df = pd.read_sql_query(sql, self._conn, params=params, index_col="row_index")
+        df.index.name = None
+        return df
+
+    def count(self, where="1", params=()):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table} WHERE {where}", params).fetchone()[0]
+
+    def scalar(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()[0]
+
+    def load(self, columns=None):
+        return self.query(columns=columns)
+
+    def rows(self, positions):
+        positions = [int(i) for i in positions]
+        if not positions:
+            return pd.DataFrame(columns=self.columns)
+        marks = ", ".join("?" * len(positions))
+        return self.query(f"row_index IN ({marks})", positions).reindex(positions)
+
+    def row_count(self):
+        return self.scalar(f"SELECT COALESCE(MAX(row_index) + 1, 0) FROM {self.table}")
+
+    # ----- writing -----
+    def insert(self, row):
+        """Append a new row; returns its index."""
+        values = _clean(row)
+        cols = list(values)
+        with self._lock, self._conn:
+            index = self._conn.execute(
+                f"SELECT COALESCE(MAX(row_index) + 1, 0) FROM {self.table}"
+            ).fetchone()[0]
+            self._conn.execute(
+                f"INSERT INTO {self.table} (row_index, {', '.join(quote(c) for c in cols)}) "
+                f"VALUES (?, {', '.join('?' * len(cols))})",
+                [index] + [values[c] for c in cols],
+            )
+            self.version += 1
+        return index
+
+    def insert_many(self, rows):
+        """Append many rows (dicts) in one transaction; returns their indexes."""
+        rows = [_clean(row) for row in rows]
+        if not rows:
+            return []
+        cols = [c for c in self.columns if any(c in row for row in rows)]
+        with self._lock, self._conn:
+            start = self._conn.execute(
+                f"SELECT COALESCE(MAX(row_index) + 1, 0) FROM {self.table}"
+            ).fetchone()[0]
+            self._conn.executemany(
+                f"INSERT INTO {self.table} (row_index, {', '.join(quote(c) for c in cols)}) "
+                f"VALUES (?, {', '.join('?' * len(cols))})",
+                [[start + i] + [row.get(c) for c in cols] for i, row in enumerate(rows)],
+            )
+            self.version += 1
+        return list(range(start, start + len(rows)))
+
+    def update(self, index, values):
+        """Overwrite some columns of an existing row."""
+        values = _clean(values)
+        assignments = ", ".join(f"{quote(c)} = ?" for c in values)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE {self.table} SET {assignments} WHERE row_index = ?",
+                list(values.values()) + [int(index)],
+            )
+            self.version += 1
+        return int(index)
+
+    def reset(self, df):
+        """Replace every row with ``df`` (used for imports)."""
+        self.replace("1", (), df)
+
+    def replace(self, where, params, df):
+        """Swap the rows matching a SQL condition for ``df``'s rows (added at the end)."""
+        cols = [c for c in df.columns if c in self.columns]
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE {where}", params)
+            start = self._conn.execute(
+                f"SELECT COALESCE(MAX(row_index) + 1, 0) FROM {self.table}"
+            ).fetchone()[0]
+            records = [
+                [i] + [None if pd.isna(v) or v == "" else str(v) for v in row]
+                for i, row in enumerate(df[cols].itertuples(index=False, name=None), start=start)
+            ]
+            self._conn.executemany(
+                f"INSERT INTO {self.table} (row_index, {', '.join(quote(c) for c in cols)}) "
+                f"VALUES (?, {', '.join('?' * len(cols))})",
+                records,
+            )
+            self.version += 1
+
+
+def _clean(values):
+    return {k: (None if pd.isna(v) or v == "" else str(v)) for k, v in values.items()}
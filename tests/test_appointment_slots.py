@@ -0,0 +1,70 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from appointment_slots import ClinicHours, SlotIndex, format_slot, parse_minutes, parse_slot
+
+DAY = date(2026, 10, 19)  # a Monday
+
+
+def index(times, doctors=("Dr Kawa", "Dr Sara")):
+    hours = ClinicHours("09:00", "17:00", 15, ["Friday"], list(doctors))
+    df = pd.DataFrame({"Date": [DAY.isoformat()] * len(times), "Time": times})
+    return SlotIndex(hours, "Date", "Time").rebuild(df, version=1)
+
+
+@pytest.mark.parametrize("text, minutes", [
+    ("9:30", 570), ("14.00", 840), ("2:30 pm", 870), ("12am", 0), ("٩:٣٠", 570), ("25:00", None), ("x", None),
+])
+def test_parse_minutes(text, minutes):
+    assert parse_minutes(text) == minutes
+
+
+def test_bare_hour_before_opening_is_afternoon():
+    hours = ClinicHours("09:00", "17:00")
+    assert parse_minutes("3", hours) == 15 * 60
+    assert parse_minutes("03:00", hours) == 3 * 60
+    assert parse_minutes("03", hours) == 3 * 60
+    assert parse_minutes("00:30", hours) == 30
+    assert parse_minutes("3:00", hours) == 3 * 60
+
+
+def test_parse_and_format_slot():
+    hours = ClinicHours("09:00", "17:00", 15)
+    assert parse_slot("10:00", hours) == (600, 15)
+    assert parse_slot("10:00-10:45", hours) == (600, 45)
+    assert parse_slot("11-1", hours) == (660, 120)
+    assert parse_slot(None, hours) is None
+    assert format_slot(600, 15, hours) == "10:00"
+    assert format_slot(600, 45, hours) == "10:00-10:45"
+
+
+def test_double_booking_keeps_a_doctor_busy():
+    slots = index(["09:00", "09:00", "09:10-09:25"])
+    # 09:00 is double booked, and the 09:10 visit still needs a doctor until 09:25
+    assert slots.conflicts(DAY, 9 * 60 + 15, 15) is False
+    assert slots.free_slots(DAY, n=2) == [(DAY, 9 * 60 + 15, 1), (DAY, 9 * 60 + 30, 2)]
+
+
+def test_conflicts_and_back_to_back():
+    slots = index(["10:00", "10:00"])
+    assert slots.conflicts(DAY, 600, 15)
+    assert slots.conflicts(DAY, 590, 15)
+    assert not slots.conflicts(DAY, 615, 15)
+    assert not slots.conflicts(DAY, 585, 15)
+
+
+def test_add_keeps_index_current():
+    slots = index(["10:00"], doctors=["Dr Kawa"])
+    assert not slots.conflicts(DAY, 630, 15)
+    slots.add({"Date": DAY.isoformat(), "Time": "10:30-11:00"}, version=2)
+    assert slots.version == 2
+    assert slots.conflicts(DAY, 645, 15)
+    assert slots.free_slots(DAY, after=630, n=1) == [(DAY, 660, 1)]
+
+
+def test_free_slots_skip_closed_days():
+    slots = index([], doctors=["Dr Kawa"])
+    friday = date(2026, 10, 23)
+    assert slots.free_slots(friday, n=1)[0][0] == date(2026, 10, 24)
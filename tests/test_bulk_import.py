@@ -0,0 +1,79 @@
+import pandas as pd
+
+from bulk_import import (
+    PATIENT_COLUMNS, Batch, BookingKeys, booking_columns, drop_duplicates, patient_key_sets,
+    validate_bookings, validate_patients,
+)
+from journal_store import JournalStore
+from patient_ids import PatientIdAllocator, last_patient_number
+from sqlite_store import SQLiteStore
+
+
+def patients(**columns):
+    n = len(next(iter(columns.values())))
+    return Batch(pd.DataFrame({"Full_Name": ["Ali"] * n, "Date": ["2024-03-04"] * n, **columns}), PATIENT_COLUMNS)
+
+
+def test_normalizes_dates_ages_and_digits():
+    batch = patients(Date=["03/04/2024", "٢٥/١٢/٢٠٢٣"], Age=["٤٢", "7"], Gender=["m", "F"])
+    validate_patients(batch, dayfirst=True)
+    assert batch.accepted()[["Date", "Age", "Gender"]].values.tolist() == [
+        ["2024-04-03", "42", "Male"], ["2023-12-25", "7", "Female"],
+    ]
+
+
+def test_age_reasons():
+    batch = patients(Age=["12.5", "abc", "130", ""])
+    validate_patients(batch)
+    assert batch.reasons.tolist() == ["Age is not a whole number", "Age is not a whole number", "Age out of 0-120", ""]
+
+
+def test_rejects_keep_the_raw_input():
+    batch = patients(Age=["12.5", "40"], Date=["someday", "2024-03-04"], Notes=["x", "y"])
+    validate_patients(batch)
+    rejects = batch.rejects()
+    assert rejects[["Date", "Age", "Notes", "Reason"]].values.tolist() == [["someday", "12.5", "x", "Date is not a date"]]
+    assert batch.ignored_columns == ["Notes"]
+
+
+def test_rows_without_a_name_are_rejected():
+    batch = Batch(pd.DataFrame({"Full_Name": [""], "Appt_Name": [""]}), PATIENT_COLUMNS)
+    validate_patients(batch)
+    assert batch.reasons.tolist() == ["no Full_Name or Appt_Name"]
+
+
+def test_duplicates_of_stored_rows_and_within_the_file():
+    existing = pd.DataFrame([{**dict.fromkeys(PATIENT_COLUMNS, ""), "Full_Name": "Ali", "Date": "2024-03-04",
+                              "Phone_Number": "0750"}])
+    batch = patients(Full_Name=["Ali", "Sara", "Sara"], Phone_Number=["0750", "0751", "0751"])
+    validate_patients(batch)
+    drop_duplicates(batch, existing, patient_key_sets(batch.rows))
+    assert batch.reasons.tolist() == ["duplicate of a stored row", "", "duplicate within the file"]
+
+
+def test_validate_bookings():
+    columns = booking_columns("eyeapp.py")
+    batch = Batch(pd.DataFrame({
+        "Patient Name": ["Ali", "", "Sara"], "Appointment Date": ["2024-03-04", "2024-03-04", "soon"],
+        "Time": ["09:00", "09:15", "09:30"],
+    }), columns)
+    validate_bookings(batch, "Time")
+    drop_duplicates(batch, pd.DataFrame(columns=columns), [(BookingKeys(*columns[:3]), pd.Series(True, index=batch.rows.index))])
+    assert batch.reasons.tolist() == ["", "no Patient Name", "Appointment Date missing or not a date"]
+
+
+def test_allocator_format_and_blocks(tmp_path):
+    allocator = PatientIdAllocator(str(tmp_path / "next_id"), last_used=lambda: 7)
+    assert allocator.format(12) == "0012"
+    assert allocator.allocate_many(2, above=20) == ["0021", "0022"]
+    assert allocator.allocate() == "0023"
+
+
+def test_last_patient_number_is_the_same_on_both_backends(tmp_path):
+    rows = [{"Patient_ID": pid} for pid in ["0009", "P-0042", "abc", "", "0011"]]
+    stores = [JournalStore(str(tmp_path / "eye_data.csv"), ["Patient_ID"]),
+              SQLiteStore(str(tmp_path / "eye_data.db"), ["Patient_ID"])]
+    for store in stores:
+        assert last_patient_number(store) == 0
+        store.insert_many(rows)
+    assert [last_patient_number(store) for store in stores] == [42, 42]
@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+from journal_store import JournalStore
+
+COLUMNS = ["Patient_ID", "Full_Name", "Age"]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "eye_data.csv")
+
+
+def test_writes_replay_from_disk(path):
+    store = JournalStore(path, COLUMNS)
+    assert store.insert({"Patient_ID": "0001", "Full_Name": "Ali", "Age": 40}) == 0
+    assert store.insert_many([{"Patient_ID": "0002", "Full_Name": "Sara"}, {"Patient_ID": "0003"}]) == [1, 2]
+    store.update(1, {"Age": "33"})
+    reopened = JournalStore(path, COLUMNS).load().fillna("")
+    assert reopened.values.tolist() == [["0001", "Ali", "40"], ["0002", "Sara", "33"], ["0003", "", ""]]
+    assert store.load().fillna("").values.tolist() == reopened.values.tolist()
+
+
+def test_torn_last_line_is_ignored(path):
+    store = JournalStore(path, COLUMNS)
+    store.insert({"Patient_ID": "0001"})
+    with open(store.journal_path, "a", encoding="utf-8") as f:
+        f.write('{"op": "insert", "index": 1, "val')
+    assert JournalStore(path, COLUMNS).row_count() == 1
+
+
+def test_frame_is_a_stable_snapshot(path):
+    store = JournalStore(path, COLUMNS)
+    store.insert({"Patient_ID": "0001", "Full_Name": "Ali"})
+    before, version = store.frame(), store.version
+    store.update(0, {"Full_Name": "Ali Hassan"})
+    store.insert({"Patient_ID": "0002"})
+    assert before["Full_Name"].tolist() == ["Ali"]
+    assert store.frame()["Full_Name"].fillna("").tolist() == ["Ali Hassan", ""]
+    assert store.version == version + 2
+
+
+def test_compact_keeps_rows_and_empties_the_journal(path):
+    store = JournalStore(path, COLUMNS, compact_bytes=float("inf"))
+    store.insert_many([{"Patient_ID": f"{i:04d}"} for i in range(50)])
+    store.update(3, {"Age": "9"})
+    store.compact()
+    assert open(store.journal_path).read() == ""
+    assert pd.read_csv(path, dtype=str).loc[3, "Age"] == "9"
+    assert JournalStore(path, COLUMNS).row_count() == 50
+
@@ -0,0 +1,119 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from fake_sheets import FakeSpreadsheet
+from partitions import UNDATED, MonthPartitions, YearWorksheets, year_keys
+
+COLUMNS = ["Patient Name", "Appointment Date", "Time", "Payment"]
+TODAY = date(2026, 10, 17)
+
+
+def bookings(*rows):
+    return pd.DataFrame([list(row) + [""] for row in rows], columns=COLUMNS)
+
+
+@pytest.fixture
+def months(tmp_path):
+    store = MonthPartitions(str(tmp_path / "bookings"), COLUMNS, "Appointment Date")
+    store.reset(bookings(
+        ("Old", "2026-08-03", "09:00"), ("Now", "2026-10-20", "10:00"),
+        ("Later", "2026-12-01", "11:00"), ("Nobody knows", "soon", "12:00"),
+    ), TODAY)
+    return store
+
+
+def test_hot_months_and_archive(months):
+    assert months.hot(TODAY)["Patient Name"].tolist() == ["Now", "Later"]
+    assert months.range(date(2026, 8, 1), date(2026, 8, 31))["Patient Name"].tolist() == ["Old"]
+    assert months.archive_bounds(TODAY) == (date(2026, 8, 1), date(2026, 10, 16))
+    assert len(months.load()) == 4
+
+
+def test_insert_replace_and_rollover(months):
+    version = months.version
+    months.insert({"Patient Name": "New", "Appointment Date": "2026-10-21", "Time": "09:15"}, TODAY)
+    months.insert({"Patient Name": "Late entry", "Appointment Date": "2026-08-04", "Time": "09:15"}, TODAY)
+    assert months.version == version + 2
+    assert months.hot(TODAY)["Patient Name"].tolist() == ["Now", "New", "Later"]
+    assert "Late entry" in months.range(date(2026, 8, 1), date(2026, 8, 31))["Patient Name"].tolist()
+
+    months.replace(bookings(("Sheet only", "2026-11-02", "09:00")), TODAY)
+    assert months.hot(TODAY)["Patient Name"].tolist() == ["Sheet only"]
+    assert len(months.range(date(2026, 8, 1), date(2026, 8, 31))) == 2  # archive untouched
+
+    assert months.rollover(date(2026, 12, 5)) == ["2026-11"]
+    assert months.hot(date(2026, 12, 5)).empty
+
+
+def test_year_keys():
+    assert year_keys(pd.Series(["2025-01-02", "03/04/2026", "?"])).tolist() == ["2025", "2026", UNDATED]
+
+
+def test_split_maps_legacy_columns_to_the_header():
+    spreadsheet = FakeSpreadsheet()
+    legacy = spreadsheet.sheet1
+    legacy.rows = [["Payment", "Time", "Appointment Date", "Patient Name", "Notes"],
+                   ["Cash", "09:00", "2025-03-04", "Ali", "x"],
+                   ["", "10:00", "2026-01-02", "Sara", ""]]
+    years = YearWorksheets(spreadsheet, COLUMNS, "Appointment Date")
+    assert years.split(legacy) == ["2025", "2026"]
+    assert spreadsheet.worksheet("Bookings 2025").rows == [COLUMNS, ["Ali", "2025-03-04", "09:00", "Cash"]]
+    assert years.split(legacy) == []  # only once
+    assert years.records(["2026"])["Patient Name"].tolist() == ["Sara"]
+
+
+def test_split_refuses_a_sheet_of_something_else():
+    spreadsheet = FakeSpreadsheet()
+    spreadsheet.sheet1.rows = [["Date", "Patient_ID", "Full_Name"], ["2025-03-04", "0001", "Ali"]]
+    years = YearWorksheets(spreadsheet, COLUMNS, "Appointment Date", prefix="Manual Bookings")
+    with pytest.raises(ValueError, match="missing columns: Patient Name, Appointment Date, Time, Payment"):
+        years.split(spreadsheet.sheet1)
+    assert years.years() == []
+
+
+def test_append_rows_goes_to_each_year():
+    spreadsheet = FakeSpreadsheet()
+    years = YearWorksheets(spreadsheet, COLUMNS, "Appointment Date", prefix="Manual Bookings")
+    years.append_rows([["Ali", "2026-10-20", "09:00", ""], ["Sara", "2027-01-04", "09:00", ""]])
+    years.append({"Patient Name": "Omar", "Appointment Date": "2026-10-21", "Time": "10:00"})
+    assert years.years() == ["2026", "2027"]
+    assert [row[0] for row in spreadsheet.worksheet("Manual Bookings 2026").rows] == ["Patient Name", "Ali", "Omar"]
+    assert years.signature(TODAY) == (("2026", 3), ("2027", 2))
+
+
+def test_split_cut_short_resumes_on_the_next_call():
+    spreadsheet = FakeSpreadsheet()
+    legacy = spreadsheet.sheet1
+    legacy.rows = [COLUMNS, ["Ali", "2024-05-01", "09:00", ""], ["Sara", "2025-03-04", "09:00", ""],
+                   ["Omar", "2026-01-02", "09:00", ""], ["Huda", "2026-02-03", "09:00", ""]]
+    add_worksheet = spreadsheet.add_worksheet
+
+    def quota_error(title, rows=0, cols=0):
+        if title == "Bookings 2025":
+            raise RuntimeError("429: quota exceeded")
+        return add_worksheet(title, rows, cols)
+
+    spreadsheet.add_worksheet = quota_error
+    years = YearWorksheets(spreadsheet, COLUMNS, "Appointment Date")
+    with pytest.raises(RuntimeError):
+        years.split(legacy)
+    spreadsheet.add_worksheet = add_worksheet
+
+    # Another PC saved a 2026 booking in between
+    years.append({"Patient Name": "New", "Appointment Date": "2026-11-05", "Time": "10:00"})
+    assert years.split(legacy) == ["2025", "2026"]
+    assert years.records(years.years())["Patient Name"].tolist() == ["Ali", "Sara", "New", "Omar", "Huda"]
+    assert years.split(legacy) == []
+    assert years.years() == ["2024", "2025", "2026"]  # the split-done marker is not a year
+
+
+def test_creating_a_year_another_pc_already_created():
+    spreadsheet = FakeSpreadsheet()
+    here = YearWorksheets(spreadsheet, COLUMNS, "Appointment Date")
+    assert here.years() == []
+    there = YearWorksheets(spreadsheet, COLUMNS, "Appointment Date")
+    there.append({"Patient Name": "Ali", "Appointment Date": "2027-01-04", "Time": "09:00"})
+    here.append({"Patient Name": "Sara", "Appointment Date": "2027-01-05", "Time": "09:00"})
+    assert [row[0] for row in spreadsheet.worksheet("Bookings 2027").rows] == ["Patient Name", "Ali", "Sara"]
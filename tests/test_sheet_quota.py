@@ -0,0 +1,61 @@
+import pytest
+import requests
+
+from fake_sheets import FakeSpreadsheet, FakeWorksheet
+from sheet_quota import QuotaWorksheet
+
+
+class FlakyWorksheet(FakeWorksheet):
+    """Applies each call, then drops the connection the first ``failures`` times."""
+
+    def __init__(self, rows, failures=1):
+        super().__init__(rows)
+        self.failures = failures
+
+    def _flaky(self, result):
+        if self.failures:
+            self.failures -= 1
+            raise requests.exceptions.ConnectionError("connection reset")
+        return result
+
+    def update(self, *args, **kwargs):
+        return self._flaky(super().update(*args, **kwargs))
+
+    def append_rows(self, *args, **kwargs):
+        return self._flaky(super().append_rows(*args, **kwargs))
+
+    def get_all_values(self):
+        return self._flaky(super().get_all_values())
+
+
+def quota(sheet, **kwargs):
+    return QuotaWorksheet(sheet, base_delay=0.001, max_delay=0.001, **kwargs)
+
+
+def test_reads_and_range_writes_are_retried():
+    sheet = quota(FlakyWorksheet([["Name"], ["Ali"]], failures=2))
+    assert sheet.get_all_values() == [["Name"], ["Ali"]]
+    sheet.update("A2", [["Sara"]])
+    assert sheet.sheet.rows == [["Name"], ["Sara"]]
+    assert sheet.metrics["retries"] == 2
+
+
+def test_appends_are_sent_once():
+    flaky = FlakyWorksheet([["Name"]])
+    sheet = quota(flaky)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        sheet.append_rows([["Ali"]])
+    assert flaky.rows == [["Name"], ["Ali"]]  # applied once, not duplicated
+    assert sheet.metrics["retries"] == 0 and sheet.metrics["errors"] == 1
+
+
+def test_siblings_share_buckets_and_counters():
+    spreadsheet = FakeSpreadsheet()
+    sheet = quota(spreadsheet.sheet1, writes_per_minute=600)
+    year = sheet.sibling(spreadsheet.add_worksheet("Bookings 2026"))
+    for _ in range(102):  # past the burst of 100: the last ones wait for a token
+        year.append_row(["Ali"])
+    metrics = sheet.metrics
+    assert metrics["by_method"] == {"append_row": 102}
+    assert metrics["throttled_s"] > 0
+    assert year.metrics == metrics
@@ -0,0 +1,73 @@
+import os
+
+import pandas as pd
+
+from fake_sheets import FakeWorksheet
+from sheet_sync import SheetRowIndex, SyncQueue, SyncState, col_letter, first_appended_row
+
+
+def frame(*rows):
+    return pd.DataFrame([list(row) for row in rows], columns=["Patient_ID", "Full_Name"])
+
+
+def test_col_letter_and_appended_row():
+    assert [col_letter(n) for n in (1, 26, 27, 52)] == ["A", "Z", "AA", "AZ"]
+    assert first_appended_row({"updates": {"updatedRange": "Sheet1!A12:U14"}}) == 12
+    assert first_appended_row({}) is None
+
+
+def test_sync_state_delta_and_mark(tmp_path):
+    path = str(tmp_path / "eye_data.sync_state.json")
+    store = frame(("0001", "Ali"), ("0002", "Sara"))
+    state = SyncState(path, baseline=store)
+    assert state.last_synced_row == 2
+
+    store = pd.concat([store, frame(("0003", "Omar"))], ignore_index=True)
+    store.loc[0, "Full_Name"] = "Ali Hassan"
+    changed = state.delta(len(store), touched=[0, 1], fetch=lambda positions: store.loc[positions])
+    assert changed.index.tolist() == [0, 2]
+    state.mark(changed)
+    assert state.delta(len(store), touched=[0, 1], fetch=lambda positions: store.loc[positions]).empty
+
+    reloaded = SyncState(path)
+    assert (reloaded.last_synced_row, reloaded.hashes) == (state.last_synced_row, state.hashes)
+
+
+def test_mark_appends_to_the_log_and_compacts(tmp_path):
+    path = str(tmp_path / "eye_data.sync_state.json")
+    state = SyncState(path, baseline=frame(*[(f"{i:04d}", "x") for i in range(1000)]), compact_bytes=2000)
+    base_size = os.path.getsize(path)
+    state.mark(frame(("1000", "new")).set_axis([1000]))
+    assert os.path.getsize(path) == base_size  # the state file is not rewritten
+    assert SyncState(path).last_synced_row == 1001
+
+    for i in range(1001, 1040):
+        state.mark(frame((f"{i:04d}", "new")).set_axis([i]))
+    assert not os.path.exists(state.log_path) or os.path.getsize(state.log_path) < 2000
+    assert SyncState(path).hashes == state.hashes
+
+
+def test_torn_log_line_is_ignored(tmp_path):
+    path = str(tmp_path / "eye_data.sync_state.json")
+    state = SyncState(path, baseline=frame(("0001", "Ali")))
+    state.mark(frame(("0002", "Sara")).set_axis([1]))
+    with open(state.log_path, "a", encoding="utf-8") as f:
+        f.write('{"hashes": {"2": "ab')
+    assert SyncState(path).last_synced_row == 2
+
+
+def test_queue_appends_then_updates_known_rows(tmp_path):
+    sheet = FakeWorksheet([["Patient_ID", "Full_Name"], ["0001", "Ali"]])
+    index = SheetRowIndex(str(tmp_path / "rows.json"))
+    queue = SyncQueue(sheet, str(tmp_path / "queue.jsonl"), row_index=index, key_column=1)
+    queue.enqueue([["0002", "Sara"], ["0002", "Sara Ahmed"], ["", "Walk-in"]], keys=["0002", "0002", None])
+    assert queue.pending() == 3
+    assert queue.queued_rows()[0] == ["0002", "Sara"]
+    assert queue.flush() == 3
+    assert sheet.rows[1:] == [["0001", "Ali"], ["0002", "Sara Ahmed"], ["", "Walk-in"]]
+    assert index.rows == {"0001": 2, "0002": 3}
+
+    queue.enqueue([["0001", "Ali Hassan"]], keys=["0001"])
+    queue.flush()
+    assert sheet.rows[1] == ["0001", "Ali Hassan"] and len(sheet.rows) == 4
+    assert queue.pending() == 0
@@ -0,0 +1,25 @@
+import pandas as pd
+
+from typed_snapshot import PATIENT_SCHEMA, to_strings, to_typed
+
+
+def round_trip(**columns):
+    df = pd.DataFrame(columns)
+    return to_typed(df, PATIENT_SCHEMA), to_strings(to_typed(df, PATIENT_SCHEMA))
+
+
+def test_plain_values_are_typed():
+    typed, back = round_trip(Date=["2024-03-04", None], Age=["42", ""], Gender=["Male", None])
+    assert pd.api.types.is_datetime64_any_dtype(typed["Date"])
+    assert str(typed["Age"].dtype) == "Int64"
+    assert isinstance(typed["Gender"].dtype, pd.CategoricalDtype)
+    assert back.values.tolist() == [["2024-03-04", "42", "Male"], [None, None, None]]
+
+
+def test_values_written_differently_are_kept_as_written():
+    dates = ["2024-03-04", "03/04/2024", "2024-03-04 10:00", "after Eid"]
+    ages = ["42", "042", "4.0", "about 40"]
+    typed, back = round_trip(Date=dates, Age=ages)
+    assert str(typed["Date"].dtype) == "string" and str(typed["Age"].dtype) == "string"
+    assert back["Date"].tolist() == dates
+    assert back["Age"].tolist() == ages
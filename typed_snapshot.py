@@ -0,0 +1,90 @@
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow is optional; stores fall back to CSV snapshots
+    feather = None
+
+# ---------- Typed columnar snapshots ----------
+# Columns not listed are stored as strings.
+PATIENT_SCHEMA = {
+    "Date": "date",
+    "Age": "Int64",
+    "Gender": "category",
+    "Appt_Date": "date",
+    "Appt_Payment": "category",
+}
+
+BOOKING_SCHEMA = {
+    "Appointment Date": "date",
+    "Payment": "category",
+}
+
+
+def _is_blank(series):
+    return series.isna() | (series.astype("string").str.strip() == "")
+
+
+def to_typed(df, schema):
+    """Apply ``schema`` to a DataFrame of strings.
+
+    A column is typed only if every value would come back from
+    ``to_strings`` exactly as written ("2024-03-04", "42"). Free-text or
+    differently written values ("03/04/2024", "2024-03-04 10:00", "042")
+    keep the whole column as strings rather than rewriting them.
+    """
+    out = {}
+    for col in df.columns:
+        kind = schema.get(col, "string")
+        series = df[col]
+        blank = _is_blank(series)
+        if kind == "date":
+            typed = pd.to_datetime(series, errors="coerce", format="mixed")
+            plain = typed.dt.strftime("%Y-%m-%d")
+        elif kind == "Int64":
+            typed = pd.to_numeric(series, errors="coerce")
+            typed = typed.astype("Int64") if (typed.dropna() % 1 == 0).all() else None
+            plain = None if typed is None else typed.astype("string")
+        elif kind == "category":
+            typed = series.where(~blank).astype("category")
+            plain = series
+        else:
+            typed = plain = series.astype("string")
+        changed = None if typed is None else (plain.astype("string") != series.astype("string")).fillna(True)
+        if typed is None or (changed & ~blank).any():
+            typed = series.astype("string")
+        out[col] = typed
+    return pd.DataFrame(out, index=df.index)
+
+
+def to_strings(df):
+    """Back to the plain str / None frame the stores work with."""
+    out = {}
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            series = series.dt.strftime("%Y-%m-%d")
+        series = series.astype("string").astype(object)
+        out[col] = series.where(series.notna(), None)
+    return pd.DataFrame(out, index=df.index)
+
+
+def write_snapshot(df, path, schema):
+    """Write an uncompressed Feather file (so reads can be memory-mapped)."""
+    tmp_path = path + ".tmp"
+    feather.write_feather(to_typed(df, schema).reset_index(drop=True), tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path, columns=None):
+    """Memory-mapped read of only ``columns``, with their stored types."""
+    return feather.read_table(path, columns=columns, memory_map=True).to_pandas()
+
+
+def snapshot_columns(path):
+    """Column names of a snapshot, read from its schema only."""
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).schema.names
@@ -0,0 +1,41 @@
+import threading
+
+# ---------- Doctor's waiting list ----------
+WAITING_FIELDS = ["Diagnosis", "Treatment", "Plan", "Appt_Name"]
+
+
+def is_waiting(record):
+    """A pre-visit entry the doctor hasn't filled in yet."""
+    return all(str(record.get(col) or "").strip() == "" for col in WAITING_FIELDS)
+
+
+class WaitingQueue:
+    """Row index -> (Patient_ID, Full_Name, Age) of patients waiting for the doctor.
+
+    Built once from the stored waiting rows and then updated on every insert
+    and doctor update, so rendering the list never scans the history.
+    """
+
+    def __init__(self, waiting_df):
+        self._lock = threading.Lock()
+        self._rows = {
+            int(i): (pid, name, age)
+            for i, pid, name, age in zip(
+                waiting_df.index, waiting_df["Patient_ID"], waiting_df["Full_Name"], waiting_df["Age"]
+            )
+        }
+
+    def update(self, index, record):
+        """Add, refresh or drop one row after it was saved."""
+        with self._lock:
+            if is_waiting(record):
+                self._rows[int(index)] = (record.get("Patient_ID"), record.get("Full_Name"), record.get("Age"))
+            else:
+                self._rows.pop(int(index), None)
+
+    def items(self):
+        with self._lock:
+            return list(self._rows.items())
+
+    def __len__(self):
+        return len(self._rows)